@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Benchmark onboarding many documents: one upload per file vs one bulk upload.
+
+Runs the FastAPI app in-process against a temporary database, Chroma store
+and upload directory. Embeddings come from a local stub of the embedding API
+that charges a fixed latency per request plus a little per text, so the
+number of embedding calls matters the way it does with a real model server.
+
+- per-file: every document goes through /chat/{id}/upload, then we wait
+  for all ingestion jobs
+- bulk: the same documents in one zip through /chat/{id}/upload/bulk
+
+Usage: python scripts/bench_bulk_ingest.py [files] [paragraphs_per_file]
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import zipfile
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+DIMENSIONS = 384
+REQUEST_LATENCY = 0.03  # seconds per embedding request
+TEXT_LATENCY = 0.0005  # seconds per embedded text
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    """Deterministic vectors with model-server-like latency"""
+    
+    requests = 0
+    lock = threading.Lock()
+    
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+    
+    def do_POST(self):
+        texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["text"]
+        with StubEmbeddingHandler.lock:
+            StubEmbeddingHandler.requests += 1
+        time.sleep(REQUEST_LATENCY + TEXT_LATENCY * len(texts))
+        
+        embeddings = []
+        for text in texts:
+            seed = hashlib.sha256(text.encode("utf-8")).digest()
+            embeddings.append([(seed[i % len(seed)] - 128) / 128 for i in range(DIMENSIONS)])
+        
+        body = json.dumps({"embeddings": embeddings}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubEmbeddingHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+workdir = tempfile.mkdtemp(prefix="bench_bulk_")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+    "CHROMA_DB_PATH": f"{workdir}/vector_stores",
+    "KEYWORD_INDEX_PATH": f"{workdir}/keyword_indexes",
+    "UPLOAD_DIR": f"{workdir}/uploads",
+    "EMBEDDING_API_URL": f"http://127.0.0.1:{server.server_port}",
+    "EMBEDDING_CACHE_ENABLED": "False",
+    "ANSWER_CACHE_ENABLED": "False",
+    "DEBUG": "False"
+})
+os.chdir(workdir)
+
+from fastapi.testclient import TestClient
+import main
+
+def make_documents(count: int, paragraphs: int):
+    """Markdown files with distinct text, like a team's handbook"""
+    return {
+        f"doc_{i:04d}.md": (
+            f"# Document {i}\n\n" + "\n\n".join(
+                f"## Section {p}\n\nDocument {i} section {p} explains how the team handles topic {i * paragraphs + p}. "
+                + "It covers the usual questions, edge cases and who to ask. " * 6
+                for p in range(paragraphs)
+            )
+        ).encode("utf-8")
+        for i in range(count)
+    }
+
+def per_file(client: TestClient, documents) -> dict:
+    chat_id = client.post("/chat", params={"name": "per-file"}).json()["id"]
+    start = time.perf_counter()
+    
+    jobs = [
+        client.post(f"/chat/{chat_id}/upload", files={"file": (name, content)}).json()["job_id"]
+        for name, content in documents.items()
+    ]
+    
+    chunks = 0
+    for job_id in jobs:
+        while True:
+            job = client.get(f"/chat/{chat_id}/jobs/{job_id}").json()
+            if job["stage"] in ("completed", "failed", "cancelled"):
+                chunks += job["chunk_count"] or 0
+                break
+            time.sleep(0.01)
+    
+    return {"seconds": time.perf_counter() - start, "chunks": chunks}
+
+def bulk(client: TestClient, documents) -> dict:
+    chat_id = client.post("/chat", params={"name": "bulk"}).json()["id"]
+    
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for name, content in documents.items():
+            zf.writestr(f"handbook/{name}", content)
+    
+    start = time.perf_counter()
+    response = client.post(
+        f"/chat/{chat_id}/upload/bulk",
+        params={"wait": "true"},
+        files=[("files", ("handbook.zip", archive.getvalue(), "application/zip"))]
+    ).json()
+    
+    summary = response["summary"]
+    return {
+        "seconds": time.perf_counter() - start,
+        "chunks": summary["chunks_indexed"],
+        "failed": summary["files_failed"],
+        "stage_seconds": summary["stage_seconds"],
+        "index_writes": summary["index_writes"]
+    }
+
+def report(name: str, result: dict, embedding_requests: int) -> None:
+    print(
+        f"{name:<10} {result['seconds']:>8.2f}s {result['chunks']:>8} chunks "
+        f"{result['chunks'] / result['seconds']:>9.0f} chunks/s {embedding_requests:>6} embedding requests"
+    )
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    paragraphs = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    logging.disable(logging.INFO)
+    
+    documents = make_documents(count, paragraphs)
+    print(f"{count} documents, {sum(map(len, documents.values())) / 1024 / 1024:.1f} MB\n")
+    
+    try:
+        with TestClient(main.app) as client:
+            before = StubEmbeddingHandler.requests
+            single = per_file(client, documents)
+            report("per-file", single, StubEmbeddingHandler.requests - before)
+            
+            before = StubEmbeddingHandler.requests
+            pipelined = bulk(client, documents)
+            report("bulk", pipelined, StubEmbeddingHandler.requests - before)
+            
+            print(f"\nbulk stage busy time: {pipelined['stage_seconds']}, {pipelined['index_writes']} Chroma writes")
+            print(f"speedup: {single['seconds'] / pipelined['seconds']:.1f}x")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
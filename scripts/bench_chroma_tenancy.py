@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Benchmark Chroma tenancy modes: one collection per chat vs shared collections.
+
+For each mode a store is filled with many small chats in one subprocess,
+then reopened in a fresh one as a restarting server would. We report:
+
+- build: time to create the chats and write their chunks
+- startup: time to construct the vector store (listing/opening collections)
+- query: latency of searches spread over random chats (first touch of a
+  chat included, as in production) and repeated searches in one chat
+- fds / rss: open file descriptors and resident memory after the queries
+- disk: size of the Chroma directory
+
+Usage: python scripts/bench_chroma_tenancy.py [chats] [chunks_per_chat] [queries]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+DIMENSIONS = 384
+TOP_K = 5
+MODES = ("collection", "shared")
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def chat_vectors(chat_id: int, chunks: int):
+    import numpy as np
+    return np.random.default_rng(chat_id).standard_normal((chunks, DIMENSIONS)).astype(np.float32)
+
+def build(chats: int, chunks: int) -> dict:
+    """Create every chat and write its chunks"""
+    from services.vector_store import create_vector_store
+    
+    store = create_vector_store("chroma")
+    start = time.perf_counter()
+    for chat_id in range(1, chats + 1):
+        store.create(chat_id)
+        store.add(
+            chat_id,
+            [f"doc.txt_{i}" for i in range(chunks)],
+            [f"chat {chat_id} chunk {i}" for i in range(chunks)],
+            chat_vectors(chat_id, chunks).tolist(),
+            [{"filename": "doc.txt", "chunk_index": i} for i in range(chunks)]
+        )
+    return {"build_s": time.perf_counter() - start}
+
+def serve(chats: int, chunks: int, queries: int) -> dict:
+    """Open the store like a restarted server and query random chats"""
+    import numpy as np
+    import chromadb  # imported up front so startup measures the store, not the import
+    
+    start = time.perf_counter()
+    from services.vector_store import create_vector_store
+    store = create_vector_store("chroma")
+    startup = time.perf_counter() - start
+    
+    rng = np.random.default_rng(0)
+    spread = []
+    for chat_id in rng.integers(1, chats + 1, queries):
+        probe = chat_vectors(int(chat_id), chunks)[0] + 0.01
+        started = time.perf_counter()
+        hits = store.search(int(chat_id), probe.tolist(), TOP_K)
+        spread.append(time.perf_counter() - started)
+        assert hits and hits[0]["document"].startswith(f"chat {chat_id} "), "search leaked across chats"
+    
+    repeated = []
+    probe = chat_vectors(1, chunks)[0].tolist()
+    for _ in range(queries):
+        started = time.perf_counter()
+        store.search(1, probe, TOP_K)
+        repeated.append(time.perf_counter() - started)
+    
+    spread.sort()
+    repeated.sort()
+    return {
+        "startup_ms": startup * 1000,
+        "query_ms": sum(spread) / len(spread) * 1000,
+        "query_p95_ms": spread[int(len(spread) * 0.95) - 1] * 1000,
+        "warm_query_ms": sum(repeated) / len(repeated) * 1000,
+        "fds": len(os.listdir("/proc/self/fd")),
+        "rss_mb": rss_mb()
+    }
+
+def run(step: str, mode: str, workdir: str, *args) -> dict:
+    env = {**os.environ, "CHROMA_DB_PATH": f"{workdir}/chroma", "CHROMA_TENANCY": mode, "LOG_DIR": f"{workdir}/logs", "UPLOAD_DIR": f"{workdir}/uploads"}
+    output = subprocess.run(
+        [sys.executable, __file__, "--" + step, *map(str, args)],
+        capture_output=True, text=True, check=True, env=env
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def disk_mb(path: str) -> float:
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file()) / 1024 / 1024
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--build":
+        print(json.dumps(build(int(sys.argv[2]), int(sys.argv[3]))))
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        print(json.dumps(serve(int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))))
+        sys.exit(0)
+    
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    
+    print(f"{chats} chats x {chunks} chunks, {DIMENSIONS}-dim vectors, {queries} queries\n")
+    print(f"{'mode':<11} {'build s':>8} {'startup ms':>11} {'query ms':>9} {'p95 ms':>8} {'warm ms':>8} {'fds':>6} {'rss MB':>7} {'disk MB':>8}")
+    for mode in MODES:
+        workdir = tempfile.mkdtemp(prefix="bench_tenancy_")
+        try:
+            result = run("build", mode, workdir, chats, chunks)
+            result.update(run("serve", mode, workdir, chats, chunks, queries))
+            print(
+                f"{mode:<11} {result['build_s']:>8.1f} {result['startup_ms']:>11.1f} {result['query_ms']:>9.2f} "
+                f"{result['query_p95_ms']:>8.2f} {result['warm_query_ms']:>8.2f} {result['fds']:>6} {result['rss_mb']:>7.1f} "
+                f"{disk_mb(workdir + '/chroma'):>8.1f}"
+            )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
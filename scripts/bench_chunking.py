@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for the chunking strategies on large synthetic texts.
+
+Compares the previous character-based chunker (1000 chars, 200 overlap,
+cut at the last ".") with the token, page and markdown chunkers. For each
+corpus we report chunks/sec, chunk count, average chunk size in tokens and
+how much text gets embedded relative to the input (overlap overhead).
+
+Usage: python scripts/bench_chunking.py [size_mb]
+"""
+import sys
+import time
+import random
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+from services.chunking import TokenChunker, PageChunker, MarkdownChunker, count_tokens
+
+WORDS = (
+    "the controller bracket mount wall screw error code fan overheating intake dust "
+    "power adapter warranty network reset button firmware update filter replace unit "
+    "sensor temperature serial support install cable level anchor dashboard static"
+).split()
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+    # Version numbers and abbreviations put periods mid-sentence
+    if rng.random() < 0.3:
+        words.insert(rng.randint(0, len(words)), f"v{rng.randint(1, 9)}.{rng.randint(0, 9)}")
+    return " ".join(words).capitalize() + "."
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(sentence(rng) for _ in range(rng.randint(2, 8)))
+
+def make_prose(rng: random.Random, size: int) -> str:
+    parts, length = [], 0
+    while length < size:
+        parts.append(paragraph(rng))
+        length += len(parts[-1]) + 2
+    return "\n\n".join(parts)
+
+def make_markdown(rng: random.Random, size: int) -> str:
+    parts, length, section = [], 0, 0
+    while length < size:
+        section += 1
+        parts.append(f"## Section {section}")
+        for sub in range(rng.randint(0, 3)):
+            parts.append(f"### Topic {section}.{sub}")
+            parts.extend(paragraph(rng) for _ in range(rng.randint(1, 4)))
+        length = sum(len(part) + 2 for part in parts)
+    return "\n\n".join(parts)
+
+def make_pages(rng: random.Random, size: int, page_size: int = 3000):
+    text = make_prose(rng, size)
+    return [(i // page_size + 1, text[i:i + page_size]) for i in range(0, len(text), page_size)]
+
+def legacy_chunks(text: str, chunk_size: int = 1000, overlap: int = 200):
+    """The character-based chunker this engine replaces"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            last_sentence = text.rfind(".", start, end)
+            if last_sentence > start:
+                end = last_sentence + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def report(name: str, input_chars: int, run) -> None:
+    start = time.perf_counter()
+    chunks = run()
+    elapsed = time.perf_counter() - start
+    
+    tokens = [count_tokens(chunk) for chunk in chunks]
+    embedded = sum(len(chunk) for chunk in chunks)
+    print(
+        f"{name:<22} {len(chunks) / elapsed:>11.0f} {len(chunks):>8} "
+        f"{sum(tokens) / len(tokens):>10.1f} {embedded / input_chars:>10.2f}x"
+    )
+
+if __name__ == "__main__":
+    size = int(float(sys.argv[1] if len(sys.argv) > 1 else 5) * 1024 * 1024)
+    rng = random.Random(42)
+    
+    prose = make_prose(rng, size)
+    markdown = make_markdown(rng, size)
+    pages = make_pages(rng, size)
+    page_text = "\n".join(text for _, text in pages)
+    
+    header = f"{'strategy':<22} {'chunks/sec':>11} {'chunks':>8} {'avg tokens':>10} {'embedded':>11}"
+    contents = lambda chunks: [chunk["content"] for chunk in chunks]
+    
+    print(f"\nprose, {len(prose) / 1e6:.1f}M chars")
+    print(header)
+    report("legacy (chars)", len(prose), lambda: legacy_chunks(prose))
+    report("token", len(prose), lambda: contents(TokenChunker().chunk_text(prose)))
+    
+    print(f"\nmarkdown, {len(markdown) / 1e6:.1f}M chars")
+    print(header)
+    report("legacy (chars)", len(markdown), lambda: legacy_chunks(markdown))
+    report("token", len(markdown), lambda: contents(TokenChunker().chunk_text(markdown)))
+    report("markdown", len(markdown), lambda: contents(MarkdownChunker().chunk_text(markdown)))
+    
+    print(f"\npdf pages, {len(pages)} pages")
+    print(header)
+    report("legacy (chars)", len(page_text), lambda: legacy_chunks(page_text))
+    report("token", len(page_text), lambda: contents(TokenChunker().chunk(pages)))
+    report("page", len(page_text), lambda: contents(PageChunker().chunk(pages)))
+    
+    # Periods just past the start of each window used to force tiny steps
+    dotted = ". " * (size // 20)
+    print(f"\ndegenerate (dense periods), {len(dotted) / 1e6:.1f}M chars")
+    print(header)
+    report("legacy (chars)", len(dotted), lambda: legacy_chunks(dotted))
+    report("token", len(dotted), lambda: contents(TokenChunker().chunk_text(dotted)))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Benchmark message, chat and document listing against a large SQLite DB.
+
+Seeds a temporary database with N messages (default 1M) spread over 1000
+chats, one of which holds 10% of all messages, then compares:
+
+- the previous endpoints, which loaded every row (and parsed every sources
+  blob) and had no per-chat indexes
+- keyset pages of 100 from the current endpoints, for the first page and for
+  a page deep into the largest chat, with and without the composite indexes
+
+Usage: python scripts/bench_pagination.py [messages]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+workdir = tempfile.mkdtemp(prefix="bench_pagination_")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+os.environ["DEBUG"] = "False"
+
+from fastapi import Response
+from sqlalchemy import text
+from database import engine, SessionLocal, create_tables, ChatSession, Message
+from api import get_messages, get_chats, get_documents
+
+CHATS = 1000
+DOCUMENTS_PER_CHAT = 20
+PAGE = 100
+
+def seed(total: int) -> int:
+    """Fill the database, returning the id of the largest chat"""
+    start = datetime(2024, 1, 1)
+    big_chat = 1
+    big_share = total // 10
+    
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO chat_sessions (id, name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            [(i, f"Chat {i}", str(start), str(start + timedelta(minutes=i))) for i in range(1, CHATS + 1)]
+        )
+        
+        batch = []
+        for i in range(total):
+            chat_id = big_chat if i < big_share else 2 + i % (CHATS - 1)
+            role = "user" if i % 2 == 0 else "assistant"
+            sources = json.dumps(["manual.pdf", "faq.md"]) if role == "assistant" else None
+            # Two messages per second, like a question and its answer saved together
+            batch.append((chat_id, f"message {i} " + "lorem ipsum " * 20, role, sources, str(start + timedelta(seconds=i // 2))))
+            if len(batch) == 50_000:
+                cur.executemany("INSERT INTO messages (chat_session_id, content, role, sources, timestamp) VALUES (?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            cur.executemany("INSERT INTO messages (chat_session_id, content, role, sources, timestamp) VALUES (?, ?, ?, ?, ?)", batch)
+        
+        cur.executemany(
+            "INSERT INTO documents (chat_session_id, filename, file_path, file_type, status, chunk_count, processed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (chat_id, f"doc{d}.txt", f"data/uploads/chat_{chat_id}/doc{d}.txt", "txt", "completed", 10, str(start + timedelta(hours=d)))
+                for chat_id in range(1, CHATS + 1)
+                for d in range(DOCUMENTS_PER_CHAT)
+            ]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return big_chat
+
+def legacy_messages(db, chat_id: int):
+    """The previous get_messages body"""
+    messages = db.query(Message).filter(Message.chat_session_id == chat_id).order_by(Message.timestamp).all()
+    return [
+        {
+            "id": msg.id,
+            "content": msg.content,
+            "role": msg.role,
+            "timestamp": msg.timestamp,
+            "sources": json.loads(msg.sources) if msg.sources else []
+        }
+        for msg in messages
+    ]
+
+def legacy_chats(db):
+    chats = db.query(ChatSession).order_by(ChatSession.updated_at.desc()).all()
+    return [{"id": chat.id, "name": chat.name, "created_at": chat.created_at, "updated_at": chat.updated_at} for chat in chats]
+
+def timed(run, repeat: int = 5):
+    """Best wall time in ms over a few runs, with a fresh session each time"""
+    best, rows = None, None
+    for _ in range(repeat):
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            rows = run(db)
+            elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(rows)
+
+def deep_cursor(chat_id: int) -> int:
+    """Cursor halfway back through a chat's history"""
+    with engine.connect() as conn:
+        count = conn.execute(text("SELECT count(*) FROM messages WHERE chat_session_id = :c"), {"c": chat_id}).scalar()
+        return conn.execute(
+            text("SELECT id FROM messages WHERE chat_session_id = :c ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET :o"),
+            {"c": chat_id, "o": count // 2}
+        ).scalar()
+
+def report(name: str, result) -> None:
+    elapsed, rows = result
+    print(f"{name:<44} {elapsed:>10.2f} ms {rows:>8} rows")
+
+def run_suite(big_chat: int, small_chat: int, cursor: int, label: str) -> None:
+    print(f"\n{label}")
+    report("messages, largest chat, all (previous)", timed(lambda db: legacy_messages(db, big_chat), repeat=2))
+    report("messages, typical chat, all (previous)", timed(lambda db: legacy_messages(db, small_chat)))
+    report("messages, largest chat, first page", timed(lambda db: get_messages(big_chat, Response(), PAGE, None, db)))
+    report("messages, largest chat, deep page", timed(lambda db: get_messages(big_chat, Response(), PAGE, cursor, db)))
+    report("chats, all (previous)", timed(legacy_chats))
+    report("chats, first page", timed(lambda db: get_chats(Response(), PAGE, None, db)))
+    report("documents, first page", timed(lambda db: get_documents(big_chat, Response(), PAGE, None, db)))
+
+if __name__ == "__main__":
+    total = int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000
+    logging.disable(logging.INFO)
+    
+    create_tables()
+    start = time.perf_counter()
+    big_chat = seed(total)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"Seeded {total} messages, {CHATS} chats, {CHATS * DOCUMENTS_PER_CHAT} documents in {time.perf_counter() - start:.1f}s")
+    
+    cursor = deep_cursor(big_chat)
+    run_suite(big_chat, 2, cursor, "with composite indexes")
+    
+    with engine.begin() as conn:
+        for index in ("ix_messages_chat_timestamp", "ix_documents_chat_processed_at", "ix_chat_sessions_updated_at"):
+            conn.execute(text(f"DROP INDEX {index}"))
+        conn.execute(text("ANALYZE"))
+    run_suite(big_chat, 2, cursor, "without composite indexes (previous schema)")
+    
+    engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
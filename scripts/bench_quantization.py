@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Memory saved vs recall lost by quantized vector storage (memmap backend).
+
+The fixture corpus mimics sentence embeddings: chunks cluster around
+topics and share a common direction, so neighbours are close together and
+quantization error actually changes rankings. Queries are perturbed copies
+of stored chunks; recall@k is measured against exact float32 search.
+
+Each mode runs in a fresh subprocess: the corpus is written, the store is
+reopened as after a restart, and RSS is measured after the queries, so it
+shows the pages searches actually touch (the scanned rows plus, with
+rescoring, only the candidates' float32 rows).
+
+Usage: python scripts/bench_quantization.py [chunks] [dimensions] [queries]
+"""
+import gc
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+TOP_K = 10
+BATCH = 256
+
+# (quantization, rescore, rescore factor)
+MODES = [
+    ("none", False, 0),
+    ("float16", False, 0),
+    ("float16", True, 4),
+    ("int8", False, 0),
+    ("int8", True, 2),
+    ("int8", True, 4)
+]
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def fixture(size: int, dimensions: int, queries: int):
+    """Clustered, anisotropic unit vectors and queries near stored chunks"""
+    import numpy as np
+    
+    rng = np.random.default_rng(7)
+    shared = rng.standard_normal(dimensions)
+    topics = rng.standard_normal((max(1, size // 50), dimensions)) + 2 * shared
+    vectors = topics[rng.integers(0, len(topics), size)] + rng.standard_normal((size, dimensions)) * 0.6
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    
+    probes = vectors[rng.integers(0, size, queries)] + rng.standard_normal((queries, dimensions)).astype(np.float32) * 0.02
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    expected = [set(np.argsort(-(vectors @ probe))[:TOP_K].tolist()) for probe in probes]
+    return vectors, probes, expected
+
+def worker(quantization: str, rescore: bool, factor: int, size: int, dimensions: int, queries: int) -> dict:
+    """Measure one storage mode (runs in its own process)"""
+    from services.memmap_store import MemmapVectorStore
+    
+    vectors, probes, expected = fixture(size, dimensions, queries)
+    ids = [f"doc.txt_{i:08d}" for i in range(size)]
+    workdir = tempfile.mkdtemp(prefix="bench_quant_")
+    
+    try:
+        store = MemmapVectorStore(workdir, quantization, rescore)
+        store.create(1)
+        for offset in range(0, size, BATCH):
+            end = min(offset + BATCH, size)
+            store.add(
+                1,
+                ids[offset:end],
+                [""] * (end - offset),
+                vectors[offset:end].tolist(),
+                [{"filename": "doc.txt", "chunk_index": i} for i in range(offset, end)]
+            )
+        del store
+        gc.collect()
+        
+        chat_dir = Path(workdir) / "chat_1"
+        scanned = {"none": ["vectors.f32"], "float16": ["vectors.f16"], "int8": ["vectors.i8", "scales.f32"]}[quantization]
+        scanned_bytes = sum((chat_dir / name).stat().st_size for name in scanned)
+        disk_bytes = sum(path.stat().st_size for path in chat_dir.iterdir() if path.suffix in (".f32", ".f16", ".i8"))
+        
+        # Reopen as after a restart; the log replay is the same for every mode
+        store = MemmapVectorStore(workdir)
+        chat = store._get(1)
+        baseline = rss_mb()
+        
+        latencies = []
+        hits = 0
+        for probe, truth in zip(probes, expected):
+            start = time.perf_counter()
+            results = chat.search(probe, TOP_K, rescore_factor=factor or None)
+            latencies.append(time.perf_counter() - start)
+            hits += len(truth & {int(result["id"].rsplit("_", 1)[1]) for result in results})
+        
+        return {
+            "scanned_bytes_per_vector": scanned_bytes / size,
+            "disk_mb": disk_bytes / 1024 / 1024,
+            "rss_mb": rss_mb() - baseline,
+            "query_ms": sum(latencies) / len(latencies) * 1000,
+            "recall": hits / (TOP_K * len(probes))
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run(mode, size: int, dimensions: int, queries: int) -> dict:
+    quantization, rescore, factor = mode
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", quantization, str(rescore), str(factor), str(size), str(dimensions), str(queries)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        args = sys.argv[2:]
+        print(json.dumps(worker(args[0], args[1] == "True", int(args[2]), int(args[3]), int(args[4]), int(args[5]))))
+        sys.exit(0)
+    
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    
+    print(f"{size} chunks, {dimensions}-dim vectors, recall@{TOP_K} over {queries} queries\n")
+    print(f"{'mode':<18} {'bytes/vec':>9} {'disk MB':>8} {'rss MB':>7} {'query ms':>9} {'recall':>7}")
+    for mode in MODES:
+        quantization, rescore, factor = mode
+        name = f"{quantization}+rescore x{factor}" if rescore else quantization
+        result = run(mode, size, dimensions, queries)
+        print(
+            f"{name:<18} {result['scanned_bytes_per_vector']:>9.0f} {result['disk_mb']:>8.1f} {result['rss_mb']:>7.1f} "
+            f"{result['query_ms']:>9.2f} {result['recall']:>7.3f}"
+        )
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Latency/quality benchmark for the rerank stage over a small fixture corpus.
+
+Candidates come from the BM25 index (no embedding service needed). Each
+reranker picks the final k from the candidate pool, and we report average
+latency, precision@k against hand-labelled relevant passages, how many
+near-duplicate passages made it into the context, and context size.
+
+Usage: python scripts/bench_rerank.py [candidates] [k]
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+from services.keyword_service import BM25Index
+from services.rerank_service import get_reranker
+
+# (topic, passage); overlapping copies mimic the chunker's 200-char overlap
+CORPUS = [
+    ("install", "To install the controller, mount the bracket XK-2231 on the wall and tighten the four M6 screws."),
+    ("install", "Mount the bracket XK-2231 on the wall and tighten the four M6 screws before attaching the controller."),
+    ("install", "After mounting, connect the controller to the bracket using the supplied ribbon cable."),
+    ("install", "Installation requires a 10 mm wrench, a level and the wall anchors included in the box."),
+    ("errors", "Error code E42 indicates the fan is overheating; check the air intake for dust."),
+    ("errors", "Error code E42 indicates the fan is overheating. Clean the intake and restart the unit."),
+    ("errors", "Error code E17 means the temperature sensor is disconnected or damaged."),
+    ("errors", "If an error code persists after a restart, contact support with the unit's serial number."),
+    ("power", "The unit draws 45 W at idle and up to 120 W under full load."),
+    ("power", "Use only the supplied 24 V power adapter; third-party adapters void the warranty."),
+    ("power", "Power consumption under full load can reach 120 W, so avoid shared extension cords."),
+    ("network", "The controller joins Wi-Fi networks on 2.4 GHz only; 5 GHz networks are not supported."),
+    ("network", "To reset network settings, hold the reset button for ten seconds until the LED blinks blue."),
+    ("network", "Static IP addresses can be configured from the web dashboard under Network > Advanced."),
+    ("maintenance", "Replace the air filter every six months, or every three months in dusty environments."),
+    ("maintenance", "Clean the air intake monthly with compressed air to prevent overheating errors such as E42."),
+    ("maintenance", "Firmware updates are installed automatically at 3 AM when the unit is idle."),
+    ("warranty", "The warranty covers manufacturing defects for two years from the date of purchase."),
+    ("warranty", "Damage caused by third-party power adapters is not covered by the warranty."),
+    ("warranty", "To file a warranty claim, register the product and keep the original receipt."),
+]
+
+# question -> indexes of relevant passages
+QUERIES = {
+    "How do I mount the XK-2231 bracket?": {0, 1, 2, 3},
+    "What does error E42 mean and how do I fix it?": {4, 5, 15},
+    "How much power does the unit use?": {8, 10, 9},
+    "Can I use 5 GHz Wi-Fi or a static IP?": {11, 13},
+    "What does the warranty cover for power adapters?": {18, 17, 9},
+    "How often should I clean or replace the filter?": {14, 15},
+}
+
+def near_duplicates(passages) -> int:
+    """Pairs of selected passages that share most of their words"""
+    word_sets = [set(p.lower().split()) for p in passages]
+    count = 0
+    for i in range(len(word_sets)):
+        for j in range(i + 1, len(word_sets)):
+            overlap = len(word_sets[i] & word_sets[j]) / len(word_sets[i] | word_sets[j])
+            if overlap > 0.6:
+                count += 1
+    return count
+
+def run(reranker_name: str, candidates: int, k: int, repeats: int = 200):
+    index = BM25Index()
+    for i, (_, passage) in enumerate(CORPUS):
+        index.add(str(i), passage)
+    
+    reranker = get_reranker(reranker_name)
+    precision = duplicates = context_chars = 0.0
+    elapsed = 0.0
+    
+    for question, relevant in QUERIES.items():
+        hits = index.search(question, candidates)
+        docs = [
+            {"id": doc_id, "content": CORPUS[int(doc_id)][1], "filename": "manual.pdf", "score": score}
+            for doc_id, score in hits
+        ]
+        
+        start = time.perf_counter()
+        for _ in range(repeats):
+            selected = reranker.rerank(question, docs, k)
+        elapsed += (time.perf_counter() - start) / repeats
+        
+        selected_ids = {int(doc["id"]) for doc in selected}
+        precision += len(selected_ids & relevant) / k
+        duplicates += near_duplicates([doc["content"] for doc in selected])
+        context_chars += sum(len(doc["content"]) for doc in selected)
+    
+    n = len(QUERIES)
+    return elapsed / n * 1000, precision / n, duplicates / n, context_chars / n
+
+if __name__ == "__main__":
+    candidates = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    
+    print(f"{len(CORPUS)} passages, {len(QUERIES)} queries, {candidates} candidates -> top {k}")
+    print(f"{'reranker':<10} {'latency ms':>10} {'precision@k':>12} {'dup pairs':>10} {'context chars':>14}")
+    for name in ("none", "mmr"):
+        latency, precision, duplicates, chars = run(name, candidates, k)
+        print(f"{name:<10} {latency:>10.3f} {precision:>12.2f} {duplicates:>10.2f} {chars:>14.0f}")
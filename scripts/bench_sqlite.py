@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Concurrency stress benchmark for the SQLite engine profiles.
+
+Each profile runs in a fresh process against a fresh database file:
+
+- async chat requests read recent history and save a question/answer pair,
+  like send_message
+- worker threads update document status rows, like the ingestion service
+- reader threads page through chat messages, like the frontend
+
+Reports saved message pairs per second, save latency percentiles and how
+many operations failed (e.g. "database is locked").
+
+Usage: python scripts/bench_sqlite.py [requests] [concurrency]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+PROFILES = [
+    ("default (rollback journal)", {"SQLITE_PROFILE": "default", "DB_BATCH_WRITES": "False"}),
+    ("tuned (WAL + pragmas)", {"SQLITE_PROFILE": "tuned", "DB_BATCH_WRITES": "False"}),
+    ("tuned + batched writes", {"SQLITE_PROFILE": "tuned", "DB_BATCH_WRITES": "True"})
+]
+
+CHATS = 50
+DOCUMENT_THREADS = 2
+READER_THREADS = 2
+# Pause between background operations so the threads add lock contention
+# without simply starving the event loop of CPU
+BACKGROUND_PAUSE = 0.01
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run_worker(requests: int, concurrency: int) -> dict:
+    """Run the workload against the engine configured by the environment"""
+    from sqlalchemy import select
+    from database import create_tables, SessionLocal, AsyncSessionLocal, async_engine, engine, ChatSession, Message, Document
+    from services.message_writer import message_writer
+    
+    create_tables()
+    with SessionLocal() as db:
+        db.add_all([ChatSession(name=f"Chat {i}") for i in range(CHATS)])
+        db.flush()
+        db.add_all([
+            Document(chat_session_id=chat.id, filename="doc.txt", file_path="doc.txt", file_type="txt")
+            for chat in db.query(ChatSession).all()
+        ])
+        db.commit()
+    
+    errors = {"save": 0, "document": 0, "read": 0}
+    stop = threading.Event()
+    
+    def document_updates():
+        """Ingestion-style status updates from worker threads"""
+        count = 0
+        while not stop.is_set():
+            try:
+                with SessionLocal() as db:
+                    document = db.get(Document, count % CHATS + 1)
+                    document.status = "processing" if count % 2 else "completed"
+                    document.chunk_count = count
+                    db.commit()
+            except Exception:
+                errors["document"] += 1
+            count += 1
+            stop.wait(BACKGROUND_PAUSE)
+    
+    def reads():
+        """Paged message reads from the threadpool"""
+        count = 0
+        while not stop.is_set():
+            try:
+                with SessionLocal() as db:
+                    db.query(Message.id, Message.content).filter(
+                        Message.chat_session_id == count % CHATS + 1
+                    ).order_by(Message.timestamp.desc(), Message.id.desc()).limit(100).all()
+            except Exception:
+                errors["read"] += 1
+            count += 1
+            stop.wait(BACKGROUND_PAUSE)
+    
+    async def chat_requests(worker: int, latencies: list):
+        for i in range(worker, requests, concurrency):
+            chat_id = i % CHATS + 1
+            start = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.scalars(
+                        select(Message).where(Message.chat_session_id == chat_id)
+                        .order_by(Message.timestamp.desc(), Message.id.desc()).limit(6)
+                    )
+                await message_writer.save([
+                    Message(chat_session_id=chat_id, content=f"question {i}", role="user"),
+                    Message(chat_session_id=chat_id, content=f"answer {i} " + "lorem ipsum " * 40, role="assistant", sources='["doc.txt"]')
+                ])
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors["save"] += 1
+    
+    async def run_requests():
+        latencies = []
+        await asyncio.gather(*(chat_requests(worker, latencies) for worker in range(concurrency)))
+        await message_writer.aclose()
+        await async_engine.dispose()
+        return latencies
+    
+    threads = [threading.Thread(target=document_updates) for _ in range(DOCUMENT_THREADS)]
+    threads += [threading.Thread(target=reads) for _ in range(READER_THREADS)]
+    for thread in threads:
+        thread.start()
+    
+    start = time.perf_counter()
+    try:
+        latencies = asyncio.run(run_requests())
+    finally:
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    
+    return {
+        "pairs_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors
+    }
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--worker"]:
+        logging.disable(logging.WARNING)
+        print(json.dumps(run_worker(int(sys.argv[2]), int(sys.argv[3]))))
+        sys.exit(0)
+    
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    
+    print(f"{requests} requests, {concurrency} concurrent, {DOCUMENT_THREADS} status writer and {READER_THREADS} reader threads\n")
+    print(f"{'profile':<28} {'pairs/sec':>10} {'p50 ms':>9} {'p99 ms':>9}  errors (save/document/read)")
+    
+    for name, env in PROFILES:
+        workdir = tempfile.mkdtemp(prefix="bench_sqlite_")
+        try:
+            result = subprocess.run(
+                [sys.executable, __file__, "--worker", str(requests), str(concurrency)],
+                env={**os.environ, **env, "DATABASE_URL": f"sqlite:///{workdir}/bench.db", "DEBUG": "False"},
+                cwd=workdir,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        errors = stats["errors"]
+        print(
+            f"{name:<28} {stats['pairs_per_sec']:>10.0f} {stats['p50_ms']:>9.1f} {stats['p99_ms']:>9.1f}  "
+            f"{errors['save']}/{errors['document']}/{errors['read']}"
+        )
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Benchmark the vector store backends (Chroma vs NumPy memmap) across corpus sizes.
+
+Each backend/size pair runs in a fresh subprocess against a temporary
+directory, so RSS and startup numbers are not polluted by the other runs.
+Embeddings are random unit vectors; queries are perturbed copies of stored
+chunks, so recall@k against exact search is meaningful for the ANN backend.
+
+- ingest: chunks/s writing batches of 256, like the ingestion pipeline
+- reopen: time to open the store again and answer a first query
+- query: mean and p95 latency of top-k searches
+- recall: overlap with the exact top-k
+- rss: resident memory added by the store after ingest and queries
+
+Usage: python scripts/bench_vector_store.py [sizes] [dimensions] [queries]
+       e.g. python scripts/bench_vector_store.py 1000,5000,20000 384 200
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+BACKENDS = ("chroma", "memmap")
+BATCH = 256
+TOP_K = 10
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def worker(backend: str, size: int, dimensions: int, queries: int) -> dict:
+    """Measure one backend at one corpus size (runs in its own process)"""
+    import numpy as np
+    
+    workdir = tempfile.mkdtemp(prefix="bench_vectors_")
+    os.environ.update({
+        "CHROMA_DB_PATH": f"{workdir}/chroma",
+        "VECTOR_STORE_PATH": f"{workdir}/memmap",
+        "UPLOAD_DIR": f"{workdir}/uploads",
+        "LOG_DIR": f"{workdir}/logs"
+    })
+    
+    from services.vector_store import create_vector_store
+    
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((size, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    probes = vectors[rng.integers(0, size, queries)] + rng.normal(0, 0.05, (queries, dimensions)).astype(np.float32)
+    expected = [set(np.argsort(-(vectors @ probe))[:TOP_K].tolist()) for probe in probes]
+    ids = [f"doc.txt_{i:08d}" for i in range(size)]
+    
+    try:
+        baseline = rss_mb()
+        store = create_vector_store(backend)
+        store.create(1)
+        
+        start = time.perf_counter()
+        for offset in range(0, size, BATCH):
+            end = min(offset + BATCH, size)
+            store.add(
+                1,
+                ids[offset:end],
+                [f"chunk {i} text" for i in range(offset, end)],
+                vectors[offset:end].tolist(),
+                [{"filename": "doc.txt", "chunk_index": i} for i in range(offset, end)]
+            )
+        ingest = time.perf_counter() - start
+        
+        # Reopen as a restarted server would, timing the first query too
+        del store
+        start = time.perf_counter()
+        store = create_vector_store(backend)
+        store.search(1, probes[0].tolist(), TOP_K)
+        reopen = time.perf_counter() - start
+        
+        latencies = []
+        hits = 0
+        for probe, truth in zip(probes, expected):
+            query = probe.tolist()
+            start = time.perf_counter()
+            results = store.search(1, query, TOP_K)
+            latencies.append(time.perf_counter() - start)
+            hits += len(truth & {int(result["id"].rsplit("_", 1)[1]) for result in results})
+        
+        latencies.sort()
+        return {
+            "ingest_chunks_per_s": size / ingest,
+            "reopen_ms": reopen * 1000,
+            "query_mean_ms": sum(latencies) / len(latencies) * 1000,
+            "query_p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            "recall": hits / (TOP_K * len(probes)),
+            "rss_mb": rss_mb() - baseline
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run(backend: str, size: int, dimensions: int, queries: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", backend, str(size), str(dimensions), str(queries)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        backend, size, dimensions, queries = sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+        print(json.dumps(worker(backend, size, dimensions, queries)))
+        sys.exit(0)
+    
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1000, 5000, 20000]
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    
+    print(f"{dimensions}-dim vectors, top-{TOP_K}, {queries} queries per run\n")
+    print(f"{'backend':<8} {'chunks':>7} {'ingest/s':>10} {'reopen ms':>10} {'query ms':>9} {'p95 ms':>8} {'recall':>7} {'rss MB':>7}")
+    for size in sizes:
+        for backend in BACKENDS:
+            result = run(backend, size, dimensions, queries)
+            print(
+                f"{backend:<8} {size:>7} {result['ingest_chunks_per_s']:>10.0f} {result['reopen_ms']:>10.1f} "
+                f"{result['query_mean_ms']:>9.2f} {result['query_p95_ms']:>8.2f} {result['recall']:>7.3f} {result['rss_mb']:>7.1f}"
+            )
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Measure per-message workflow construction overhead.
+
+Compares building and compiling the LangGraph workflow on every message
+(the previous behaviour) with fetching the cached compiled workflow.
+
+Usage: python scripts/bench_workflow.py [iterations]
+"""
+import sys
+import time
+import logging
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+from agents.workflows.chat_workflow import create_chat_workflow, get_chat_workflow, invalidate_chat_workflow
+
+def time_per_call(fn, iterations: int) -> float:
+    """Average seconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    
+    # Silence the per-build log line so it doesn't dominate the measurement
+    logging.disable(logging.INFO)
+    
+    invalidate_chat_workflow()
+    rebuild = time_per_call(create_chat_workflow, iterations)
+    cached = time_per_call(get_chat_workflow, iterations)
+    
+    print(f"Iterations:            {iterations}")
+    print(f"Rebuild per message:   {rebuild * 1000:.3f} ms")
+    print(f"Cached per message:    {cached * 1000:.4f} ms")
+    print(f"Speedup:               {rebuild / cached:.0f}x")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Move per-chat Chroma collections (chat_{id}) into the shared collections.
+
+Run it with the backend stopped, then start the backend with
+CHROMA_TENANCY=shared. Chunks are copied in batches with their stored
+embeddings, so nothing is embedded again. A chat's old collection is only
+dropped once the shared collections hold the same number of chunks.
+Writes are upserts, so an interrupted migration can simply be run again.
+
+Usage: python scripts/migrate_chroma_tenancy.py [--batch N] [--keep] [--dry-run]
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+# Add src to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src" / "backend"))
+
+from services.chroma_store import ChromaVectorStore, SharedChromaVectorStore
+from config import settings
+
+def migrate_chat(source: ChromaVectorStore, target: SharedChromaVectorStore, chat_id: int, batch: int) -> int:
+    """Copy one chat's chunks, returning how many were copied"""
+    collection = source.get_collection(chat_id)
+    copied = 0
+    while True:
+        results = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch, offset=copied)
+        if not results["ids"]:
+            return copied
+        
+        target.add(chat_id, results["ids"], results["documents"], results["embeddings"], results["metadatas"])
+        copied += len(results["ids"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move per-chat Chroma collections into shared collections")
+    parser.add_argument("--batch", type=int, default=500, help="chunks copied per write")
+    parser.add_argument("--keep", action="store_true", help="keep the per-chat collections after copying")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be migrated")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    
+    source = ChromaVectorStore()
+    chat_ids = sorted(source.list_chats())
+    print(f"{len(chat_ids)} per-chat collections in {settings.CHROMA_DB_PATH}")
+    
+    if args.dry_run:
+        print(f"{sum(source.count(chat_id) for chat_id in chat_ids)} chunks would move into {settings.CHROMA_SHARED_COLLECTIONS} shared collections")
+        sys.exit(0)
+    
+    target = SharedChromaVectorStore()
+    start = time.perf_counter()
+    moved = 0
+    failed = []
+    for number, chat_id in enumerate(chat_ids, start=1):
+        try:
+            copied = migrate_chat(source, target, chat_id, args.batch)
+            stored = target.count(chat_id)
+            if stored != copied:
+                raise Exception(f"shared collection holds {stored} chunks, expected {copied}")
+            
+            if not args.keep:
+                source.delete(chat_id)
+            moved += copied
+        except Exception as e:
+            failed.append(chat_id)
+            print(f"chat {chat_id}: {str(e)}, per-chat collection kept")
+        
+        if number % 100 == 0 or number == len(chat_ids):
+            print(f"{number}/{len(chat_ids)} chats, {moved} chunks, {time.perf_counter() - start:.1f}s")
+    
+    print(f"Migrated {len(chat_ids) - len(failed)} chats ({moved} chunks)" + (f", failed: {failed}" if failed else ""))
+    sys.exit(1 if failed else 0)
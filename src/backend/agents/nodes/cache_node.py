@@ -0,0 +1,113 @@
+import re
+import logging
+from typing import Dict, Any, List, Optional
+from agents.schemas.chat_state import ChatState
+from services.answer_cache import answer_cache
+from services.embedding_service import embedding_service
+from services.vector_service import vector_service
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Words that point back into the conversation ("explain that", "and the second one?")
+_REFERENCE_PATTERN = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|she|him|her|former|latter|"
+    r"above|previous|earlier|again|more|else|same|one|ones)\b|^\s*(and|but|also|what about|how about)\b",
+    re.IGNORECASE
+)
+
+def _is_follow_up(state: ChatState) -> bool:
+    """Whether the question depends on earlier turns of the conversation
+    
+    Such questions mean something different after every exchange, so they
+    bypass the cache. Standalone questions are cached regardless of history.
+    """
+    if not state.get("chat_history") and not state.get("conversation_summary"):
+        return False
+    return bool(_REFERENCE_PATTERN.search(state["question"]))
+
+def _variant(state: ChatState) -> str:
+    """Settings that change the answer for the same question and documents"""
+    return f"{state.get('search_mode') or settings.RETRIEVAL_MODE}|{settings.OLLAMA_MODEL}"
+
+def _fingerprint(chat_id: int) -> Optional[str]:
+    """Document fingerprint to cache against, or None to skip the cache
+    
+    Chats without documents skip it so they never pay for a question embedding.
+    """
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    version = vector_service.collection_version(chat_id)
+    return str(version) if version else None
+
+def _lookup(state: ChatState, query_embedding: List[float], fingerprint: str) -> Dict[str, Any]:
+    """Look the question up and build the node's state update"""
+    chat_id = state["chat_id"]
+    
+    cached = answer_cache.lookup(chat_id, query_embedding, fingerprint, _variant(state))
+    if cached is None:
+        # Retrieval reuses this embedding instead of computing it again
+        return {"cache_hit": None, "query_embedding": query_embedding, "cache_fingerprint": fingerprint}
+    
+    logger.info(f"Answer cache hit for chat {chat_id} (similarity {cached['similarity']:.3f})")
+    
+    return {
+        "cache_hit": {
+            "similarity": round(cached["similarity"], 4),
+            "cached_question": cached["question"],
+            "age_seconds": round(cached["age_seconds"], 1)
+        },
+        "query_embedding": query_embedding,
+        "response": cached["response"],
+        "sources": cached["sources"],
+        "context": cached["context"],
+        "has_documents": True
+    }
+
+async def acheck_answer_cache(state: ChatState) -> Dict[str, Any]:
+    """Reuse a cached answer for a near-identical earlier question"""
+    
+    chat_id = state["chat_id"]
+    
+    fingerprint = None if _is_follow_up(state) else _fingerprint(chat_id)
+    if fingerprint is None:
+        return {"cache_hit": None}
+    
+    try:
+        return _lookup(state, await embedding_service.aget_single_embedding(state["question"]), fingerprint)
+    
+    except Exception as e:
+        logger.warning(f"Answer cache lookup failed for chat {chat_id}: {str(e)}")
+        return {"cache_hit": None}
+
+def store_answer_cache(state: ChatState) -> Dict[str, Any]:
+    """Remember a freshly generated answer"""
+    
+    chat_id = state["chat_id"]
+    query_embedding = state.get("query_embedding")
+    
+    # Only answers grounded in this chat's documents are cached, and never failures
+    if query_embedding is None or state.get("generation_error") or not state.get("response"):
+        return {}
+    
+    try:
+        answer_cache.store(
+            chat_id,
+            state["question"],
+            query_embedding,
+            # Documents seen at lookup time; if they changed since, the entry just never matches
+            state["cache_fingerprint"],
+            state["response"],
+            state.get("sources") or [],
+            state.get("context") or "",
+            _variant(state)
+        )
+    
+    except Exception as e:
+        logger.warning(f"Failed to cache answer for chat {chat_id}: {str(e)}")
+    
+    return {}
+
+def route_after_cache(state: ChatState) -> str:
+    """Skip retrieval and generation on a cache hit"""
+    return "save_message" if state.get("cache_hit") else "retrieve"
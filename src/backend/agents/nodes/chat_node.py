@@ -1,67 +1,127 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
+from langgraph.config import get_stream_writer
 from agents.schemas.chat_state import ChatState
 from models.ollama_chat import ollama_chat
+from models.scheduler import generation_scheduler, SchedulerOverloaded
 from prompts.yaml_loader import prompt_loader
+from services.context_builder import context_builder
 
 logger = logging.getLogger(__name__)
 
-def generate_response(state: ChatState) -> Dict[str, Any]:
-    """Generate chat response using LLM"""
+def build_messages(state: ChatState) -> List[Dict[str, str]]:
+    """Build model messages from workflow state"""
     
     question = state["question"]
     context = state.get("context", "")
     sources = state.get("sources", [])
     chat_history = state.get("chat_history", [])
+    summary = state.get("conversation_summary") or ""
     has_documents = state.get("has_documents", False)
     
+    # Get system prompt
+    system_prompt = prompt_loader.get_system_prompt("chat_assistant")
+    
+    # Keep as much recent history as fits next to the context and the summary
+    history = []
+    if has_documents and context and chat_history:
+        history = context_builder.trim_history(
+            chat_history, _history_budget(system_prompt, context, question) - context_builder.estimate_tokens(summary)
+        )
+    
+    # Choose prompt template based on context availability
+    if not has_documents or not context:
+        # No documents available
+        user_prompt = prompt_loader.format_prompt(
+            "chat", "no_context",
+            question=question
+        )
+    elif history or summary:
+        # Has context and chat history
+        chat_history_text = "\n".join([
+            f"{msg['role']}: {msg['content']}"
+            for msg in history
+        ])
+        if summary:
+            chat_history_text = f"Summary of earlier conversation: {summary}\n\n{chat_history_text}".rstrip()
+        user_prompt = prompt_loader.format_prompt(
+            "chat", "follow_up",
+            chat_history=chat_history_text,
+            context=context,
+            sources=", ".join(sources),
+            question=question
+        )
+    else:
+        # Has context but no chat history
+        user_prompt = prompt_loader.format_prompt(
+            "chat", "rag_response",
+            context=context,
+            sources=", ".join(sources),
+            question=question
+        )
+    
+    # Format messages for model
+    return ollama_chat.format_messages(
+        system_prompt=system_prompt,
+        user_message=user_prompt
+    )
+
+def _history_budget(system_prompt: str, context: str, question: str) -> int:
+    """Tokens left for chat history once everything else is in the prompt"""
+    template = prompt_loader.get_chat_prompt("follow_up")
+    used = sum(
+        context_builder.estimate_tokens(text)
+        for text in (system_prompt, template, context, question)
+    )
+    return context_builder.prompt_budget(ollama_chat.model_name) - used
+
+async def agenerate_response(state: ChatState) -> Dict[str, Any]:
+    """Generate chat response using LLM"""
+    
+    question = state["question"]
+    
     try:
-        # Get system prompt
-        system_prompt = prompt_loader.get_system_prompt("chat_assistant")
+        messages = build_messages(state)
         
-        # Choose prompt template based on context availability
-        if not has_documents or not context:
-            # No documents available
-            user_prompt = prompt_loader.format_prompt(
-                "chat", "no_context",
-                question=question
-            )
-        elif chat_history:
-            # Has context and chat history
-            chat_history_text = "\n".join([
-                f"{msg['role']}: {msg['content']}" 
-                for msg in chat_history[-3:]  # Last 3 exchanges
-            ])
-            user_prompt = prompt_loader.format_prompt(
-                "chat", "follow_up",
-                chat_history=chat_history_text,
-                context=context,
-                sources=", ".join(sources),
-                question=question
-            )
-        else:
-            # Has context but no chat history
-            user_prompt = prompt_loader.format_prompt(
-                "chat", "rag_response",
-                context=context,
-                sources=", ".join(sources),
-                question=question
-            )
+        response, queue = await generation_scheduler.generate(messages, state["chat_id"])
         
-        # Format messages for model
-        messages = ollama_chat.format_messages(
-            system_prompt=system_prompt,
-            user_message=user_prompt
-        )
+        logger.info(f"Generated response for question: {question[:50]}...")
         
-        # Generate response
-        response = ollama_chat.generate_response(messages)
+        return {"response": response, "generation_queue": queue}
+    
+    except SchedulerOverloaded:
+        # Shed requests become a 429, not an apology in the chat
+        raise
+    except Exception as e:
+        logger.error(f"Response generation failed: {str(e)}")
+        return {
+            "response": f"Sorry, I encountered an error while generating a response: {str(e)}",
+            "generation_error": str(e)
+        }
+
+async def astream_generate_response(state: ChatState) -> Dict[str, Any]:
+    """Generate chat response using LLM, emitting tokens as they arrive"""
+    
+    question = state["question"]
+    writer = get_stream_writer()
+    tokens = []
+    
+    try:
+        messages = build_messages(state)
         
-        logger.info(f"Generated response for question: {question[:50]}...")
+        stream = generation_scheduler.stream(messages, state["chat_id"])
+        async for token in stream:
+            tokens.append(token)
+            writer({"type": "token", "content": token})
         
-        return {"response": response}
+        logger.info(f"Streamed response for question: {question[:50]}...")
         
+        return {"response": "".join(tokens), "generation_queue": stream.info}
+    
+    except SchedulerOverloaded:
+        raise
     except Exception as e:
-        logger.error(f"Response generation failed: {str(e)}")
-        return {"response": f"Sorry, I encountered an error while generating a response: {str(e)}"}
-    
\ No newline at end of file
+        logger.error(f"Streaming response generation failed: {str(e)}")
+        error_message = f"Sorry, I encountered an error while generating a response: {str(e)}"
+        writer({"type": "token", "content": error_message})
+        return {"response": "".join(tokens) + error_message, "generation_error": str(e)}
@@ -1,46 +1,38 @@
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any
 from agents.schemas.chat_state import ChatState
+from services.chat_memory import chat_memory
 
 logger = logging.getLogger(__name__)
 
-def load_chat_history(state: ChatState) -> Dict[str, Any]:
-    """Load chat history from database"""
+async def aload_chat_history(state: ChatState) -> Dict[str, Any]:
+    """Load recent chat history and the conversation summary"""
     
     chat_id = state["chat_id"]
     
     try:
-        # TODO: This will be implemented with database query
-        # For now, return empty history or what's passed in state
-        chat_history = state.get("chat_history", [])
+        memory = await chat_memory.aload(chat_id)
         
-        logger.info(f"Loaded {len(chat_history)} messages for chat {chat_id}")
-        
-        return {"chat_history": chat_history}
+        logger.info(f"Loaded {len(memory['history'])} messages for chat {chat_id}")
         
+        return {"chat_history": memory["history"], "conversation_summary": memory["summary"]}
+    
     except Exception as e:
         logger.error(f"Failed to load chat history for chat {chat_id}: {str(e)}")
-        return {"chat_history": []}
+        return {"chat_history": [], "conversation_summary": ""}
 
-def save_chat_message(state: ChatState) -> Dict[str, Any]:
+async def asave_chat_message(state: ChatState) -> Dict[str, Any]:
     """Save chat message to database"""
     
     chat_id = state["chat_id"]
-    question = state["question"]
-    response = state.get("response", "")
-    sources = state.get("sources", [])
     
     try:
-        # TODO: This will be implemented with database operations
-        # For now, just log the operation
-        logger.info(f"Saving message for chat {chat_id}")
-        logger.info(f"Question: {question[:50]}...")
-        logger.info(f"Response: {response[:50]}...")
-        logger.info(f"Sources: {sources}")
+        await chat_memory.asave(chat_id, state["question"], state.get("response") or "", state.get("sources") or [])
         
-        return {"message_saved": True}
+        logger.info(f"Saved message for chat {chat_id}")
         
+        return {"message_saved": True}
+    
     except Exception as e:
         logger.error(f"Failed to save chat message for chat {chat_id}: {str(e)}")
         return {"message_saved": False}
-    
\ No newline at end of file
@@ -0,0 +1,49 @@
+import logging
+from typing import Dict, Any
+from agents.schemas.chat_state import ChatState
+from services.rerank_service import get_reranker
+from services.context_builder import context_builder
+from models.ollama_chat import ollama_chat
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+def rerank_documents(state: ChatState) -> Dict[str, Any]:
+    """Rerank retrieved candidates and build context from the best ones"""
+    
+    chat_id = state["chat_id"]
+    question = state["question"]
+    candidates = state.get("retrieved_docs") or []
+    
+    if not candidates:
+        return {
+            "retrieved_docs": [],
+            "context": "",
+            "sources": []
+        }
+    
+    try:
+        reranker = get_reranker()
+        selected = reranker.rerank(question, candidates, settings.RERANK_TOP_K)
+    except Exception as e:
+        logger.error(f"Reranking failed for chat {chat_id}, keeping retrieval order: {str(e)}")
+        selected = candidates[:settings.RERANK_TOP_K]
+    
+    # Embeddings were only needed for reranking
+    selected = [
+        {key: value for key, value in doc.items() if key != "embedding"}
+        for doc in selected
+    ]
+    
+    # Merge overlapping chunks and pack them into the model's context budget
+    budget = context_builder.context_budget(ollama_chat.model_name)
+    context, used_docs = context_builder.build_context(selected, budget)
+    sources = list(dict.fromkeys([doc["filename"] for doc in used_docs]))
+    
+    logger.info(f"Reranked {len(candidates)} candidates to {len(selected)}, packed {len(used_docs)} blocks for chat {chat_id}")
+    
+    return {
+        "retrieved_docs": used_docs,
+        "context": context,
+        "sources": sources
+    }
@@ -1,62 +1,72 @@
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 from agents.schemas.chat_state import ChatState
+from services.embedding_service import embedding_service
 from services.vector_service import vector_service
+from config import settings
 
 logger = logging.getLogger(__name__)
 
-def retrieve_documents(state: ChatState) -> Dict[str, Any]:
+def _has_chunks(chat_id: int) -> bool:
+    return vector_service.collection_exists(chat_id) and vector_service.count_documents(chat_id) > 0
+
+def _no_results(has_documents: bool) -> Dict[str, Any]:
+    return {
+        "retrieved_docs": [],
+        "context": "",
+        "sources": [],
+        "has_documents": has_documents,
+        "needs_retrieval": False
+    }
+
+def _candidates(state: ChatState, similar_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """State update for retrieved candidates"""
+    if not similar_docs:
+        logger.info(f"No relevant documents found for question: {state['question']}")
+        return _no_results(True)
+    
+    logger.info(f"Retrieved {len(similar_docs)} candidate documents for chat {state['chat_id']}")
+    
+    # Context and sources are assembled by the rerank node from the final selection
+    return {
+        "retrieved_docs": similar_docs,
+        "context": "",
+        "sources": [],
+        "has_documents": True,
+        "needs_retrieval": True
+    }
+
+async def aretrieve_documents(state: ChatState) -> Dict[str, Any]:
     """Retrieve relevant documents from vector store"""
     
     chat_id = state["chat_id"]
     question = state["question"]
     
     try:
-        # Check if collection exists
-        if not vector_service.collection_exists(chat_id):
+        # Skip embedding the question entirely when the chat has no chunks
+        if not await asyncio.to_thread(_has_chunks, chat_id):
             logger.info(f"No documents found for chat {chat_id}")
-            return {
-                "retrieved_docs": [],
-                "context": "",
-                "sources": [],
-                "has_documents": False,
-                "needs_retrieval": False
-            }
+            return _no_results(False)
         
-        # Search for similar documents
-        similar_docs = vector_service.search_similar(chat_id, question, n_results=5)
+        mode = state.get("search_mode") or settings.RETRIEVAL_MODE
+        query_embedding = state.get("query_embedding")
+        if query_embedding is None and mode != "keyword":
+            query_embedding = await embedding_service.aget_single_embedding(question)
         
-        if not similar_docs:
-            logger.info(f"No relevant documents found for question: {question}")
-            return {
-                "retrieved_docs": [],
-                "context": "",
-                "sources": [],
-                "has_documents": True,
-                "needs_retrieval": False
-            }
-        
-        # Format context and sources
-        context = "\n\n".join([doc["content"] for doc in similar_docs])
-        sources = list(set([doc["filename"] for doc in similar_docs]))
-        
-        logger.info(f"Retrieved {len(similar_docs)} documents for chat {chat_id}")
-        
-        return {
-            "retrieved_docs": similar_docs,
-            "context": context,
-            "sources": sources,
-            "has_documents": True,
-            "needs_retrieval": True
-        }
+        # Over-fetch candidates cheaply; the rerank node narrows them down.
+        # Chroma and BM25 run in-process and block, so keep them off the event loop
+        similar_docs = await asyncio.to_thread(
+            vector_service.search,
+            chat_id, question,
+            n_results=settings.RETRIEVAL_CANDIDATES,
+            mode=mode,
+            include_embeddings=True,
+            query_embedding=query_embedding
+        )
         
+        return _candidates(state, similar_docs)
+    
     except Exception as e:
         logger.error(f"Document retrieval failed for chat {chat_id}: {str(e)}")
-        return {
-            "retrieved_docs": [],
-            "context": "",
-            "sources": [],
-            "has_documents": False,
-            "needs_retrieval": False
-        }
-    
\ No newline at end of file
+        return _no_results(False)
@@ -7,7 +7,9 @@ class ChatState(TypedDict):
     # Input
     chat_id: int
     question: str
-    chat_history: Optional[List[Dict[str, str]]]
+    chat_history: Optional[List[Dict[str, str]]]  # recent messages, loaded by the memory node
+    conversation_summary: Optional[str]  # rolling summary of older messages
+    search_mode: Optional[str]  # vector, keyword, hybrid; None uses the configured default
     
     # Retrieved context
     retrieved_docs: Optional[List[Dict[str, Any]]]
@@ -16,8 +18,15 @@ class ChatState(TypedDict):
     
     # Response
     response: Optional[str]
+    generation_error: Optional[str]
+    generation_queue: Optional[Dict[str, Any]]  # wait_ms, coalesced
+    
+    # Answer cache
+    query_embedding: Optional[List[float]]
+    cache_fingerprint: Optional[str]
+    cache_hit: Optional[Dict[str, Any]]  # similarity, cached_question, age_seconds
     
     # Metadata
     has_documents: bool
     needs_retrieval: bool
-    
\ No newline at end of file
+    message_saved: bool
@@ -1,30 +1,70 @@
+import asyncio
 import logging
-from typing import Dict, Any
+import functools
+import threading
+from typing import Dict, Any, Iterator, AsyncIterator
 from langgraph.graph import StateGraph, END
 from agents.schemas.chat_state import ChatState
-from agents.nodes.retrieve_node import retrieve_documents
-from agents.nodes.chat_node import generate_response
-from agents.nodes.memory_node import load_chat_history, save_chat_message
+from agents.nodes.retrieve_node import aretrieve_documents
+from agents.nodes.rerank_node import rerank_documents
+from agents.nodes.chat_node import agenerate_response, astream_generate_response
+from agents.nodes.memory_node import aload_chat_history, asave_chat_message
+from agents.nodes.cache_node import acheck_answer_cache, store_answer_cache, route_after_cache
+from models.scheduler import SchedulerOverloaded
+from services.metrics import metrics, NODE_DURATION
+from prompts.yaml_loader import prompt_loader
 
 logger = logging.getLogger(__name__)
 
-def create_chat_workflow():
-    """Create LangGraph workflow for chat processing"""
+# Compiled workflows keyed by variant; compiled graphs are safe to invoke concurrently
+_compiled_workflows: Dict[str, Any] = {}
+_workflow_lock = threading.Lock()
+
+def _timed_node(name: str, node):
+    """Wrap a node so its duration is recorded under its name"""
+    if asyncio.iscoroutinefunction(node):
+        async def timed(state: ChatState) -> Dict[str, Any]:
+            with metrics.timed(NODE_DURATION, stage=name, node=name):
+                return await node(state)
+    else:
+        def timed(state: ChatState) -> Dict[str, Any]:
+            with metrics.timed(NODE_DURATION, stage=name, node=name):
+                return node(state)
+    
+    return functools.wraps(node)(timed)
+
+def create_chat_workflow(streaming: bool = False):
+    """Create LangGraph workflow for chat processing
+    
+    The workflow runs with ``ainvoke``/``astream``. Every step that waits on I/O
+    is a coroutine node; the remaining nodes are quick CPU work.
+    """
     
     # Create workflow graph
     workflow = StateGraph(ChatState)
     
+    nodes = {
+        "load_memory": aload_chat_history,
+        "check_cache": acheck_answer_cache,
+        "retrieve": aretrieve_documents,
+        "rerank": rerank_documents,
+        "generate": astream_generate_response if streaming else agenerate_response,
+        "store_cache": store_answer_cache,
+        "save_message": asave_chat_message
+    }
+    
     # Add nodes
-    workflow.add_node("load_memory", load_chat_history)
-    workflow.add_node("retrieve", retrieve_documents)
-    workflow.add_node("generate", generate_response)
-    workflow.add_node("save_message", save_chat_message)
+    for name, node in nodes.items():
+        workflow.add_node(name, _timed_node(name, node))
     
     # Define workflow edges
     workflow.set_entry_point("load_memory")
-    workflow.add_edge("load_memory", "retrieve")
-    workflow.add_edge("retrieve", "generate")
-    workflow.add_edge("generate", "save_message")
+    workflow.add_edge("load_memory", "check_cache")
+    workflow.add_conditional_edges("check_cache", route_after_cache, ["retrieve", "save_message"])
+    workflow.add_edge("retrieve", "rerank")
+    workflow.add_edge("rerank", "generate")
+    workflow.add_edge("generate", "store_cache")
+    workflow.add_edge("store_cache", "save_message")
     workflow.add_edge("save_message", END)
     
     # Compile workflow
@@ -33,44 +73,175 @@ def create_chat_workflow():
     logger.info("Chat workflow created successfully")
     return app
 
-def process_chat_message(chat_id: int, question: str, chat_history: list = None) -> Dict[str, Any]:
-    """Process chat message through workflow"""
+def get_chat_workflow(streaming: bool = False):
+    """Get compiled workflow, building it on first use"""
+    key = "streaming" if streaming else "default"
+    
+    workflow = _compiled_workflows.get(key)
+    if workflow is None:
+        with _workflow_lock:
+            workflow = _compiled_workflows.get(key)
+            if workflow is None:
+                workflow = create_chat_workflow(streaming=streaming)
+                _compiled_workflows[key] = workflow
+    
+    return workflow
+
+def invalidate_chat_workflow() -> None:
+    """Drop compiled workflows and reload prompts; the next message rebuilds them"""
+    with _workflow_lock:
+        _compiled_workflows.clear()
+    
+    prompt_loader.reload()
+    logger.info("Chat workflow cache invalidated")
+
+def _initial_state(chat_id: int, question: str, search_mode: str = None) -> Dict[str, Any]:
+    """Build initial workflow state"""
+    return {
+        "chat_id": chat_id,
+        "question": question,
+        "chat_history": [],
+        "conversation_summary": "",
+        "search_mode": search_mode,
+        "retrieved_docs": None,
+        "context": None,
+        "sources": None,
+        "response": None,
+        "generation_error": None,
+        "generation_queue": None,
+        "query_embedding": None,
+        "cache_fingerprint": None,
+        "cache_hit": None,
+        "has_documents": False,
+        "needs_retrieval": False,
+        "message_saved": False
+    }
+
+def _cache_info(cache_hit: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Answer cache metadata for responses"""
+    return {"hit": True, **cache_hit} if cache_hit else {"hit": False}
+
+def _final_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Public result from final workflow state"""
+    return {
+        "response": result.get("response", ""),
+        "sources": result.get("sources", []),
+        "context": result.get("context", ""),
+        "has_documents": result.get("has_documents", False),
+        "cache": _cache_info(result.get("cache_hit")),
+        "queue": result.get("generation_queue"),
+        "saved": result.get("message_saved", False)
+    }
+
+def _error_result(error: Exception) -> Dict[str, Any]:
+    return {
+        "response": f"Sorry, I encountered an error while processing your message: {str(error)}",
+        "sources": [],
+        "context": "",
+        "has_documents": False,
+        "cache": _cache_info(None),
+        "queue": None,
+        "saved": False
+    }
+
+async def aprocess_chat_message(chat_id: int, question: str, search_mode: str = None) -> Dict[str, Any]:
+    """Process chat message through workflow
+    
+    Raises SchedulerOverloaded when the generation is shed under load.
+    """
     
     try:
-        # Create workflow
-        workflow = create_chat_workflow()
+        workflow = get_chat_workflow()
         
-        # Initial state
-        initial_state = {
-            "chat_id": chat_id,
-            "question": question,
-            "chat_history": chat_history or [],
-            "retrieved_docs": None,
-            "context": None,
-            "sources": None,
-            "response": None,
-            "has_documents": False,
-            "needs_retrieval": False
-        }
+        initial_state = _initial_state(chat_id, question, search_mode)
         
-        # Run workflow
-        result = workflow.invoke(initial_state)
+        result = await workflow.ainvoke(initial_state)
         
         logger.info(f"Chat workflow completed for chat {chat_id}")
         
-        return {
-            "response": result.get("response", ""),
-            "sources": result.get("sources", []),
-            "context": result.get("context", ""),
-            "has_documents": result.get("has_documents", False)
-        }
-        
+        return _final_result(result)
+    
+    except SchedulerOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Chat workflow failed for chat {chat_id}: {str(e)}")
-        return {
-            "response": f"Sorry, I encountered an error while processing your message: {str(e)}",
-            "sources": [],
-            "context": "",
-            "has_documents": False
+        return _error_result(e)
+
+def _stream_update(result: Dict[str, Any], chunk: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Fold one node update into the result, yielding any events it produces"""
+    if "check_cache" in chunk and chunk["check_cache"].get("cache_hit"):
+        # Replay the cached answer as a single token
+        cached = chunk["check_cache"]
+        result.update(
+            response=cached["response"],
+            sources=cached["sources"],
+            context=cached["context"],
+            has_documents=True,
+            cache=_cache_info(cached["cache_hit"])
+        )
+        yield {"type": "sources", "sources": result["sources"], "has_documents": True}
+        yield {"type": "token", "content": result["response"]}
+    elif "retrieve" in chunk:
+        result["has_documents"] = chunk["retrieve"].get("has_documents", False)
+    elif "rerank" in chunk:
+        reranked = chunk["rerank"]
+        result["sources"] = reranked.get("sources", [])
+        result["context"] = reranked.get("context", "")
+        yield {
+            "type": "sources",
+            "sources": result["sources"],
+            "has_documents": result["has_documents"]
         }
-    
\ No newline at end of file
+    elif "generate" in chunk:
+        result["response"] = chunk["generate"].get("response", "")
+        result["queue"] = chunk["generate"].get("generation_queue")
+    elif "save_message" in chunk:
+        result["saved"] = chunk["save_message"].get("message_saved", False)
+
+def _empty_stream_result() -> Dict[str, Any]:
+    return {
+        "response": "",
+        "sources": [],
+        "context": "",
+        "has_documents": False,
+        "cache": _cache_info(None),
+        "queue": None,
+        "saved": False
+    }
+
+async def astream_chat_message(chat_id: int, question: str, search_mode: str = None) -> AsyncIterator[Dict[str, Any]]:
+    """Process chat message through workflow, yielding events as they happen
+    
+    Yields a ``sources`` event once retrieval finishes, ``token`` events while
+    the model generates, and a final ``done`` event with the full result.
+    
+    Raises SchedulerOverloaded when the generation is shed under load.
+    """
+    
+    result = _empty_stream_result()
+    
+    try:
+        workflow = get_chat_workflow(streaming=True)
+        
+        initial_state = _initial_state(chat_id, question, search_mode)
+        
+        # "updates" carries node outputs, "custom" carries tokens from the generate node
+        async for mode, chunk in workflow.astream(initial_state, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                yield chunk
+                continue
+            
+            for event in _stream_update(result, chunk):
+                yield event
+        
+        logger.info(f"Chat stream completed for chat {chat_id}")
+    
+    except SchedulerOverloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Chat stream failed for chat {chat_id}: {str(e)}")
+        error_message = f"Sorry, I encountered an error while processing your message: {str(e)}"
+        result["response"] += error_message
+        yield {"type": "token", "content": error_message}
+    
+    yield {"type": "done", **result}
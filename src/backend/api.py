@@ -1,18 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session, Query as SQLQuery, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional, Literal, Tuple, BinaryIO
 import json
+import math
+import time
+import asyncio
+import zipfile
+from pathlib import Path
 from pydantic import BaseModel
-from database import get_db, ChatSession, Message, Document
-from services.document_service import document_service
+from database import get_db, get_async_db, ChatSession, Message, Document
+from config import settings
+from services.document_service import document_service, UploadTooLarge
 from services.vector_service import vector_service
+from services.ingestion_service import ingestion_service
+from services.bulk_ingestion import bulk_ingestion_service
+from services.answer_cache import answer_cache
+from services.chat_memory import chat_memory
+from services.metrics import start_request_timings, UPLOAD_STAGE_DURATION
 from models.ollama_chat import ollama_chat
-from agents.workflows.chat_workflow import process_chat_message
+from models.scheduler import generation_scheduler, SchedulerOverloaded
+from agents.workflows.chat_workflow import aprocess_chat_message, astream_chat_message
 
 router = APIRouter()
 
+ALLOWED_FILE_TYPES = ['.pdf', '.txt', '.md']
+
 class MessageRequest(BaseModel):
     message: str
+    search_mode: Optional[Literal["vector", "keyword", "hybrid"]] = None
+
+def _overloaded(error: SchedulerOverloaded) -> HTTPException:
+    """429 telling the client when to retry"""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
+def _file_ext(filename: str) -> str:
+    return '.' + filename.split('.')[-1].lower()
+
+def _wants_timings(header: Optional[str]) -> bool:
+    """Whether the X-Debug-Timings header asks for a timing breakdown"""
+    return header is not None and header.strip().lower() not in ("", "0", "false", "no")
+
+def _keyset_page(query: SQLQuery, model, sort_column, cursor: Optional[int], limit: int, response: Response) -> List[Any]:
+    """Newest-first page of rows, continuing after the row whose id is the cursor
+    
+    Pages are keyed on (sort column, id), so each page is an index range scan no
+    matter how deep it is. The id to continue from goes in the X-Next-Cursor header.
+    """
+    if cursor is not None:
+        if query.session.query(model.id).filter(model.id == cursor).first() is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        
+        # Compare against the stored values so timestamps never round-trip through Python
+        anchor = aliased(model)
+        query = query.filter(
+            tuple_(sort_column, model.id) < select(getattr(anchor, sort_column.key), anchor.id).where(anchor.id == cursor).scalar_subquery()
+        )
+    
+    rows = query.order_by(sort_column.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+async def _asave_messages(chat_id: int, question: str, result: Dict[str, Any]) -> None:
+    """Save a turn the workflow didn't persist itself (failures, interrupted streams)"""
+    await chat_memory.asave(chat_id, question, result["response"], result["sources"])
 
 @router.post("/chat")
 def create_chat(name: str, db: Session = Depends(get_db)):
@@ -28,9 +87,14 @@ def create_chat(name: str, db: Session = Depends(get_db)):
     return {"id": chat.id, "name": chat.name, "created_at": chat.created_at}
 
 @router.get("/chats")
-def get_chats(db: Session = Depends(get_db)):
-    """Get all chat sessions"""
-    chats = db.query(ChatSession).order_by(ChatSession.updated_at.desc()).all()
+def get_chats(
+    response: Response,
+    limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get chat sessions, most recently updated first"""
+    chats = _keyset_page(db.query(ChatSession), ChatSession, ChatSession.updated_at, cursor, limit, response)
     return [
         {
             "id": chat.id, 
@@ -51,104 +115,378 @@ async def upload_document(chat_id: int, file: UploadFile = File(...), db: Sessio
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Validate file type
-    allowed_types = ['.pdf', '.txt', '.md']
-    file_ext = '.' + file.filename.split('.')[-1].lower()
-    if file_ext not in allowed_types:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {allowed_types}")
+    file_ext = _file_ext(file.filename)
+    if file_ext not in ALLOWED_FILE_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {ALLOWED_FILE_TYPES}")
     
-    # Save file
-    file_content = await file.read()
-    file_path = document_service.save_file(file_content, file.filename, chat_id)
+    # Reject oversized files before copying anything
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the upload limit of {settings.MAX_UPLOAD_BYTES} bytes")
     
-    # Process document
-    doc_data = document_service.process_document(file_path)
+    # Copy to a part file block by block, hashing on the way; blocking I/O runs in a thread
+    started = time.perf_counter()
+    try:
+        upload = await asyncio.to_thread(document_service.spool_upload, file.file, chat_id)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    UPLOAD_STAGE_DURATION.observe(time.perf_counter() - started, stage="receive")
+    
+    try:
+        # Re-uploading a file updates the existing document instead of adding a copy
+        document = db.query(Document).filter(
+            Document.chat_session_id == chat_id,
+            Document.filename == file.filename
+        ).order_by(Document.id.desc()).first()
+        
+        if document is not None and document.content_hash == upload.content_hash and document.status != "failed":
+            return {
+                "message": "Document unchanged",
+                "filename": file.filename,
+                "document_id": document.id,
+                "job_id": None,
+                "status": "unchanged"
+            }
+        
+        # Move the complete file into place
+        started = time.perf_counter()
+        file_path = document_service.commit_upload(upload, file.filename, chat_id)
+        UPLOAD_STAGE_DURATION.observe(time.perf_counter() - started, stage="save")
+    finally:
+        # No-op once committed; unchanged or failed uploads don't leave a part file behind
+        document_service.discard_upload(upload)
     
     # Save to database
-    document = Document(
-        chat_session_id=chat_id,
-        filename=file.filename,
-        file_path=file_path,
-        file_type=file_ext[1:]  # Remove the dot
-    )
-    db.add(document)
+    if document is None:
+        document = Document(
+            chat_session_id=chat_id,
+            filename=file.filename,
+            file_path=file_path,
+            file_type=file_ext[1:]  # Remove the dot
+        )
+        db.add(document)
+    
+    document.status = "pending"
+    document.error = None
+    document.content_hash = upload.content_hash
     db.commit()
+    db.refresh(document)
     
-    # Add to vector store
-    vector_service.add_documents(chat_id, doc_data["chunks"], file.filename)
+    # Extract, chunk, embed and index in the background; only changed chunks are re-embedded
+    job = ingestion_service.submit(chat_id, document.id, file_path, file.filename)
     
     return {
-        "message": "Document uploaded successfully",
+        "message": "Document queued for processing",
         "filename": file.filename,
-        "chunks": doc_data["chunk_count"],
-        "total_characters": len(doc_data["total_text"])
+        "document_id": document.id,
+        "job_id": job.id,
+        "status": job.stage
+    }
+
+def _spool_bulk_files(files: List[UploadFile], chat_id: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Spool every document of a bulk upload, unpacking zip archives
+    
+    Returns per-file results in upload order and the accepted files with their
+    spooled uploads. Archive members are stored under their base name.
+    """
+    results = []
+    accepted = []
+    names = set()
+    total_bytes = 0
+    
+    def add(filename: str, source: BinaryIO) -> None:
+        nonlocal total_bytes
+        result = {"filename": filename, "status": "rejected", "document_id": None, "job_id": None, "detail": None}
+        results.append(result)
+        
+        if _file_ext(filename) not in ALLOWED_FILE_TYPES:
+            result.update(status="skipped", detail=f"Unsupported file type. Allowed: {ALLOWED_FILE_TYPES}")
+        elif filename in names:
+            result["detail"] = "Duplicate filename in this upload"
+        elif len(accepted) >= settings.BULK_MAX_FILES:
+            result["detail"] = f"More than {settings.BULK_MAX_FILES} files in one upload"
+        else:
+            max_bytes = min(settings.MAX_UPLOAD_BYTES, settings.BULK_MAX_TOTAL_BYTES - total_bytes)
+            try:
+                upload = document_service.spool_upload(source, chat_id, max_bytes=max(max_bytes, 1))
+            except UploadTooLarge as e:
+                result["detail"] = str(e)
+                return
+            
+            total_bytes += upload.size
+            names.add(filename)
+            result["status"] = "accepted"
+            accepted.append({"filename": filename, "upload": upload, "result": result})
+    
+    try:
+        for file in files:
+            if _file_ext(file.filename) != ".zip":
+                add(file.filename, file.file)
+                continue
+            
+            try:
+                with zipfile.ZipFile(file.file) as archive:
+                    for info in archive.infolist():
+                        name = Path(info.filename).name
+                        # Directories and macOS resource forks aren't documents
+                        if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                            continue
+                        with archive.open(info) as member:
+                            add(name, member)
+            except zipfile.BadZipFile as e:
+                results.append({"filename": file.filename, "status": "rejected", "document_id": None, "job_id": None, "detail": f"Invalid zip archive: {str(e)}"})
+    except BaseException:
+        for item in accepted:
+            document_service.discard_upload(item["upload"])
+        raise
+    
+    return results, accepted
+
+@router.post("/chat/{chat_id}/upload/bulk")
+async def upload_documents_bulk(
+    chat_id: int,
+    files: List[UploadFile] = File(...),
+    wait: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Upload many documents or zip archives and ingest them in one pipelined job
+    
+    With wait=true the response also carries the finished job's summary.
+    """
+    
+    chat = db.query(ChatSession).filter(ChatSession.id == chat_id).first()
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    # Archive extraction and copying are blocking I/O
+    started = time.perf_counter()
+    results, accepted = await asyncio.to_thread(_spool_bulk_files, files, chat_id)
+    UPLOAD_STAGE_DURATION.observe(time.perf_counter() - started, stage="bulk_receive")
+    
+    queued = []
+    try:
+        # Newest row per filename, like single uploads
+        existing = {}
+        if accepted:
+            for document in db.query(Document).filter(
+                Document.chat_session_id == chat_id,
+                Document.filename.in_([item["filename"] for item in accepted])
+            ).order_by(Document.id):
+                existing[document.filename] = document
+        
+        for item in accepted:
+            filename, upload, result = item["filename"], item["upload"], item["result"]
+            document = existing.get(filename)
+            
+            if document is not None and document.content_hash == upload.content_hash and document.status != "failed":
+                result.update(status="unchanged", document_id=document.id)
+                continue
+            
+            file_path = document_service.commit_upload(upload, filename, chat_id)
+            if document is None:
+                document = Document(
+                    chat_session_id=chat_id,
+                    filename=filename,
+                    file_path=file_path,
+                    file_type=_file_ext(filename)[1:]
+                )
+                db.add(document)
+            
+            document.status = "pending"
+            document.error = None
+            document.content_hash = upload.content_hash
+            queued.append((document, file_path, item))
+        
+        # Every row in one transaction
+        db.commit()
+    finally:
+        for item in accepted:
+            document_service.discard_upload(item["upload"])
+    
+    bulk = None
+    if queued:
+        bulk = bulk_ingestion_service.submit(chat_id, [(document.id, file_path, item["filename"]) for document, file_path, item in queued])
+        for (document, _, item), job in zip(queued, bulk.jobs):
+            item["result"].update(status="queued", document_id=document.id, job_id=job.id)
+    
+    response = {
+        "message": f"{len(queued)} documents queued for processing",
+        "bulk_id": bulk.id if bulk else None,
+        "files": results
     }
+    
+    if wait and bulk is not None:
+        await asyncio.to_thread(bulk.finished.wait)
+        response["summary"] = bulk.to_dict()
+    
+    return response
+
+@router.get("/chat/{chat_id}/bulk/{bulk_id}")
+def get_bulk_job(chat_id: int, bulk_id: str):
+    """Get bulk ingestion status, per-file results and throughput"""
+    
+    bulk = bulk_ingestion_service.get_job(bulk_id)
+    if not bulk or bulk.chat_id != chat_id:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    
+    return bulk.to_dict()
+
+@router.get("/chat/{chat_id}/jobs/{job_id}")
+def get_job(chat_id: int, job_id: str):
+    """Get document ingestion job status"""
+    
+    job = ingestion_service.get_job(job_id)
+    if not job or job.chat_id != chat_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job.to_dict()
 
 @router.post("/chat/{chat_id}/message")
-def send_message(chat_id: int, request: MessageRequest, db: Session = Depends(get_db)):
-    """Send message to chat using LangGraph workflow"""
+async def send_message(
+    chat_id: int,
+    request: MessageRequest,
+    x_debug_timings: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Send message to chat using LangGraph workflow
+    
+    With an X-Debug-Timings header the response includes where the time went.
+    """
+    
+    timings = start_request_timings() if _wants_timings(x_debug_timings) else None
     
     # Check if chat exists
-    chat = db.query(ChatSession).filter(ChatSession.id == chat_id).first()
+    chat = await db.get(ChatSession, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Check if Ollama is available
-    if not ollama_chat.is_available():
+    if not await ollama_chat.ais_available():
         raise HTTPException(status_code=503, detail="Ollama service is not available")
     
-    # Get chat history
-    recent_messages = db.query(Message).filter(
-        Message.chat_session_id == chat_id
-    ).order_by(Message.timestamp.desc()).limit(6).all()
+    # Shed load before doing any retrieval work for it
+    try:
+        generation_scheduler.check_admission()
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
     
-    # Format chat history (reverse to get chronological order)
-    chat_history = []
-    for msg in reversed(recent_messages):
-        chat_history.append({
-            "role": msg.role,
-            "content": msg.content
-        })
+    # Don't hold a pooled connection while the model runs
+    await db.close()
     
-    # Process message through workflow
-    result = process_chat_message(chat_id, request.message, chat_history)
+    # Process message through workflow; it loads history and saves the turn
+    try:
+        result = await aprocess_chat_message(chat_id, request.message, request.search_mode)
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
     
-    # Save user message
-    user_msg = Message(
-        chat_session_id=chat_id,
-        content=request.message,
-        role="user"
-    )
-    db.add(user_msg)
-    
-    # Save assistant message
-    assistant_msg = Message(
-        chat_session_id=chat_id,
-        content=result["response"],
-        role="assistant",
-        sources=json.dumps(result["sources"]) if result["sources"] else None
-    )
-    db.add(assistant_msg)
-    db.commit()
+    if not result["saved"]:
+        await _asave_messages(chat_id, request.message, result)
     
-    return {
+    body = {
         "response": result["response"],
         "sources": result["sources"],
         "has_documents": result["has_documents"],
-        "context_used": len(result["context"]) > 0
+        "context_used": len(result["context"]) > 0,
+        "cache": result["cache"],
+        "queue": result["queue"]
     }
+    if timings is not None:
+        body["timings"] = timings.to_dict()
+    return body
+
+@router.post("/chat/{chat_id}/message/stream")
+async def send_message_stream(
+    chat_id: int,
+    request: MessageRequest,
+    x_debug_timings: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Send message to chat and stream the response as server-sent events"""
+    
+    # Check if chat exists
+    chat = await db.get(ChatSession, chat_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    # Check if Ollama is available
+    if not await ollama_chat.ais_available():
+        raise HTTPException(status_code=503, detail="Ollama service is not available")
+    
+    try:
+        generation_scheduler.check_admission()
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
+    
+    await db.close()
+    
+    async def event_stream():
+        timings = start_request_timings() if _wants_timings(x_debug_timings) else None
+        result = None
+        tokens = []
+        try:
+            async for event in astream_chat_message(chat_id, request.message, request.search_mode):
+                if event["type"] == "token":
+                    tokens.append(event["content"])
+                
+                if event["type"] == "done":
+                    result = event
+                    done = {
+                        "sources": event["sources"],
+                        "has_documents": event["has_documents"],
+                        "context_used": len(event["context"]) > 0,
+                        "cache": event["cache"],
+                        "queue": event["queue"]
+                    }
+                    if timings is not None:
+                        done["timings"] = timings.to_dict()
+                    yield _sse_event("done", done)
+                else:
+                    yield _sse_event(event["type"], event)
+        except SchedulerOverloaded as e:
+            # Headers are already sent, so the 429 travels as an event
+            yield _sse_event("error", {
+                "status": 429,
+                "detail": str(e),
+                "retry_after": max(1, math.ceil(e.retry_after))
+            })
+        finally:
+            # Keep what the user saw if the stream ended before the workflow saved it
+            if result is None and tokens:
+                result = {"response": "".join(tokens), "sources": [], "saved": False}
+            
+            if result is not None and not result["saved"]:
+                # Shielded so a client disconnect can't cancel the write halfway
+                await asyncio.shield(_asave_messages(chat_id, request.message, result))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @router.get("/chat/{chat_id}/messages")
-def get_messages(chat_id: int, db: Session = Depends(get_db)):
-    """Get chat messages"""
+def get_messages(
+    chat_id: int,
+    response: Response,
+    limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get the latest chat messages in chronological order; the cursor pages back in time"""
     
     # Check if chat exists
-    chat = db.query(ChatSession).filter(ChatSession.id == chat_id).first()
+    chat = db.query(ChatSession.id).filter(ChatSession.id == chat_id).first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    messages = db.query(Message).filter(
-        Message.chat_session_id == chat_id
-    ).order_by(Message.timestamp).all()
+    # Plain column rows skip ORM identity tracking
+    query = db.query(
+        Message.id, Message.content, Message.role, Message.timestamp, Message.sources
+    ).filter(Message.chat_session_id == chat_id)
+    messages = _keyset_page(query, Message, Message.timestamp, cursor, limit, response)
     
     return [
         {
@@ -158,7 +496,7 @@ def get_messages(chat_id: int, db: Session = Depends(get_db)):
             "timestamp": msg.timestamp,
             "sources": json.loads(msg.sources) if msg.sources else []
         }
-        for msg in messages
+        for msg in reversed(messages)
     ]
 
 @router.delete("/chat/{chat_id}")
@@ -171,6 +509,8 @@ def delete_chat(chat_id: int, db: Session = Depends(get_db)):
     
     # Delete vector collection
     vector_service.delete_collection(chat_id)
+    answer_cache.invalidate(chat_id)
+    chat_memory.invalidate(chat_id)
     
     # Delete from database (cascade will handle messages and documents)
     db.delete(chat)
@@ -178,24 +518,65 @@ def delete_chat(chat_id: int, db: Session = Depends(get_db)):
     
     return {"message": "Chat deleted successfully"}
 
+@router.delete("/chat/{chat_id}/documents/{document_id}")
+def delete_document(chat_id: int, document_id: int, db: Session = Depends(get_db)):
+    """Delete document and its chunks"""
+    
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.chat_session_id == chat_id
+    ).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Older uploads may share a filename; keep the chunks while another copy remains
+    shared = db.query(Document).filter(
+        Document.chat_session_id == chat_id,
+        Document.filename == document.filename,
+        Document.id != document.id
+    ).count()
+    
+    # Plain values: the row is deleted by the time a running job stops
+    filename, file_path = document.filename, document.file_path
+    
+    def remove_data() -> None:
+        vector_service.delete_document(chat_id, filename)
+        document_service.delete_file(file_path)
+    
+    # Stop any ingestion still writing chunks for it; the chunks go once it has stopped
+    ingestion_service.cancel(document.id, then=None if shared else remove_data)
+    
+    db.delete(document)
+    db.commit()
+    
+    return {"message": "Document deleted successfully"}
+
 @router.get("/chat/{chat_id}/documents")
-def get_documents(chat_id: int, db: Session = Depends(get_db)):
-    """Get documents for chat"""
+def get_documents(
+    chat_id: int,
+    response: Response,
+    limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get documents for chat, newest first"""
     
     # Check if chat exists
-    chat = db.query(ChatSession).filter(ChatSession.id == chat_id).first()
+    chat = db.query(ChatSession.id).filter(ChatSession.id == chat_id).first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    documents = db.query(Document).filter(
-        Document.chat_session_id == chat_id
-    ).order_by(Document.processed_at.desc()).all()
+    query = db.query(Document).filter(Document.chat_session_id == chat_id)
+    documents = _keyset_page(query, Document, Document.processed_at, cursor, limit, response)
     
     return [
         {
             "id": doc.id,
             "filename": doc.filename,
             "file_type": doc.file_type,
+            "status": doc.status,
+            "chunk_count": doc.chunk_count,
+            "error": doc.error,
             "processed_at": doc.processed_at
         }
         for doc in documents
@@ -13,6 +13,20 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///data/database.db")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "tuned")  # tuned, default
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+    DB_BATCH_WRITES: bool = os.getenv("DB_BATCH_WRITES", "True").lower() == "true"  # group commit for chat messages
+    DB_WRITE_BATCH_SIZE: int = int(os.getenv("DB_WRITE_BATCH_SIZE", "256"))  # requests per commit
+    
+    # List endpoints
+    PAGE_SIZE: int = int(os.getenv("PAGE_SIZE", "100"))
+    MAX_PAGE_SIZE: int = int(os.getenv("MAX_PAGE_SIZE", "1000"))
     
     # FastAPI
     FASTAPI_HOST: str = os.getenv("FASTAPI_HOST", "localhost")
@@ -24,17 +38,100 @@ class Settings:
     # Ollama
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "mistral")
+    OLLAMA_TIMEOUT: float = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+    OLLAMA_MAX_CONNECTIONS: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+    OLLAMA_MAX_KEEPALIVE: int = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "20"))
+    
+    # Generation scheduling
+    OLLAMA_MAX_CONCURRENT: int = int(os.getenv("OLLAMA_MAX_CONCURRENT", "2"))  # generations sent to Ollama at once
+    GENERATION_MAX_QUEUE: int = int(os.getenv("GENERATION_MAX_QUEUE", "32"))
+    GENERATION_QUEUE_TIMEOUT: float = float(os.getenv("GENERATION_QUEUE_TIMEOUT", "60"))  # seconds
+    GENERATION_COALESCE: bool = os.getenv("GENERATION_COALESCE", "True").lower() == "true"
+    
+    # Backend health tracking
+    HEALTH_CACHE_TTL: float = float(os.getenv("HEALTH_CACHE_TTL", "30"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+    CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
     
     # Embedding Service
     EMBEDDING_API_URL: str = os.getenv("EMBEDDING_API_URL", "http://localhost:8000")
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_BATCH_MAX_CHARS: int = int(os.getenv("EMBEDDING_BATCH_MAX_CHARS", "32000"))
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+    EMBEDDING_RETRY_BACKOFF: float = float(os.getenv("EMBEDDING_RETRY_BACKOFF", "0.5"))
+    EMBEDDING_TIMEOUT: int = int(os.getenv("EMBEDDING_TIMEOUT", "60"))
+    # Change EMBEDDING_MODEL whenever the embedding service switches models so cached vectors are not reused
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "default")
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.db")
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
     
-    # ChromaDB
+    # Vector store
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma")  # chroma, memmap
     CHROMA_DB_PATH: str = os.getenv("CHROMA_DB_PATH", "data/vector_stores")
+    CHROMA_TENANCY: str = os.getenv("CHROMA_TENANCY", "collection")  # collection (one per chat), shared
+    CHROMA_SHARED_COLLECTIONS: int = int(os.getenv("CHROMA_SHARED_COLLECTIONS", "8"))  # chats spread over this many
+    VECTOR_STORE_PATH: str = os.getenv("VECTOR_STORE_PATH", "data/vector_memmap")  # memmap backend
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")  # none, float16, int8 (memmap backend, new chats)
+    VECTOR_RESCORE: bool = os.getenv("VECTOR_RESCORE", "True").lower() == "true"  # keep float32 on disk to rescore candidates
+    VECTOR_RESCORE_FACTOR: int = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))  # candidates per result rescored
+    
+    # Retrieval
+    KEYWORD_INDEX_PATH: str = os.getenv("KEYWORD_INDEX_PATH", "data/keyword_indexes")
+    KEYWORD_INDEX_CACHE_CHATS: int = int(os.getenv("KEYWORD_INDEX_CACHE_CHATS", "256"))  # indexes kept in memory
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")  # vector, keyword, hybrid
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    RETRIEVAL_CANDIDATES: int = int(os.getenv("RETRIEVAL_CANDIDATES", "30"))
+    RERANK_TOP_K: int = int(os.getenv("RERANK_TOP_K", "5"))
+    RERANKER: str = os.getenv("RERANKER", "mmr")  # mmr, none, or a name registered with register_reranker
+    MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", "0.7"))
+    
+    # Answer cache
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "True").lower() == "true"
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    ANSWER_CACHE_TTL: int = int(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_MAX_PER_CHAT: int = int(os.getenv("ANSWER_CACHE_MAX_PER_CHAT", "100"))
+    
+    # Conversation memory
+    MEMORY_WINDOW_MESSAGES: int = int(os.getenv("MEMORY_WINDOW_MESSAGES", "6"))  # recent messages kept verbatim
+    MEMORY_SUMMARY_EVERY_TURNS: int = int(os.getenv("MEMORY_SUMMARY_EVERY_TURNS", "3"))
+    MEMORY_SUMMARY_MAX_TOKENS: int = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+    MEMORY_CACHE_CHATS: int = int(os.getenv("MEMORY_CACHE_CHATS", "1000"))
+    
+    # Prompt budgeting
+    CONTEXT_WINDOW_TOKENS: int = int(os.getenv("CONTEXT_WINDOW_TOKENS", "4096"))
+    MODEL_CONTEXT_WINDOWS: str = os.getenv("MODEL_CONTEXT_WINDOWS", "")  # e.g. "mistral:8192,llama3:8192"
+    RESPONSE_RESERVE_TOKENS: int = int(os.getenv("RESPONSE_RESERVE_TOKENS", "512"))
+    CONTEXT_SHARE: float = float(os.getenv("CONTEXT_SHARE", "0.6"))  # share of the prompt budget for documents
+    CHARS_PER_TOKEN: int = int(os.getenv("CHARS_PER_TOKEN", "4"))
     
     # File Storage
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "data/uploads")
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+    UPLOAD_BLOCK_SIZE: int = int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024)))  # bytes per read/hash/write
     LOG_DIR: str = os.getenv("LOG_DIR", "data/logs")
     
+    # Ingestion
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_MAX_TRACKED_JOBS: int = int(os.getenv("INGEST_MAX_TRACKED_JOBS", "1000"))
+    INGEST_BATCH_CHUNKS: int = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+    BULK_MAX_FILES: int = int(os.getenv("BULK_MAX_FILES", "500"))  # per bulk request, archive members included
+    BULK_MAX_TOTAL_BYTES: int = int(os.getenv("BULK_MAX_TOTAL_BYTES", str(2 * 1024 * 1024 * 1024)))
+    BULK_QUEUE_DEPTH: int = int(os.getenv("BULK_QUEUE_DEPTH", "64"))  # batches buffered between pipeline stages
+    BULK_EMBED_BATCH_CHUNKS: int = int(os.getenv("BULK_EMBED_BATCH_CHUNKS", "512"))
+    BULK_INDEX_BATCH_CHUNKS: int = int(os.getenv("BULK_INDEX_BATCH_CHUNKS", "2048"))
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+    
+    # Chunking
+    CHUNK_STRATEGY: str = os.getenv("CHUNK_STRATEGY", "auto")  # auto, token, markdown, page
+    CHUNK_TOKENS: int = int(os.getenv("CHUNK_TOKENS", "200"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
+    
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
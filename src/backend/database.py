@@ -1,14 +1,86 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, ForeignKey
+import logging
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+# Async driver for each URL scheme whose driver ships in requirements.txt
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite"
+}
+
+def _async_database_url(url: str) -> str:
+    """Same database through its async driver"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+def _sqlite_pragmas(profile: str) -> dict:
+    """Connection pragmas for a SQLite profile
+    
+    "tuned" uses WAL so readers and the writer don't block each other, NORMAL
+    sync (never corrupts under WAL; only the last commits can be lost on power
+    failure), a larger page cache, memory-mapped reads and a busy timeout so
+    concurrent writers wait their turn instead of failing with "database is
+    locked". "default" keeps SQLite's rollback journal and defaults.
+    """
+    if profile == "default":
+        return {}
+    if profile != "tuned":
+        logger.warning(f"Unknown SQLite profile '{profile}', using tuned")
+    
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,  # negative means KiB, not pages
+        "mmap_size": settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+        "temp_store": "MEMORY"
+    }
+
+def _configure_sqlite(engine) -> None:
+    """Apply the SQLite profile's pragmas to every new connection"""
+    if engine.dialect.name != "sqlite":
+        return
+    
+    pragmas = _sqlite_pragmas(settings.SQLITE_PROFILE)
+    if not pragmas:
+        return
+    
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def _engine_options(url: str) -> dict:
+    """Pool settings; in-memory SQLite keeps SQLAlchemy's single-connection pool"""
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+    # Sync sessions are used from FastAPI's threadpool and the ingestion workers
+    return {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+
 # Database setup
-engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG, **_engine_options(settings.DATABASE_URL))
+_configure_sqlite(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the request path; the pool bounds concurrent connections
+async_engine = create_async_engine(
+    _async_database_url(settings.DATABASE_URL),
+    echo=settings.DEBUG,
+    **_engine_options(settings.DATABASE_URL)
+)
+_configure_sqlite(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 class ChatSession(Base):
     """Chat session model"""
     __tablename__ = "chat_sessions"
@@ -17,10 +89,15 @@ class ChatSession(Base):
     name = Column(String(255), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    summary = Column(Text, nullable=True)  # rolling summary of messages older than the memory window
+    summary_message_id = Column(Integer, nullable=True)  # last message folded into the summary
     
     # Relationships
     messages = relationship("Message", back_populates="chat_session", cascade="all, delete-orphan")
     documents = relationship("Document", back_populates="chat_session", cascade="all, delete-orphan")
+    
+    # Chat list pages, most recently updated first
+    __table_args__ = (Index("ix_chat_sessions_updated_at", "updated_at"),)
 
 class Message(Base):
     """Message model for chat history"""
@@ -35,6 +112,9 @@ class Message(Base):
     
     # Relationships
     chat_session = relationship("ChatSession", back_populates="messages")
+    
+    # Message pages and recent history per chat
+    __table_args__ = (Index("ix_messages_chat_timestamp", "chat_session_id", "timestamp"),)
 
 class Document(Base):
     """Document model for uploaded files"""
@@ -45,14 +125,49 @@ class Document(Base):
     filename = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=False)
     file_type = Column(String(10), nullable=False)  # pdf, txt, md
+    status = Column(String(20), nullable=False, default="pending", server_default="completed")  # pending, processing, completed, failed
+    chunk_count = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256 of the uploaded file
+    error = Column(Text, nullable=True)
     processed_at = Column(DateTime, server_default=func.now())
     
     # Relationships
     chat_session = relationship("ChatSession", back_populates="documents")
+    
+    # Document pages and filename lookups per chat
+    __table_args__ = (
+        Index("ix_documents_chat_processed_at", "chat_session_id", "processed_at"),
+        Index("ix_documents_chat_filename", "chat_session_id", "filename")
+    )
 
 def create_tables():
     """Create all database tables"""
     Base.metadata.create_all(bind=engine)
+    migrate_tables()
+
+def migrate_tables():
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = inspect(engine)
+    
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                
+                column_type = column.type.compile(dialect=engine.dialect)
+                statement = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None and isinstance(column.server_default.arg, str):
+                    statement += f" DEFAULT '{column.server_default.arg}'"
+                
+                conn.execute(text(statement))
+            
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
 
 def get_db():
     """Get database session"""
@@ -61,4 +176,8 @@ def get_db():
         yield db
     finally:
         db.close()
-        
\ No newline at end of file
+
+async def get_async_db():
+    """Get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
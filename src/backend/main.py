@@ -1,8 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import uvicorn
-from database import create_tables
+from database import create_tables, async_engine
 from api import router
+from services.ingestion_service import ingestion_service
+from services.bulk_ingestion import bulk_ingestion_service
+from services.embedding_service import embedding_service
+from services.document_service import document_service
+from services.message_writer import message_writer
+from services.chat_memory import chat_memory
+from services.answer_cache import answer_cache
+from services.metrics import metrics
+from models.ollama_chat import ollama_chat
+from models.scheduler import generation_scheduler
 from config import settings
 import logging
 
@@ -25,6 +36,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"]
 )
 
 # Include API routes
@@ -33,6 +45,58 @@ app.include_router(router)
 @app.on_event("startup")
 async def startup_event():
     create_tables()
+    document_service.remove_partial_uploads()
+    await ollama_chat.aopen()
+    await embedding_service.aopen()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    bulk_ingestion_service.shutdown()
+    ingestion_service.shutdown()
+    chat_memory.shutdown()
+    await message_writer.aclose()
+    await ollama_chat.aclose()
+    await embedding_service.aclose()
+    await async_engine.dispose()
+
+@app.get("/health")
+def health():
+    """Report backend availability and circuit breaker state"""
+    services = {
+        "ollama": ollama_chat,
+        "embedding": embedding_service
+    }
+    
+    report = {}
+    for name, service in services.items():
+        service.is_available()
+        report[name] = service.health.status()
+    
+    healthy = all(status["available"] for status in report.values())
+    return {
+        "status": "ok" if healthy else "degraded",
+        "services": report,
+        "scheduler": generation_scheduler.stats()
+    }
+
+def _cache_hit_ratios():
+    """Hit ratio per cache since startup"""
+    ratios = {("answer",): answer_cache.stats()["hit_rate"]}
+    if embedding_service.cache is not None:
+        ratios[("embedding",)] = embedding_service.cache.stats()["hit_rate"]
+    return ratios
+
+def _scheduler_gauges():
+    stats = generation_scheduler.stats()
+    return {("active",): stats["active"], ("queued",): stats["queued"]}
+
+metrics.gauge("chatdocs_cache_hit_ratio", "Cache hit ratio since startup", ("cache",), callback=_cache_hit_ratios)
+metrics.gauge("chatdocs_generations", "Generations running or waiting for a slot", ("state",), callback=_scheduler_gauges)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -41,4 +105,3 @@ if __name__ == "__main__":
         port=settings.FASTAPI_PORT,
         reload=settings.DEBUG
     )
-    
\ No newline at end of file
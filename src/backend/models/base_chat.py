@@ -1,5 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, AsyncIterator
 
 class BaseChatModel(ABC):
     """Abstract base class for chat models"""
@@ -12,11 +13,33 @@ class BaseChatModel(ABC):
         """Generate response from messages"""
         pass
     
+    def stream_response(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Stream response tokens from messages
+        
+        Models without native streaming yield the full response as a single chunk.
+        """
+        yield self.generate_response(messages)
+    
+    async def agenerate_response(self, messages: List[Dict[str, str]]) -> str:
+        """Async variant of generate_response
+        
+        Models without an async client run the blocking call in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate_response, messages)
+    
+    async def astream_response(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Async variant of stream_response"""
+        yield await self.agenerate_response(messages)
+    
     @abstractmethod
     def is_available(self) -> bool:
         """Check if model is available"""
         pass
     
+    async def ais_available(self) -> bool:
+        """Async variant of is_available"""
+        return await asyncio.to_thread(self.is_available)
+    
     def format_messages(self, system_prompt: str, user_message: str, chat_history: List[Dict] = None) -> List[Dict[str, str]]:
         """Format messages for the model"""
         messages = []
@@ -34,4 +57,3 @@ class BaseChatModel(ABC):
         messages.append({"role": "user", "content": user_message})
         
         return messages
-    
\ No newline at end of file
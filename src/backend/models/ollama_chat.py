@@ -1,7 +1,16 @@
+import json
+import time
+import asyncio
+import contextlib
+import httpx
 import requests
 import logging
-from typing import List, Dict
+from typing import List, Dict, Any, Iterator, AsyncIterator, AsyncContextManager, Optional
 from .base_chat import BaseChatModel
+from services.health_service import ServiceHealth
+from services.metrics import (
+    OLLAMA_PROMPT_TOKENS, OLLAMA_EVAL_TOKENS, OLLAMA_TOKENS_PER_SECOND, OLLAMA_GENERATION_DURATION, note_request
+)
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -13,9 +22,46 @@ class OllamaChat(BaseChatModel):
         super().__init__(model_name or settings.OLLAMA_MODEL)
         self.base_url = settings.OLLAMA_BASE_URL
         self.session = requests.Session()
+        self.timeout = settings.OLLAMA_TIMEOUT
+        self.limits = httpx.Limits(
+            max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE
+        )
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_client_loop = None
+        self.health = ServiceHealth("ollama", probe=self._probe, async_probe=self._aprobe)
+    
+    def _new_async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+    
+    def _async_client_scope(self) -> AsyncContextManager[httpx.AsyncClient]:
+        """Async client for one call: the pooled one, or a short-lived one outside the app
+        
+        Connections belong to the event loop that opened them, and a client cannot
+        be closed once its loop is gone. Callers on any other loop (scripts,
+        tests) therefore get a client that is closed when the call finishes.
+        """
+        if self._async_client is not None and self._async_client_loop is asyncio.get_running_loop():
+            return contextlib.nullcontext(self._async_client)
+        return self._new_async_client()
+    
+    async def aopen(self) -> None:
+        """Open the pooled async client for the application's lifetime"""
+        if self._async_client is None:
+            self._async_client = self._new_async_client()
+            self._async_client_loop = asyncio.get_running_loop()
+    
+    async def aclose(self) -> None:
+        """Close the async connection pool"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_client_loop = None
     
     def generate_response(self, messages: List[Dict[str, str]]) -> str:
         """Generate response using Ollama API"""
+        self.health.before_request()
+        started = time.perf_counter()
         try:
             response = self.session.post(
                 f"{self.base_url}/api/chat",
@@ -24,27 +70,194 @@ class OllamaChat(BaseChatModel):
                     "messages": messages,
                     "stream": False
                 },
-                timeout=120
+                timeout=self.timeout
             )
             response.raise_for_status()
             
             result = response.json()
+            self.health.record_success()
+            self._record_stats(result, "generate", started)
             return result["message"]["content"]
+        
+        except requests.exceptions.RequestException as e:
+            self._record_request_error(e)
+            logger.error(f"Ollama API request failed: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+        except KeyError as e:
+            self.health.record_success()
+            logger.error(f"Unexpected Ollama API response format: {str(e)}")
+            raise Exception(f"Invalid response from Ollama: {str(e)}")
+    
+    def stream_response(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Stream response tokens using Ollama API"""
+        self.health.before_request()
+        started = time.perf_counter()
+        try:
+            with self.session.post(
+                f"{self.base_url}/api/chat",
+                json={
+                    "model": self.model_name,
+                    "messages": messages,
+                    "stream": True
+                },
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                
+                # Ollama streams newline-delimited JSON objects
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise Exception(f"Ollama error: {chunk['error']}")
+                    
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        yield token
+                    
+                    if chunk.get("done"):
+                        # The final chunk carries the token counts and timings
+                        self._record_stats(chunk, "stream", started)
+                        break
             
+            self.health.record_success()
+        
         except requests.exceptions.RequestException as e:
+            self._record_request_error(e)
+            logger.error(f"Ollama streaming request failed: {str(e)}")
+            raise Exception(f"Failed to stream response: {str(e)}")
+        except json.JSONDecodeError as e:
+            logger.error(f"Unexpected Ollama stream format: {str(e)}")
+            raise Exception(f"Invalid stream from Ollama: {str(e)}")
+    
+    async def agenerate_response(self, messages: List[Dict[str, str]]) -> str:
+        """Generate response using Ollama API without blocking the event loop"""
+        self.health.before_request()
+        started = time.perf_counter()
+        try:
+            async with self._async_client_scope() as client:
+                response = await client.post(
+                    "/api/chat",
+                    json={
+                        "model": self.model_name,
+                        "messages": messages,
+                        "stream": False
+                    }
+                )
+            response.raise_for_status()
+            
+            result = response.json()
+            self.health.record_success()
+            self._record_stats(result, "generate", started)
+            return result["message"]["content"]
+        
+        except httpx.HTTPError as e:
+            self._record_request_error(e)
             logger.error(f"Ollama API request failed: {str(e)}")
             raise Exception(f"Failed to generate response: {str(e)}")
         except KeyError as e:
+            self.health.record_success()
             logger.error(f"Unexpected Ollama API response format: {str(e)}")
             raise Exception(f"Invalid response from Ollama: {str(e)}")
     
-    def is_available(self) -> bool:
-        """Check if Ollama is available"""
+    async def astream_response(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Stream response tokens using Ollama API without blocking the event loop"""
+        self.health.before_request()
+        started = time.perf_counter()
         try:
-            response = self.session.get(f"{self.base_url}/api/tags", timeout=10)
-            return response.status_code == 200
-        except:
-            return False
+            async with self._async_client_scope() as client, client.stream(
+                "POST",
+                "/api/chat",
+                json={
+                    "model": self.model_name,
+                    "messages": messages,
+                    "stream": True
+                }
+            ) as response:
+                response.raise_for_status()
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise Exception(f"Ollama error: {chunk['error']}")
+                    
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        yield token
+                    
+                    if chunk.get("done"):
+                        # The final chunk carries the token counts and timings
+                        self._record_stats(chunk, "stream", started)
+                        break
+            
+            self.health.record_success()
+        
+        except httpx.HTTPError as e:
+            self._record_request_error(e)
+            logger.error(f"Ollama streaming request failed: {str(e)}")
+            raise Exception(f"Failed to stream response: {str(e)}")
+        except json.JSONDecodeError as e:
+            logger.error(f"Unexpected Ollama stream format: {str(e)}")
+            raise Exception(f"Invalid stream from Ollama: {str(e)}")
+    
+    def is_available(self) -> bool:
+        """Check if Ollama is available (cached, see ServiceHealth)"""
+        return self.health.is_available()
+    
+    async def ais_available(self) -> bool:
+        """Async variant of is_available"""
+        return await self.health.ais_available()
+    
+    def _probe(self) -> bool:
+        """Actively check Ollama by listing local models"""
+        response = self.session.get(f"{self.base_url}/api/tags", timeout=10)
+        return response.status_code == 200
+    
+    async def _aprobe(self) -> bool:
+        """Async variant of _probe"""
+        async with self._async_client_scope() as client:
+            response = await client.get("/api/tags", timeout=10)
+        return response.status_code == 200
+    
+    def _record_stats(self, result: Dict[str, Any], mode: str, started: float) -> None:
+        """Record call latency and the token counts Ollama reports for a finished generation"""
+        OLLAMA_GENERATION_DURATION.observe(time.perf_counter() - started, mode=mode)
+        
+        prompt_tokens = result.get("prompt_eval_count")
+        eval_tokens = result.get("eval_count")
+        eval_seconds = (result.get("eval_duration") or 0) / 1e9  # Ollama reports nanoseconds
+        tokens_per_second = eval_tokens / eval_seconds if eval_tokens and eval_seconds else None
+        
+        if prompt_tokens is not None:
+            OLLAMA_PROMPT_TOKENS.observe(prompt_tokens)
+        if eval_tokens is not None:
+            OLLAMA_EVAL_TOKENS.observe(eval_tokens)
+        if tokens_per_second is not None:
+            OLLAMA_TOKENS_PER_SECOND.observe(tokens_per_second)
+        
+        note_request(
+            "ollama",
+            prompt_tokens=prompt_tokens,
+            eval_tokens=eval_tokens,
+            tokens_per_second=round(tokens_per_second, 1) if tokens_per_second is not None else None,
+            load_ms=round(result["load_duration"] / 1e6, 1) if result.get("load_duration") else None,
+            prompt_eval_ms=round(result["prompt_eval_duration"] / 1e6, 1) if result.get("prompt_eval_duration") else None
+        )
+    
+    def _record_request_error(self, error: Exception) -> None:
+        """Count connection problems and server errors against Ollama's health"""
+        response = getattr(error, "response", None)
+        if response is not None and response.status_code < 500:
+            # Client errors (e.g. unknown model) don't mean the server is down
+            self.health.record_success()
+        else:
+            self.health.record_failure(str(error))
     
     def list_models(self) -> List[str]:
         """Get list of available models"""
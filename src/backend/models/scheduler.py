@@ -0,0 +1,292 @@
+import json
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from .base_chat import BaseChatModel
+from .ollama_chat import ollama_chat
+from services.metrics import record_stage
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest generation in the running service time average
+SERVICE_TIME_ALPHA = 0.2
+
+class SchedulerOverloaded(Exception):
+    """A generation request was shed instead of queued"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Generation:
+    """One model call, shared by every request with the same prompt"""
+    
+    def __init__(self, waiter: Optional[asyncio.Future], queued_at: float):
+        self.waiter = waiter  # None when a slot was free right away
+        self.queued_at = queued_at
+        self.queue_wait: Optional[float] = None
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 1
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+    
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class ScheduledStream:
+    """Tokens of a scheduled generation, plus its queue metadata"""
+    
+    def __init__(self, scheduler: "GenerationScheduler", generation: _Generation, coalesced: bool):
+        self._scheduler = scheduler
+        self._generation = generation
+        self.coalesced = coalesced
+    
+    @property
+    def info(self) -> Dict[str, Any]:
+        return self._scheduler._info(self._generation, self.coalesced)
+    
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._scheduler._follow(self._generation)
+
+class GenerationScheduler:
+    """Admission control in front of a chat model
+    
+    At most ``max_concurrent`` generations run at once. Waiting requests are
+    queued per chat and served round-robin across chats, so a chat firing many
+    questions can't starve the others. A request is shed with
+    SchedulerOverloaded when the queue is full, when the expected wait exceeds
+    the queue timeout, or when it actually waits that long. Identical prompts
+    already in flight share one generation instead of queueing again.
+    
+    Must be used from a single event loop; the synchronous model methods are
+    not scheduled.
+    """
+    
+    def __init__(self, model: BaseChatModel, max_concurrent: int = None, max_queue: int = None, queue_timeout: float = None, coalesce: bool = None, clock=time.monotonic):
+        self.model = model
+        self.max_concurrent = max(1, max_concurrent or settings.OLLAMA_MAX_CONCURRENT)
+        self.max_queue = settings.GENERATION_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or settings.GENERATION_QUEUE_TIMEOUT
+        self.coalesce = settings.GENERATION_COALESCE if coalesce is None else coalesce
+        self.clock = clock
+        
+        self._active = 0
+        self._queued = 0
+        self._queues: "OrderedDict[Any, deque]" = OrderedDict()
+        self._inflight: Dict[str, _Generation] = {}
+        self._service_time: Optional[float] = None
+        
+        self._started = 0
+        self._coalesced = 0
+        self._shed = 0
+        self._queue_wait_total = 0.0
+    
+    async def generate(self, messages: List[Dict[str, str]], chat_id: Any = None) -> Tuple[str, Dict[str, Any]]:
+        """Generate a response once a slot is free, returning it with queue metadata"""
+        generation, coalesced = self._submit(chat_id, messages, stream=False)
+        tokens = [token async for token in self._follow(generation)]
+        return "".join(tokens), self._info(generation, coalesced)
+    
+    def stream(self, messages: List[Dict[str, str]], chat_id: Any = None) -> ScheduledStream:
+        """Stream a response once a slot is free"""
+        generation, coalesced = self._submit(chat_id, messages, stream=True)
+        return ScheduledStream(self, generation, coalesced)
+    
+    def check_admission(self) -> None:
+        """Raise SchedulerOverloaded if a new generation would be shed right now"""
+        if self._active < self.max_concurrent and not self._queued:
+            return
+        
+        if self._queued >= self.max_queue:
+            self._shed += 1
+            raise SchedulerOverloaded(
+                f"Generation queue is full ({self._queued} waiting)",
+                self._expected_wait(self._queued - self.max_queue)
+            )
+        
+        expected = self._expected_wait(self._queued)
+        if expected > self.queue_timeout:
+            self._shed += 1
+            raise SchedulerOverloaded(
+                f"Expected generation queue wait of {expected:.0f}s exceeds {self.queue_timeout:g}s",
+                expected - self.queue_timeout
+            )
+    
+    def _expected_wait(self, position: int) -> float:
+        """Seconds until a request with `position` requests ahead of it gets a slot"""
+        if self._service_time is None:
+            # Nothing has finished yet, so there is no estimate to shed on
+            return 0.0
+        return math.ceil((max(position, 0) + 1) / self.max_concurrent) * self._service_time
+    
+    def _submit(self, chat_id: Any, messages: List[Dict[str, str]], stream: bool) -> Tuple[_Generation, bool]:
+        """Join an identical in-flight generation or start a new one"""
+        key = self._key(messages, stream) if self.coalesce else None
+        
+        generation = self._inflight.get(key) if key else None
+        # A generation with no subscribers left is being cancelled
+        if generation is not None and not generation.done and generation.subscribers > 0:
+            generation.subscribers += 1
+            self._coalesced += 1
+            return generation, True
+        
+        generation = _Generation(self._enqueue(chat_id), self.clock())
+        generation.task = asyncio.create_task(self._run(key, generation, messages, stream))
+        if key:
+            self._inflight[key] = generation
+        return generation, False
+    
+    def _key(self, messages: List[Dict[str, str]], stream: bool) -> str:
+        payload = json.dumps([self.model.model_name, stream, messages], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _enqueue(self, chat_id: Any) -> Optional[asyncio.Future]:
+        """Take a free slot, or join the chat's queue and return the future to wait on"""
+        if self._active < self.max_concurrent and not self._queued:
+            self._active += 1
+            return None
+        
+        self.check_admission()
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(chat_id, deque()).append(waiter)
+        self._queued += 1
+        return waiter
+    
+    def _dequeue(self, waiter: asyncio.Future) -> None:
+        """Drop a waiter that gave up before getting a slot"""
+        for chat_id, waiters in self._queues.items():
+            if waiter in waiters:
+                waiters.remove(waiter)
+                self._queued -= 1
+                if not waiters:
+                    del self._queues[chat_id]
+                return
+    
+    def _release(self) -> None:
+        """Free a slot and hand it to the next chat in round-robin order"""
+        self._active -= 1
+        
+        while self._active < self.max_concurrent and self._queues:
+            chat_id, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            self._queued -= 1
+            
+            if waiters:
+                self._queues.move_to_end(chat_id)
+            else:
+                del self._queues[chat_id]
+            
+            self._active += 1
+            waiter.set_result(None)
+    
+    async def _wait_for_slot(self, generation: _Generation) -> None:
+        waiter = generation.waiter
+        if waiter is not None:
+            try:
+                done, _ = await asyncio.wait({waiter}, timeout=self.queue_timeout)
+            except asyncio.CancelledError:
+                if waiter.done():
+                    self._release()
+                else:
+                    self._dequeue(waiter)
+                raise
+            
+            if not done:
+                self._dequeue(waiter)
+                self._shed += 1
+                raise SchedulerOverloaded(
+                    f"Waited {self.queue_timeout:g}s for a generation slot",
+                    self._expected_wait(self._queued)
+                )
+        
+        generation.queue_wait = self.clock() - generation.queued_at
+        self._queue_wait_total += generation.queue_wait
+        record_stage("queue_wait", generation.queue_wait)
+        self._started += 1
+    
+    async def _run(self, key: Optional[str], generation: _Generation, messages: List[Dict[str, str]], stream: bool) -> None:
+        try:
+            await self._wait_for_slot(generation)
+            
+            started = self.clock()
+            try:
+                if stream:
+                    async for token in self.model.astream_response(messages):
+                        generation.tokens.append(token)
+                        generation.notify()
+                else:
+                    generation.tokens.append(await self.model.agenerate_response(messages))
+                
+                elapsed = self.clock() - started
+                self._service_time = elapsed if self._service_time is None else (
+                    SERVICE_TIME_ALPHA * elapsed + (1 - SERVICE_TIME_ALPHA) * self._service_time
+                )
+            finally:
+                self._release()
+        
+        except asyncio.CancelledError as e:
+            generation.error = e
+            raise
+        except Exception as e:
+            # Surfaced to every subscriber; the task itself ends cleanly
+            generation.error = e
+        finally:
+            generation.done = True
+            generation.notify()
+            if key and self._inflight.get(key) is generation:
+                del self._inflight[key]
+    
+    async def _follow(self, generation: _Generation) -> AsyncIterator[str]:
+        """Yield a generation's tokens from the start, waiting for new ones"""
+        index = 0
+        try:
+            while True:
+                if index < len(generation.tokens):
+                    index += 1
+                    yield generation.tokens[index - 1]
+                    continue
+                
+                if generation.done:
+                    if generation.error is not None:
+                        raise generation.error
+                    return
+                
+                await generation.changed.wait()
+        finally:
+            generation.subscribers -= 1
+            # Nobody is left to read the answer
+            if generation.subscribers == 0 and not generation.done:
+                generation.task.cancel()
+    
+    def _info(self, generation: _Generation, coalesced: bool) -> Dict[str, Any]:
+        """Queue metadata for responses"""
+        wait = generation.queue_wait
+        return {
+            "wait_ms": None if wait is None else round(wait * 1000),
+            "coalesced": coalesced
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "started": self._started,
+            "coalesced": self._coalesced,
+            "shed": self._shed,
+            "avg_queue_wait_ms": round(self._queue_wait_total / self._started * 1000) if self._started else 0,
+            "avg_service_seconds": round(self._service_time, 2) if self._service_time is not None else None
+        }
+
+# Global instance
+generation_scheduler = GenerationScheduler(ollama_chat)
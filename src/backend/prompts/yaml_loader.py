@@ -17,6 +17,10 @@ class PromptLoader:
             self._load_prompts()
         return self._prompts
     
+    def reload(self):
+        """Discard loaded prompts so the next access re-reads the YAML file"""
+        self._prompts = None
+    
     def _load_prompts(self):
         """Load prompts from YAML file"""
         try:
@@ -0,0 +1,141 @@
+import math
+import time
+import logging
+import operator
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from services.metrics import CACHE_LOOKUPS
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class AnswerCache:
+    """Per-chat answers reused for semantically near-identical questions
+    
+    An entry matches when its question embedding is within the similarity
+    threshold of the new question and it was produced against the same document
+    fingerprint and variant (search mode, model). Entries expire after the TTL
+    and the least recently used ones are evicted, per chat and overall.
+    """
+    
+    def __init__(self, threshold: float = None, ttl: float = None, max_entries: int = None, max_per_chat: int = None, clock=time.monotonic):
+        self.threshold = settings.ANSWER_CACHE_SIMILARITY if threshold is None else threshold
+        self.ttl = settings.ANSWER_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+        self.max_per_chat = max_per_chat or settings.ANSWER_CACHE_MAX_PER_CHAT
+        self.clock = clock
+        
+        self._chats: Dict[int, "OrderedDict[int, Dict[str, Any]]"] = {}
+        self._lru: "OrderedDict[Tuple[int, int], None]" = OrderedDict()
+        self._next_id = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in embedding))
+        return [x / norm for x in embedding] if norm else list(embedding)
+    
+    def lookup(self, chat_id: int, embedding: List[float], fingerprint: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        """Best cached answer for a question, or None"""
+        query = self._normalize(embedding)
+        now = self.clock()
+        
+        with self._lock:
+            entries = self._chats.get(chat_id)
+            if not entries:
+                self._misses += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="miss")
+                return None
+            
+            # Entries from another document set or past their TTL can never match again
+            for entry_id in [
+                entry_id for entry_id, entry in entries.items()
+                if entry["fingerprint"] != fingerprint or now - entry["created_at"] > self.ttl
+            ]:
+                self._remove(chat_id, entry_id)
+            
+            best_id, best_similarity = None, self.threshold
+            for entry_id, entry in entries.items():
+                if entry["variant"] != variant:
+                    continue
+                similarity = sum(map(operator.mul, query, entry["embedding"]))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            
+            if best_id is None:
+                self._misses += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="miss")
+                return None
+            
+            entry = entries[best_id]
+            entries.move_to_end(best_id)
+            self._lru.move_to_end((chat_id, best_id))
+            entry["hits"] += 1
+            self._hits += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="hit")
+            
+            return {
+                "question": entry["question"],
+                "response": entry["response"],
+                "sources": list(entry["sources"]),
+                "context": entry["context"],
+                "similarity": best_similarity,
+                "age_seconds": now - entry["created_at"]
+            }
+    
+    def store(self, chat_id: int, question: str, embedding: List[float], fingerprint: str, response: str, sources: List[str], context: str = "", variant: str = "") -> None:
+        """Remember an answer"""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            
+            entries = self._chats.setdefault(chat_id, OrderedDict())
+            entries[entry_id] = {
+                "question": question,
+                "embedding": self._normalize(embedding),
+                "fingerprint": fingerprint,
+                "variant": variant,
+                "response": response,
+                "sources": list(sources),
+                "context": context,
+                "created_at": self.clock(),
+                "hits": 0
+            }
+            self._lru[(chat_id, entry_id)] = None
+            
+            while len(entries) > self.max_per_chat:
+                self._remove(chat_id, next(iter(entries)))
+            while len(self._lru) > self.max_entries:
+                oldest_chat, oldest_id = next(iter(self._lru))
+                self._remove(oldest_chat, oldest_id)
+    
+    def _remove(self, chat_id: int, entry_id: int) -> None:
+        entries = self._chats.get(chat_id)
+        if entries is not None:
+            entries.pop(entry_id, None)
+            if not entries:
+                del self._chats[chat_id]
+        self._lru.pop((chat_id, entry_id), None)
+    
+    def invalidate(self, chat_id: int) -> None:
+        """Forget every answer for a chat"""
+        with self._lock:
+            for entry_id in list(self._chats.get(chat_id, {})):
+                self._remove(chat_id, entry_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._lru),
+                "chats": len(self._chats),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0
+            }
+
+# Global instance
+answer_cache = AnswerCache()
@@ -0,0 +1,453 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from database import SessionLocal, Document
+from services.document_service import document_service
+from services.embedding_service import embedding_service
+from services.vector_service import vector_service
+from services.ingestion_service import ingestion_service, IngestionJob
+from services.metrics import UPLOAD_STAGE_DURATION
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Last item a stage hands to the next one
+_END = object()
+
+class _Batch:
+    """Planned chunks of one file on their way through the pipeline"""
+    
+    def __init__(self, bulk: "BulkIngestionJob", job: IngestionJob, plan: Dict[str, Any]):
+        self.bulk = bulk
+        self.job = job
+        self.plan = plan
+        self.embeddings: Optional[List[List[float]]] = None
+
+class _FileEnd:
+    """Closes a file once all of its batches are ahead of it in the queue"""
+    
+    def __init__(self, job: IngestionJob, stale: List[str]):
+        self.job = job
+        self.stale = stale  # chunks of the previous version the new one doesn't have
+
+def _alive(job: IngestionJob) -> bool:
+    return not job.cancelled and job.error is None
+
+def _fail(job: IngestionJob, error: Exception) -> None:
+    if job.error is None:
+        job.error = str(error)
+        logger.error(f"Bulk ingestion failed for {job.filename}: {str(error)}")
+
+def _bulks(batches: List[_Batch]) -> List["BulkIngestionJob"]:
+    """Distinct bulk jobs the batches belong to"""
+    return list({id(batch.bulk): batch.bulk for batch in batches}.values())
+
+class BulkIngestionJob:
+    """Progress of a multi-file ingestion"""
+    
+    def __init__(self, chat_id: int, jobs: List[IngestionJob]):
+        self.id = uuid.uuid4().hex
+        self.chat_id = chat_id
+        self.jobs = jobs
+        self.stage_seconds = {"parse": 0.0, "embed": 0.0, "index": 0.0}
+        self.embedding_calls = 0
+        self.index_writes = 0
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.started: Optional[float] = None
+        self.elapsed: Optional[float] = None
+        self.finished = threading.Event()
+    
+    @property
+    def done(self) -> bool:
+        return self.finished.is_set()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        chunks = sum(job.chunks_indexed for job in self.jobs)
+        elapsed = self.elapsed
+        if elapsed is None:
+            elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        
+        return {
+            "bulk_id": self.id,
+            "chat_id": self.chat_id,
+            "status": "completed" if self.done else "running" if self.started is not None else "queued",
+            "files": [
+                {
+                    "filename": job.filename,
+                    "document_id": job.document_id,
+                    "job_id": job.id,
+                    "stage": job.stage,
+                    "chunk_count": job.chunk_count,
+                    "chunks_embedded": job.chunks_embedded,
+                    "chunks_unchanged": job.chunks_unchanged,
+                    "chunks_removed": job.chunks_removed,
+                    "error": job.error
+                }
+                for job in self.jobs
+            ],
+            "files_completed": sum(job.stage == "completed" for job in self.jobs),
+            "files_failed": sum(job.stage == "failed" for job in self.jobs),
+            "chunks_indexed": chunks,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(chunks / elapsed, 1) if elapsed else 0.0,
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+            "embedding_calls": self.embedding_calls,
+            "index_writes": self.index_writes,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+class BulkIngestionService:
+    """Pipelined parse -> embed -> index ingestion of many documents at once
+    
+    One pipeline serves every bulk request: each stage is a single long-lived
+    thread with a bounded queue in front of the next, and bulk requests wait in
+    a queue in front of the parse stage, so concurrent uploads cannot multiply
+    the threads. Parsing later files overlaps embedding and indexing earlier
+    ones while memory stays bounded. The embed and index stages merge whatever
+    is waiting into one embedding request and one vector store write per chat
+    (up to a batch limit), so small files share calls instead of paying for one each.
+    
+    Every file is also tracked as an IngestionJob, so the single-file job
+    endpoints, cancellation and re-upload supersession keep working.
+    """
+    
+    def __init__(self, queue_depth: int = None, embed_batch: int = None, index_batch: int = None):
+        self.queue_depth = queue_depth or settings.BULK_QUEUE_DEPTH
+        self.embed_batch = embed_batch or settings.BULK_EMBED_BATCH_CHUNKS
+        self.index_batch = index_batch or settings.BULK_INDEX_BATCH_CHUNKS
+        self.batch_chunks = settings.INGEST_BATCH_CHUNKS
+        self.max_tracked_jobs = settings.INGEST_MAX_TRACKED_JOBS
+        self._jobs: "OrderedDict[str, BulkIngestionJob]" = OrderedDict()
+        self._pending: queue.Queue = queue.Queue()  # bulk jobs waiting for the parse stage
+        self._stages: List[threading.Thread] = []
+        self._lock = threading.Lock()
+    
+    def submit(self, chat_id: int, documents: List[Tuple[int, str, str]]) -> BulkIngestionJob:
+        """Queue saved documents, given as (document id, file path, filename), for ingestion"""
+        jobs = [
+            ingestion_service.track(IngestionJob(chat_id, document_id, file_path, filename))
+            for document_id, file_path, filename in documents
+        ]
+        bulk = BulkIngestionJob(chat_id, jobs)
+        
+        with self._lock:
+            self._jobs[bulk.id] = bulk
+            excess = len(self._jobs) - self.max_tracked_jobs
+            if excess > 0:
+                for bulk_id in [bulk_id for bulk_id, job in self._jobs.items() if job.done][:excess]:
+                    del self._jobs[bulk_id]
+            self._start_stages()
+        
+        self._pending.put(bulk)
+        logger.info(f"Queued bulk ingestion {bulk.id} of {len(jobs)} files in chat {chat_id}")
+        return bulk
+    
+    def get_job(self, bulk_id: str) -> Optional[BulkIngestionJob]:
+        """Get bulk job by id"""
+        with self._lock:
+            return self._jobs.get(bulk_id)
+    
+    def _start_stages(self) -> None:
+        """Start the pipeline threads on first use; the caller holds the lock"""
+        if self._stages:
+            return
+        
+        parsed = queue.Queue(maxsize=self.queue_depth)
+        embedded = queue.Queue(maxsize=self.queue_depth)
+        self._stages = [
+            threading.Thread(target=self._parse_stage, args=(parsed,), name="bulk-parse"),
+            threading.Thread(target=self._embed_stage, args=(parsed, embedded), name="bulk-embed"),
+            threading.Thread(target=self._index_stage, args=(embedded,), name="bulk-index")
+        ]
+        for stage in self._stages:
+            stage.start()
+    
+    def _parse_stage(self, output: queue.Queue) -> None:
+        """Extract and chunk queued bulk jobs file by file, handing on batches of planned chunks
+        
+        Each bulk job follows its last file down the pipeline, so the index stage
+        can close it once everything before it has been written.
+        """
+        try:
+            while True:
+                bulk = self._pending.get()
+                if bulk is _END:
+                    return
+                
+                bulk.started = time.perf_counter()
+                self._update_documents({job.document_id: {"status": "processing"} for job in bulk.jobs})
+                for job in bulk.jobs:
+                    try:
+                        self._parse_file(bulk, job, output)
+                    except Exception as e:
+                        _fail(job, e)
+                        output.put(_FileEnd(job, []))
+                output.put(bulk)
+        finally:
+            output.put(_END)
+    
+    def _parse_file(self, bulk: BulkIngestionJob, job: IngestionJob, output: queue.Queue) -> None:
+        if job.previous is not None:
+            # Let the superseded job stop before touching the same chunks
+            job.previous.finished.wait()
+            job.previous = None
+        
+        job.total_characters = 0
+        job.chunk_count = 0
+        if job.cancelled:
+            output.put(_FileEnd(job, []))
+            return
+        
+        # Chunks already stored for this file; unchanged ones are not embedded again
+        existing = vector_service.get_document_chunks(job.chat_id, job.filename)
+        seen = set()
+        batch = []
+        start_index = 0
+        
+        chunks = document_service.chunk_pages(ingestion_service.counted_pages(job), Path(job.file_path).suffix)
+        try:
+            while _alive(job):
+                # Only time spent extracting and chunking; waiting on a full queue is not parsing
+                started = time.perf_counter()
+                chunk = next(chunks, None)
+                bulk.stage_seconds["parse"] += time.perf_counter() - started
+                if chunk is None:
+                    break
+                
+                batch.append(chunk)
+                job.chunk_count += 1
+                if len(batch) >= self.batch_chunks:
+                    output.put(_Batch(bulk, job, ingestion_service.plan_batch(job, batch, start_index, existing, seen)))
+                    start_index += len(batch)
+                    batch = []
+        finally:
+            chunks.close()
+        
+        if batch and _alive(job):
+            output.put(_Batch(bulk, job, ingestion_service.plan_batch(job, batch, start_index, existing, seen)))
+        
+        stale = [chunk_id for chunk_id in existing if chunk_id not in seen] if _alive(job) else []
+        output.put(_FileEnd(job, stale))
+    
+    @staticmethod
+    def _take(source: queue.Queue, limit: int) -> List[Any]:
+        """Wait for one item, then take whatever else is ready, up to `limit` chunks"""
+        items = [source.get()]
+        chunks = len(items[0].plan["texts"]) if isinstance(items[0], _Batch) else 0
+        
+        while items[-1] is not _END and chunks < limit:
+            try:
+                item = source.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            if isinstance(item, _Batch):
+                chunks += len(item.plan["texts"])
+        
+        return items
+    
+    def _embed_stage(self, source: queue.Queue, output: queue.Queue) -> None:
+        """Embed the new chunks of everything waiting in one request"""
+        while True:
+            items = self._take(source, self.embed_batch)
+            batches = [item for item in items if isinstance(item, _Batch)]
+            try:
+                self._embed(batches)
+            except Exception as e:
+                # The stage serves every later request too, so it must keep running
+                for batch in batches:
+                    _fail(batch.job, e)
+            for item in items:
+                output.put(item)
+            if items[-1] is _END:
+                return
+    
+    def _embed(self, batches: List[_Batch]) -> None:
+        batches = [batch for batch in batches if _alive(batch.job) and batch.plan["new"]]
+        if not batches:
+            return
+        
+        texts = [batch.plan["texts"][i] for batch in batches for i in batch.plan["new"]]
+        for batch in batches:
+            batch.job.stage = "embedding"
+        
+        started = time.perf_counter()
+        try:
+            embeddings = embedding_service.get_embeddings(texts)
+        except Exception as e:
+            for batch in batches:
+                _fail(batch.job, e)
+            return
+        finally:
+            # Every bulk job in the request waited for all of it
+            elapsed = time.perf_counter() - started
+            for bulk in _bulks(batches):
+                bulk.stage_seconds["embed"] += elapsed
+                bulk.embedding_calls += 1
+        
+        offset = 0
+        for batch in batches:
+            batch.embeddings = embeddings[offset:offset + len(batch.plan["new"])]
+            offset += len(batch.plan["new"])
+    
+    def _index_stage(self, source: queue.Queue) -> None:
+        """Write everything waiting to the vector store at once, then close finished files and bulk jobs"""
+        while True:
+            items = self._take(source, self.index_batch)
+            
+            try:
+                by_chat: Dict[int, List[_Batch]] = {}
+                for item in items:
+                    if isinstance(item, _Batch):
+                        by_chat.setdefault(item.job.chat_id, []).append(item)
+                for chat_id, batches in by_chat.items():
+                    self._index(chat_id, batches)
+                
+                self._close_files([item for item in items if isinstance(item, _FileEnd)])
+            except Exception as e:
+                # Files left open are failed when their bulk job is closed below
+                logger.error(f"Bulk indexing failed: {str(e)}")
+                for item in items:
+                    if isinstance(item, (_Batch, _FileEnd)):
+                        _fail(item.job, e)
+            
+            for item in items:
+                if isinstance(item, BulkIngestionJob):
+                    self._finish(item)
+            
+            if items[-1] is _END:
+                return
+    
+    def _index(self, chat_id: int, batches: List[_Batch]) -> None:
+        batches = [batch for batch in batches if _alive(batch.job)]
+        if not batches:
+            return
+        
+        ids, texts, embeddings, metadatas = [], [], [], []
+        moved_ids, moved_metadatas = [], []
+        for batch in batches:
+            plan = batch.plan
+            batch.job.stage = "indexing"
+            for i in plan["new"]:
+                ids.append(plan["ids"][i])
+                texts.append(plan["texts"][i])
+                metadatas.append(plan["metadatas"][i])
+            embeddings.extend(batch.embeddings or [])
+            for i in plan["moved"]:
+                moved_ids.append(plan["ids"][i])
+                moved_metadatas.append(plan["metadatas"][i])
+        
+        started = time.perf_counter()
+        try:
+            if ids:
+                vector_service.upsert_chunks(chat_id, ids, texts, embeddings, metadatas)
+                for bulk in _bulks(batches):
+                    bulk.index_writes += 1
+            if moved_ids:
+                # Same text at a new position: only page/offset metadata changes
+                vector_service.update_metadata(chat_id, moved_ids, moved_metadatas)
+        except Exception as e:
+            for batch in batches:
+                _fail(batch.job, e)
+            return
+        finally:
+            elapsed = time.perf_counter() - started
+            for bulk in _bulks(batches):
+                bulk.stage_seconds["index"] += elapsed
+        
+        for batch in batches:
+            job, plan = batch.job, batch.plan
+            job.chunks_indexed += len(plan["texts"])
+            job.chunks_embedded += len(plan["new"])
+            job.chunks_unchanged += len(plan["texts"]) - len(plan["new"])
+    
+    def _close_files(self, ends: List[_FileEnd]) -> None:
+        """Drop stale chunks, then record every finished file with one commit"""
+        if not ends:
+            return
+        
+        updates = {}
+        for end in ends:
+            job = end.job
+            if _alive(job):
+                try:
+                    vector_service.delete_chunks(job.chat_id, end.stale)
+                    job.chunks_removed = len(end.stale)
+                except Exception as e:
+                    _fail(job, e)
+            
+            if job.error is not None:
+                job.stage = "failed"
+                updates[job.document_id] = {"status": "failed", "error": job.error}
+            elif job.cancelled:
+                job.stage = "cancelled"
+            else:
+                job.stage = "completed"
+                updates[job.document_id] = {"status": "completed", "chunk_count": job.chunk_count}
+        
+        self._update_documents(updates)
+        for end in ends:
+            ingestion_service.finish(end.job)
+    
+    def _finish(self, bulk: BulkIngestionJob) -> None:
+        """Close a bulk job once its last file has left the pipeline"""
+        # Nothing may be left waiting on a job that will never finish
+        leftover = [job for job in bulk.jobs if not job.finished.is_set()]
+        if leftover:
+            for job in leftover:
+                _fail(job, Exception("Bulk ingestion stopped before this file finished"))
+                job.stage = "failed"
+            self._update_documents({job.document_id: {"status": "failed", "error": job.error} for job in leftover})
+            for job in leftover:
+                ingestion_service.finish(job)
+        
+        bulk.elapsed = time.perf_counter() - bulk.started
+        bulk.finished_at = datetime.utcnow()
+        bulk.finished.set()
+        
+        for stage, seconds in bulk.stage_seconds.items():
+            UPLOAD_STAGE_DURATION.observe(seconds, stage=f"bulk_{stage}")
+        UPLOAD_STAGE_DURATION.observe(bulk.elapsed, stage="bulk_total")
+        
+        summary = bulk.to_dict()
+        logger.info(
+            f"Bulk ingestion {bulk.id} finished: {summary['files_completed']}/{len(bulk.jobs)} files, "
+            f"{summary['chunks_indexed']} chunks in {summary['elapsed_seconds']}s ({summary['chunks_per_second']} chunks/s)"
+        )
+    
+    def _update_documents(self, updates: Dict[int, Dict[str, Any]]) -> None:
+        """Persist progress for many document rows in one transaction"""
+        if not updates:
+            return
+        
+        db = SessionLocal()
+        try:
+            for document in db.query(Document).filter(Document.id.in_(list(updates))).all():
+                for name, value in updates[document.id].items():
+                    setattr(document, name, value)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to update {len(updates)} documents: {str(e)}")
+        finally:
+            db.close()
+    
+    def shutdown(self) -> None:
+        """Finish queued bulk ingestions and stop the pipeline"""
+        with self._lock:
+            stages, self._stages = self._stages, []
+        
+        if stages:
+            self._pending.put(_END)
+            for stage in stages:
+                stage.join()
+
+# Global instance
+bulk_ingestion_service = BulkIngestionService()
@@ -0,0 +1,271 @@
+import json
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from sqlalchemy import select, update, func
+from database import SessionLocal, AsyncSessionLocal, ChatSession, Message
+from services.message_writer import message_writer
+from models.ollama_chat import ollama_chat
+from models.scheduler import generation_scheduler
+from prompts.yaml_loader import prompt_loader
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ChatMemory:
+    """Recent messages plus a rolling summary of everything older, per chat
+    
+    The last ``window`` messages are kept raw in a per-chat LRU cache, loaded
+    from the database on first use. Once ``summary_every`` turns have scrolled
+    out of the window, they are folded into the chat's stored summary in the
+    background, so the prompt stays bounded however long the chat runs.
+    """
+    
+    def __init__(self, window: int = None, summary_every: int = None, max_chats: int = None):
+        self.window = max(1, window or settings.MEMORY_WINDOW_MESSAGES)
+        self.summary_every = max(1, summary_every or settings.MEMORY_SUMMARY_EVERY_TURNS)
+        self.summary_max_tokens = settings.MEMORY_SUMMARY_MAX_TOKENS
+        self.max_chats = max_chats or settings.MEMORY_CACHE_CHATS
+        # Messages folded per summary update; long unsummarized chats catch up a slice at a time
+        self.max_fold = 8 * self.summary_every
+        
+        self._chats: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._summarizing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+    
+    def load(self, chat_id: int) -> Dict[str, Any]:
+        """Recent history (chronological) and the summary of older messages"""
+        entry = self._cached(chat_id)
+        if entry is None:
+            with SessionLocal() as db:
+                chat = db.get(ChatSession, chat_id)
+                recent = db.scalars(self._recent_query(chat_id)).all()
+                unsummarized = db.scalar(self._unsummarized_query(chat)) if chat else 0
+            entry = self._cache(chat_id, chat, recent, unsummarized)
+        return self._snapshot(entry)
+    
+    async def aload(self, chat_id: int) -> Dict[str, Any]:
+        """Async variant of load"""
+        entry = self._cached(chat_id)
+        if entry is None:
+            async with AsyncSessionLocal() as db:
+                chat = await db.get(ChatSession, chat_id)
+                recent = (await db.scalars(self._recent_query(chat_id))).all()
+                unsummarized = await db.scalar(self._unsummarized_query(chat)) if chat else 0
+            entry = self._cache(chat_id, chat, recent, unsummarized)
+        return self._snapshot(entry)
+    
+    def save(self, chat_id: int, question: str, response: str, sources: List[str] = None) -> None:
+        """Persist a question and its answer"""
+        with SessionLocal() as db:
+            db.add_all(self._new_messages(chat_id, question, response, sources))
+            db.commit()
+        
+        if self._remember(chat_id, question, response):
+            self._executor.submit(self._summarize, chat_id)
+    
+    async def asave(self, chat_id: int, question: str, response: str, sources: List[str] = None) -> None:
+        """Async variant of save; the insert is batched with concurrent requests"""
+        await message_writer.save(self._new_messages(chat_id, question, response, sources))
+        
+        if self._remember(chat_id, question, response):
+            task = asyncio.create_task(self._asummarize(chat_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    def invalidate(self, chat_id: int) -> None:
+        """Forget a chat's cached window"""
+        with self._lock:
+            self._chats.pop(chat_id, None)
+    
+    def _recent_query(self, chat_id: int):
+        return (
+            select(Message)
+            .where(Message.chat_session_id == chat_id)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(self.window)
+        )
+    
+    @staticmethod
+    def _unsummarized_query(chat: ChatSession):
+        return select(func.count(Message.id)).where(
+            Message.chat_session_id == chat.id,
+            Message.id > (chat.summary_message_id or 0)
+        )
+    
+    @staticmethod
+    def _new_messages(chat_id: int, question: str, response: str, sources: List[str] = None) -> List[Message]:
+        """User question and assistant response rows"""
+        return [
+            Message(chat_session_id=chat_id, content=question, role="user"),
+            Message(
+                chat_session_id=chat_id,
+                content=response,
+                role="assistant",
+                sources=json.dumps(sources) if sources else None
+            )
+        ]
+    
+    def _cached(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            if entry is not None:
+                self._chats.move_to_end(chat_id)
+            return entry
+    
+    def _cache(self, chat_id: int, chat: Optional[ChatSession], recent: List[Message], unsummarized: int) -> Dict[str, Any]:
+        """Cache what was loaded, unless a concurrent load got there first"""
+        entry = {
+            "messages": deque(
+                ({"role": msg.role, "content": msg.content} for msg in reversed(recent)),
+                maxlen=self.window
+            ),
+            "summary": (chat.summary or "") if chat else "",
+            "unsummarized": unsummarized or 0
+        }
+        
+        with self._lock:
+            entry = self._chats.setdefault(chat_id, entry)
+            self._chats.move_to_end(chat_id)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+            return entry
+    
+    def _snapshot(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            return {"history": list(entry["messages"]), "summary": entry["summary"]}
+    
+    def _remember(self, chat_id: int, question: str, response: str) -> bool:
+        """Add a turn to the cached window; True when a summary update is due"""
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            if entry is None:
+                # Loaded from the database on next use
+                return False
+            
+            entry["messages"].append({"role": "user", "content": question})
+            entry["messages"].append({"role": "assistant", "content": response})
+            entry["unsummarized"] += 2
+            
+            due = entry["unsummarized"] - self.window >= 2 * self.summary_every
+            if not due or chat_id in self._summarizing:
+                return False
+            self._summarizing.add(chat_id)
+            return True
+    
+    def _pending_query(self, chat_id: int, summary_message_id: int):
+        """Query for messages between the summary and the raw window"""
+        window_start = (
+            select(Message.id)
+            .where(Message.chat_session_id == chat_id)
+            .order_by(Message.id.desc())
+            .offset(self.window - 1)
+            .limit(1)
+            .scalar_subquery()
+        )
+        return (
+            select(Message)
+            .where(
+                Message.chat_session_id == chat_id,
+                Message.id > summary_message_id,
+                Message.id < window_start
+            )
+            .order_by(Message.id)
+            .limit(self.max_fold)
+        )
+    
+    def _summary_messages(self, summary: str, pending: List[Message]) -> List[Dict[str, str]]:
+        """Model messages asking for an updated summary"""
+        conversation = "\n".join(f"{msg.role}: {msg.content}" for msg in pending)
+        return [
+            {"role": "system", "content": prompt_loader.get_system_prompt("conversation_summarizer")},
+            {"role": "user", "content": prompt_loader.format_prompt(
+                "chat", "conversation_summary",
+                summary=summary or "(none yet)",
+                messages=conversation,
+                max_words=int(self.summary_max_tokens * 0.75)
+            )}
+        ]
+    
+    def _clip(self, summary: str) -> str:
+        return summary.strip()[:self.summary_max_tokens * settings.CHARS_PER_TOKEN]
+    
+    def _summary_update(self, chat_id: int, summary: str, pending: List[Message]):
+        # Summaries are bookkeeping, not activity, so updated_at stays put
+        return (
+            update(ChatSession)
+            .where(ChatSession.id == chat_id)
+            .values(summary=summary, summary_message_id=pending[-1].id, updated_at=ChatSession.updated_at)
+        )
+    
+    def _apply_summary(self, chat_id: int, summary: str, folded: int) -> None:
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            if entry is not None:
+                entry["summary"] = summary
+                entry["unsummarized"] -= folded
+    
+    def _summarize(self, chat_id: int) -> None:
+        """Fold messages that left the window into the summary (sync path)"""
+        try:
+            with SessionLocal() as db:
+                chat = db.get(ChatSession, chat_id)
+                if chat is None:
+                    return
+                pending = db.scalars(self._pending_query(chat_id, chat.summary_message_id or 0)).all()
+                if not pending:
+                    return
+                
+                summary = self._clip(ollama_chat.generate_response(self._summary_messages(chat.summary, pending)))
+                db.execute(self._summary_update(chat_id, summary, pending))
+                db.commit()
+            
+            self._apply_summary(chat_id, summary, len(pending))
+            logger.info(f"Summarized {len(pending)} messages for chat {chat_id}")
+        
+        except Exception as e:
+            logger.warning(f"Failed to update summary for chat {chat_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._summarizing.discard(chat_id)
+    
+    async def _asummarize(self, chat_id: int) -> None:
+        """Async variant of _summarize; the model call waits its turn in the scheduler"""
+        try:
+            async with AsyncSessionLocal() as db:
+                chat = await db.get(ChatSession, chat_id)
+                if chat is None:
+                    return
+                pending = (await db.scalars(self._pending_query(chat_id, chat.summary_message_id or 0))).all()
+                previous = chat.summary
+            if not pending:
+                return
+            
+            # Queued under its own key so summaries don't take turns from the chat itself
+            response, _ = await generation_scheduler.generate(self._summary_messages(previous, pending), ("summary", chat_id))
+            summary = self._clip(response)
+            
+            async with AsyncSessionLocal() as db:
+                await db.execute(self._summary_update(chat_id, summary, pending))
+                await db.commit()
+            
+            self._apply_summary(chat_id, summary, len(pending))
+            logger.info(f"Summarized {len(pending)} messages for chat {chat_id}")
+        
+        except Exception as e:
+            # Shed or failed summaries are retried after the next turn
+            logger.warning(f"Failed to update summary for chat {chat_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._summarizing.discard(chat_id)
+    
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Global instance
+chat_memory = ChatMemory()
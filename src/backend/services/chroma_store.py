@@ -0,0 +1,310 @@
+import logging
+import threading
+from pathlib import Path
+from typing import List, Dict, Any
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from services.vector_store import VectorStore
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ChromaVectorStore(VectorStore):
+    """One persistent ChromaDB collection per chat"""
+    
+    def __init__(self, path: str = None):
+        self.chroma_path = Path(path or settings.CHROMA_DB_PATH)
+        self.chroma_path.mkdir(parents=True, exist_ok=True)
+        
+        self.client = chromadb.PersistentClient(
+            path=str(self.chroma_path),
+            settings=ChromaSettings(anonymized_telemetry=False)
+        )
+        
+        # Collection handles by chat id, so lookups skip Chroma metadata calls
+        self._collections: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._load_collections()
+    
+    def _load_collections(self) -> None:
+        """Register every existing chat collection once at startup"""
+        for collection in self.client.list_collections():
+            if not collection.name.startswith("chat_"):
+                continue
+            
+            try:
+                chat_id = int(collection.name[len("chat_"):])
+            except ValueError:
+                continue
+            
+            self._collections[chat_id] = collection
+        
+        logger.info(f"Registered {len(self._collections)} collections")
+    
+    def get_collection_name(self, chat_id: int) -> str:
+        """Get collection name for chat session"""
+        return f"chat_{chat_id}"
+    
+    def get_collection(self, chat_id: int):
+        """Get collection for chat session"""
+        collection = self._collections.get(chat_id)
+        if collection is not None:
+            return collection
+        
+        # Not registered yet (e.g. created by another process)
+        collection_name = self.get_collection_name(chat_id)
+        collection = self.client.get_collection(name=collection_name)
+        with self._lock:
+            self._collections[chat_id] = collection
+        return collection
+    
+    def list_chats(self) -> List[int]:
+        return list(self._collections)
+    
+    def create(self, chat_id: int) -> None:
+        collection_name = self.get_collection_name(chat_id)
+        collection = self.client.get_or_create_collection(
+            name=collection_name,
+            metadata={"chat_id": chat_id}
+        )
+        with self._lock:
+            self._collections[chat_id] = collection
+        logger.info(f"Created collection: {collection_name}")
+    
+    def exists(self, chat_id: int) -> bool:
+        return chat_id in self._collections
+    
+    def add(self, chat_id: int, ids: List[str], documents: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> None:
+        self.get_collection(chat_id).upsert(
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+    
+    def update_metadata(self, chat_id: int, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.get_collection(chat_id).update(ids=ids, metadatas=metadatas)
+    
+    def get(self, chat_id: int, ids: List[str] = None, where: Dict[str, Any] = None, include_documents: bool = True) -> Dict[str, List]:
+        include = ["documents", "metadatas"] if include_documents else ["metadatas"]
+        results = self.get_collection(chat_id).get(ids=ids, where=where, include=include)
+        return {
+            "ids": results["ids"],
+            "documents": results["documents"] if include_documents else None,
+            "metadatas": results["metadatas"]
+        }
+    
+    def search(self, chat_id: int, embedding: List[float], n_results: int, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        
+        results = self.get_collection(chat_id).query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            include=include
+        )
+        
+        hits = []
+        for i in range(len(results["ids"][0])):
+            hits.append({
+                "id": results["ids"][0][i],
+                "document": results["documents"][0][i],
+                "metadata": results["metadatas"][0][i],
+                "similarity": 1 - results["distances"][0][i]  # Convert distance to similarity
+            })
+            if include_embeddings:
+                hits[-1]["embedding"] = list(results["embeddings"][0][i])
+        return hits
+    
+    def remove(self, chat_id: int, ids: List[str]) -> None:
+        self.get_collection(chat_id).delete(ids=ids)
+    
+    def delete(self, chat_id: int) -> None:
+        with self._lock:
+            self._collections.pop(chat_id, None)
+        
+        collection_name = self.get_collection_name(chat_id)
+        self.client.delete_collection(name=collection_name)
+        logger.info(f"Deleted collection: {collection_name}")
+    
+    def count(self, chat_id: int) -> int:
+        collection = self._collections.get(chat_id)
+        if collection is None:
+            return 0
+        return collection.count()
+
+class SharedChromaVectorStore(ChromaVectorStore):
+    """Chats share a fixed number of Chroma collections, filtered by a chat_id metadata field
+    
+    With one collection per chat, every chat has its own HNSW index and files,
+    so startup, open file handles and list_collections grow with the number of
+    chats. Here chat ``n`` lives in collection ``chats_{n % shards}``. Chunk ids
+    are prefixed with the chat id inside Chroma so chats cannot collide, and
+    the prefix and chat_id field are stripped from everything returned.
+    """
+    
+    def __init__(self, path: str = None, shards: int = None):
+        self.shards = shards or settings.CHROMA_SHARED_COLLECTIONS
+        # Chunk counts by chat id: scanned once, then kept up to date by writes
+        self._counts: Dict[int, int] = {}
+        self._chat_locks: Dict[int, threading.Lock] = {}
+        super().__init__(path)
+    
+    def _load_collections(self) -> None:
+        """Open (or create) the shared collections once at startup"""
+        for shard in range(self.shards):
+            self._collections[shard] = self.client.get_or_create_collection(
+                name=f"chats_{shard}",
+                metadata={"tenancy": "shared"}
+            )
+        
+        logger.info(f"Opened {self.shards} shared collections")
+    
+    def get_collection(self, chat_id: int):
+        """Shared collection holding the chat's chunks"""
+        return self._collections[chat_id % self.shards]
+    
+    def _chat_lock(self, chat_id: int) -> threading.Lock:
+        """Serializes a chat's writes so its count stays exact"""
+        with self._lock:
+            return self._chat_locks.setdefault(chat_id, threading.Lock())
+    
+    def _stored_count(self, chat_id: int, stored_ids: List[str]) -> int:
+        """How many of the ids are already stored"""
+        return len(self.get_collection(chat_id).get(ids=list(set(stored_ids)), include=[])["ids"])
+    
+    @staticmethod
+    def _stored_id(chat_id: int, chunk_id: str) -> str:
+        return f"{chat_id}:{chunk_id}"
+    
+    @staticmethod
+    def _chunk_id(stored_id: str) -> str:
+        return stored_id.split(":", 1)[1]
+    
+    @staticmethod
+    def _chunk_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in metadata.items() if key != "chat_id"}
+    
+    @staticmethod
+    def _where(chat_id: int, where: Dict[str, Any] = None) -> Dict[str, Any]:
+        if not where:
+            return {"chat_id": chat_id}
+        return {"$and": [{"chat_id": chat_id}] + [{key: value} for key, value in where.items()]}
+    
+    def list_chats(self) -> List[int]:
+        """Chat ids with stored chunks (scans metadata, so meant for maintenance tools)"""
+        chat_ids = set()
+        for collection in self._collections.values():
+            offset = 0
+            while True:
+                results = collection.get(include=["metadatas"], limit=10000, offset=offset)
+                if not results["ids"]:
+                    break
+                chat_ids.update(metadata["chat_id"] for metadata in results["metadatas"])
+                offset += len(results["ids"])
+        return sorted(chat_ids)
+    
+    def create(self, chat_id: int) -> None:
+        # Nothing to create: the chat's chunks go into an existing shared collection
+        pass
+    
+    def exists(self, chat_id: int) -> bool:
+        return True
+    
+    def add(self, chat_id: int, ids: List[str], documents: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> None:
+        stored_ids = [self._stored_id(chat_id, chunk_id) for chunk_id in ids]
+        with self._chat_lock(chat_id):
+            # Upserts only add the ids not stored yet
+            counted = chat_id in self._counts
+            new = len(set(stored_ids)) - self._stored_count(chat_id, stored_ids) if counted else 0
+            
+            self.get_collection(chat_id).upsert(
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=[{**metadata, "chat_id": chat_id} for metadata in metadatas],
+                ids=stored_ids
+            )
+            if counted:
+                self._counts[chat_id] += new
+    
+    def update_metadata(self, chat_id: int, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.get_collection(chat_id).update(
+            ids=[self._stored_id(chat_id, chunk_id) for chunk_id in ids],
+            metadatas=[{**metadata, "chat_id": chat_id} for metadata in metadatas]
+        )
+    
+    def get(self, chat_id: int, ids: List[str] = None, where: Dict[str, Any] = None, include_documents: bool = True) -> Dict[str, List]:
+        include = ["documents", "metadatas"] if include_documents else ["metadatas"]
+        results = self.get_collection(chat_id).get(
+            ids=[self._stored_id(chat_id, chunk_id) for chunk_id in ids] if ids is not None else None,
+            where=self._where(chat_id, where),
+            include=include
+        )
+        return {
+            "ids": [self._chunk_id(stored_id) for stored_id in results["ids"]],
+            "documents": results["documents"] if include_documents else None,
+            "metadatas": [self._chunk_metadata(metadata) for metadata in results["metadatas"]]
+        }
+    
+    def search(self, chat_id: int, embedding: List[float], n_results: int, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        
+        results = self.get_collection(chat_id).query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            where=self._where(chat_id),
+            include=include
+        )
+        
+        hits = []
+        for i in range(len(results["ids"][0])):
+            hits.append({
+                "id": self._chunk_id(results["ids"][0][i]),
+                "document": results["documents"][0][i],
+                "metadata": self._chunk_metadata(results["metadatas"][0][i]),
+                "similarity": 1 - results["distances"][0][i]  # Convert distance to similarity
+            })
+            if include_embeddings:
+                hits[-1]["embedding"] = list(results["embeddings"][0][i])
+        return hits
+    
+    def remove(self, chat_id: int, ids: List[str]) -> None:
+        stored_ids = [self._stored_id(chat_id, chunk_id) for chunk_id in ids]
+        with self._chat_lock(chat_id):
+            counted = chat_id in self._counts
+            removed = self._stored_count(chat_id, stored_ids) if counted else 0
+            
+            self.get_collection(chat_id).delete(ids=stored_ids)
+            if counted:
+                self._counts[chat_id] -= removed
+    
+    def delete(self, chat_id: int) -> None:
+        with self._chat_lock(chat_id):
+            self.get_collection(chat_id).delete(where={"chat_id": chat_id})
+            # Forget the chat so deleted chats do not accumulate entries
+            with self._lock:
+                self._counts.pop(chat_id, None)
+                self._chat_locks.pop(chat_id, None)
+        logger.info(f"Deleted chunks of chat {chat_id} from shared collection")
+    
+    def count(self, chat_id: int) -> int:
+        count = self._counts.get(chat_id)
+        if count is not None:
+            return count
+        
+        # First count for this chat in this process: page through its ids once
+        with self._chat_lock(chat_id):
+            count = self._counts.get(chat_id)
+            if count is None:
+                collection = self.get_collection(chat_id)
+                count = 0
+                while True:
+                    page = collection.get(where={"chat_id": chat_id}, include=[], limit=10000, offset=count)
+                    if not page["ids"]:
+                        break
+                    count += len(page["ids"])
+                self._counts[chat_id] = count
+            return count
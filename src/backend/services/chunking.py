@@ -0,0 +1,307 @@
+import re
+import bisect
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Iterator, Iterable, Tuple, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Word pieces of at most 8 characters and single punctuation marks. A cheap
+# stand-in for a subword tokenizer that also bounds chunk size on long strings.
+_TOKEN = re.compile(r"\w{1,8}|[^\w\s]")
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+_SENTENCE_END = ".!?"
+
+# Boundary strengths, strongest last
+LINE_BREAK = 1
+SENTENCE_BREAK = 2
+PARAGRAPH_BREAK = 3
+PAGE_BREAK = 4
+
+Segment = Tuple[Optional[int], str]
+
+def count_tokens(text: str) -> int:
+    """Token count as used by the chunkers"""
+    return sum(1 for _ in _TOKEN.finditer(text))
+
+def _page_at(page_starts: List[int], pages: List[int], offset: int) -> Optional[int]:
+    """Page number containing an absolute character offset"""
+    if not pages:
+        return None
+    index = bisect.bisect_right(page_starts, offset) - 1
+    return pages[max(index, 0)]
+
+class BaseChunker(ABC):
+    """Abstract base class for chunking strategies"""
+    
+    @abstractmethod
+    def chunk(self, segments: Iterable[Segment]) -> Iterator[Dict[str, Any]]:
+        """Yield chunks from a (page, text) stream
+        
+        Each chunk has ``content``, ``start_char``/``end_char`` offsets into the
+        concatenated stream (PDF pages joined by a newline), ``page``/``page_end``
+        (None for text files) and ``heading_path`` ("" outside Markdown).
+        """
+        pass
+    
+    def chunk_text(self, text: str) -> List[Dict[str, Any]]:
+        """Chunk a single string"""
+        return list(self.chunk([(None, text)]))
+
+class TokenChunker(BaseChunker):
+    """Fixed token budget per chunk, cut at the strongest nearby boundary
+    
+    A chunk ends at the strongest boundary (paragraph, then sentence, then line)
+    in the second half of its token window, so every step moves forward by at
+    least half a window minus the overlap. Chunks cut at a paragraph break or
+    stronger get no overlap; otherwise the overlap starts on a sentence where
+    possible.
+    """
+    
+    page_breaks = False
+    
+    def __init__(self, chunk_tokens: int = None, overlap_tokens: int = None):
+        self.chunk_tokens = max(8, chunk_tokens or settings.CHUNK_TOKENS)
+        self.min_tokens = self.chunk_tokens // 2
+        overlap = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        # Overlap must stay below the minimum chunk length or chunking could stall
+        self.overlap_tokens = max(0, min(overlap, self.min_tokens - 1))
+    
+    def chunk(self, segments: Iterable[Segment]) -> Iterator[Dict[str, Any]]:
+        buffer = ""
+        base = 0  # absolute offset of buffer[0]
+        total = 0
+        page_starts: List[int] = []
+        pages: List[int] = []
+        
+        for page_num, text in segments:
+            separator = "\n" if page_num is not None and total else ""
+            if page_num is not None:
+                page_starts.append(total + len(separator))
+                pages.append(page_num)
+            
+            buffer += separator + text
+            total += len(separator) + len(text)
+            
+            # Only text that is already settled is chunked; the rest waits for more input
+            consumed = yield from self._emit(buffer, base, page_starts, pages, final=False)
+            buffer = buffer[consumed:]
+            base += consumed
+        
+        yield from self._emit(buffer, base, page_starts, pages, final=True)
+    
+    def _emit(self, text: str, base: int, page_starts: List[int], pages: List[int], final: bool):
+        """Yield chunks from text, returning how many characters were consumed"""
+        spans = [match.span() for match in _TOKEN.finditer(text)]
+        count = len(spans)
+        start = 0
+        
+        while start < count:
+            end = start + self.chunk_tokens
+            if end >= count:
+                if not final:
+                    # Need one token of lookahead to judge the last boundary
+                    break
+                cut, strength = count, PAGE_BREAK
+            else:
+                cut, strength = self._best_cut(text, spans, start, end, base, page_starts)
+            
+            start_char, end_char = spans[start][0], spans[cut - 1][1]
+            yield {
+                "content": text[start_char:end_char],
+                "start_char": base + start_char,
+                "end_char": base + end_char,
+                "page": _page_at(page_starts, pages, base + start_char),
+                "page_end": _page_at(page_starts, pages, base + end_char - 1),
+                "heading_path": ""
+            }
+            
+            if cut >= count:
+                return len(text)
+            start = self._next_start(text, spans, start, cut, strength, base, page_starts)
+        
+        return spans[start][0] if start < count else len(text)
+    
+    def _best_cut(self, text: str, spans: List[Tuple[int, int]], start: int, end: int, base: int, page_starts: List[int]) -> Tuple[int, int]:
+        """Token index to cut before, and the strength of the boundary there"""
+        strongest = PAGE_BREAK if self.page_breaks else PARAGRAPH_BREAK
+        best, best_strength = end, 0
+        
+        # Scan backwards so ties go to the latest boundary
+        for i in range(end - 1, start + self.min_tokens - 1, -1):
+            strength = self._boundary(text, spans, i, base, page_starts)
+            if strength > best_strength:
+                best, best_strength = i + 1, strength
+                if strength >= strongest:
+                    break
+        
+        return best, best_strength
+    
+    def _next_start(self, text: str, spans: List[Tuple[int, int]], start: int, cut: int, strength: int, base: int, page_starts: List[int]) -> int:
+        """First token of the next chunk"""
+        if strength >= PARAGRAPH_BREAK or not self.overlap_tokens:
+            return cut
+        
+        first = max(cut - self.overlap_tokens, start + 1)
+        for i in range(first, cut):
+            if self._boundary(text, spans, i - 1, base, page_starts) >= SENTENCE_BREAK:
+                return i
+        return first
+    
+    def _boundary(self, text: str, spans: List[Tuple[int, int]], i: int, base: int, page_starts: List[int]) -> int:
+        """Strength of the boundary between token i and token i + 1"""
+        gap_start, gap_end = spans[i][1], spans[i + 1][0]
+        if gap_start == gap_end:
+            return 0
+        
+        if self.page_breaks and bisect.bisect_right(page_starts, base + gap_end) > bisect.bisect_right(page_starts, base + gap_start):
+            return PAGE_BREAK
+        
+        newlines = text.count("\n", gap_start, gap_end)
+        if newlines >= 2:
+            return PARAGRAPH_BREAK
+        if text[gap_start - 1] in _SENTENCE_END:
+            return SENTENCE_BREAK
+        if newlines:
+            return LINE_BREAK
+        return 0
+
+class PageChunker(TokenChunker):
+    """Token chunker that prefers to cut at page breaks, for PDFs"""
+    
+    page_breaks = True
+
+class MarkdownChunker(BaseChunker):
+    """Split Markdown on headings, pack small sections and token-chunk large ones"""
+    
+    def __init__(self, chunk_tokens: int = None, overlap_tokens: int = None):
+        self.splitter = TokenChunker(chunk_tokens, overlap_tokens)
+        self.chunk_tokens = self.splitter.chunk_tokens
+    
+    def chunk(self, segments: Iterable[Segment]) -> Iterator[Dict[str, Any]]:
+        pending = None  # consecutive small sections packed into one chunk
+        
+        for start, text, path in self._sections(segments):
+            tokens = count_tokens(text)
+            
+            if pending is not None and pending["tokens"] + tokens <= self.chunk_tokens:
+                pending["text"] += text
+                pending["tokens"] += tokens
+                pending["path"] = self._common_path(pending["path"], path)
+                continue
+            
+            if pending is not None:
+                yield from self._section_chunk(pending["start"], pending["text"], pending["path"])
+                pending = None
+            
+            if tokens <= self.chunk_tokens:
+                pending = {"start": start, "text": text, "tokens": tokens, "path": path}
+                continue
+            
+            for chunk in self.splitter.chunk_text(text):
+                chunk["start_char"] += start
+                chunk["end_char"] += start
+                chunk["heading_path"] = " > ".join(path)
+                yield chunk
+        
+        if pending is not None:
+            yield from self._section_chunk(pending["start"], pending["text"], pending["path"])
+    
+    def _sections(self, segments: Iterable[Segment]) -> Iterator[Tuple[int, str, Tuple[str, ...]]]:
+        """Yield (start offset, text, heading path) for each heading section"""
+        headings: List[Tuple[int, str]] = []
+        path: Tuple[str, ...] = ()
+        lines: List[str] = []
+        section_start = 0
+        offset = 0
+        in_fence = False
+        
+        for line in self._lines(segments):
+            if _FENCE.match(line):
+                in_fence = not in_fence
+            match = None if in_fence else _HEADING.match(line)
+            
+            if match:
+                if lines:
+                    yield section_start, "".join(lines), path
+                    lines = []
+                section_start = offset
+                
+                level = len(match.group(1))
+                headings = [heading for heading in headings if heading[0] < level] + [(level, match.group(2))]
+                path = tuple(title for _, title in headings)
+            
+            lines.append(line)
+            offset += len(line)
+        
+        if lines:
+            yield section_start, "".join(lines), path
+    
+    @staticmethod
+    def _lines(segments: Iterable[Segment]) -> Iterator[str]:
+        """Lines (with line endings) across block boundaries"""
+        carry = ""
+        for _, text in segments:
+            lines = (carry + text).split("\n")
+            carry = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        if carry:
+            yield carry
+    
+    @staticmethod
+    def _common_path(a: Tuple[str, ...], b: Tuple[str, ...]) -> Tuple[str, ...]:
+        common = []
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            common.append(x)
+        return tuple(common)
+    
+    @staticmethod
+    def _section_chunk(start: int, text: str, path: Tuple[str, ...]) -> Iterator[Dict[str, Any]]:
+        content = text.strip()
+        if not content:
+            return
+        
+        start_char = start + len(text) - len(text.lstrip())
+        yield {
+            "content": content,
+            "start_char": start_char,
+            "end_char": start_char + len(content),
+            "page": None,
+            "page_end": None,
+            "heading_path": " > ".join(path)
+        }
+
+_chunkers: Dict[str, BaseChunker] = {
+    "token": TokenChunker(),
+    "page": PageChunker(),
+    "markdown": MarkdownChunker()
+}
+
+# Strategy used for each file type when CHUNK_STRATEGY is "auto"
+_FILE_TYPE_STRATEGIES = {
+    ".pdf": "page",
+    ".md": "markdown"
+}
+
+def register_chunker(name: str, chunker: BaseChunker) -> None:
+    """Make a chunker selectable through the CHUNK_STRATEGY setting"""
+    _chunkers[name] = chunker
+
+def get_chunker(name: str = None, file_ext: str = "") -> BaseChunker:
+    """Get chunker by name, picking one from the file type for "auto" """
+    name = name or settings.CHUNK_STRATEGY
+    if name == "auto":
+        name = _FILE_TYPE_STRATEGIES.get(file_ext.lower(), "token")
+    
+    chunker = _chunkers.get(name)
+    if chunker is None:
+        logger.warning(f"Unknown chunking strategy '{name}', using token chunking")
+        return _chunkers["token"]
+    return chunker
@@ -0,0 +1,135 @@
+import math
+import logging
+from typing import List, Dict, Any, Tuple
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ContextBuilder:
+    """Fit retrieved chunks and chat history into a model's context window"""
+    
+    def __init__(self):
+        self.default_window = settings.CONTEXT_WINDOW_TOKENS
+        self.model_windows = self._parse_model_windows(settings.MODEL_CONTEXT_WINDOWS)
+        self.response_reserve = settings.RESPONSE_RESERVE_TOKENS
+        self.context_share = settings.CONTEXT_SHARE
+        self.chars_per_token = settings.CHARS_PER_TOKEN
+    
+    @staticmethod
+    def _parse_model_windows(value: str) -> Dict[str, int]:
+        """Parse "mistral:8192,llama3:8192" into a dict"""
+        windows = {}
+        for item in value.split(","):
+            name, _, tokens = item.strip().rpartition(":")
+            if name and tokens.isdigit():
+                windows[name] = int(tokens)
+        return windows
+    
+    def estimate_tokens(self, text: str) -> int:
+        """Rough token count; close enough for budgeting without a tokenizer"""
+        return math.ceil(len(text) / self.chars_per_token)
+    
+    def prompt_budget(self, model_name: str) -> int:
+        """Tokens available for the prompt after reserving room for the answer"""
+        window = self.model_windows.get(model_name)
+        if window is None and model_name:
+            # "mistral:latest" falls back to the "mistral" entry
+            window = self.model_windows.get(model_name.split(":")[0])
+        return (window or self.default_window) - self.response_reserve
+    
+    def context_budget(self, model_name: str) -> int:
+        """Tokens available for document context"""
+        return int(self.prompt_budget(model_name) * self.context_share)
+    
+    def build_context(self, docs: List[Dict[str, Any]], budget_tokens: int) -> Tuple[str, List[Dict[str, Any]]]:
+        """Merge, dedup and pack ranked chunks into a context string within budget"""
+        blocks = self.merge_chunks(docs)
+        
+        parts = []
+        used = []
+        remaining = budget_tokens
+        for block in blocks:
+            tokens = self.estimate_tokens(block["content"])
+            if tokens > remaining:
+                if not parts and remaining > 0:
+                    # Never return an empty context just because the best block is large
+                    block = {**block, "content": block["content"][:remaining * self.chars_per_token]}
+                    parts.append(block["content"])
+                    used.append(block)
+                break
+            
+            parts.append(block["content"])
+            used.append(block)
+            remaining -= tokens
+        
+        return "\n\n".join(parts), used
+    
+    def merge_chunks(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Join adjacent chunks of the same file and drop duplicates, keeping rank order"""
+        by_file: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for rank, doc in enumerate(docs):
+            by_file.setdefault(doc["filename"], []).append((rank, doc))
+        
+        blocks = []
+        for filename, ranked_docs in by_file.items():
+            ranked_docs.sort(key=lambda item: item[1].get("chunk_index", 0))
+            
+            current = None
+            for rank, doc in ranked_docs:
+                index = doc.get("chunk_index", 0)
+                if current is not None and index == current["last_index"] + 1:
+                    current["content"] = self._join_overlapping(current["content"], doc["content"])
+                    current["last_index"] = index
+                    current["rank"] = min(current["rank"], rank)
+                    continue
+                
+                if current is not None:
+                    blocks.append(current)
+                current = {
+                    "content": doc["content"],
+                    "filename": filename,
+                    "chunk_index": index,
+                    "last_index": index,
+                    "rank": rank
+                }
+            
+            if current is not None:
+                blocks.append(current)
+        
+        blocks.sort(key=lambda block: block["rank"])
+        
+        # Drop blocks whose text is already covered by a better-ranked block
+        unique = []
+        for block in blocks:
+            if any(block["content"] in kept["content"] for kept in unique):
+                continue
+            unique.append(block)
+        
+        return unique
+    
+    @staticmethod
+    def _join_overlapping(first: str, second: str, max_overlap: int = 400, min_overlap: int = 20) -> str:
+        """Concatenate two chunks, removing the text they share at the seam"""
+        longest = min(len(first), len(second), max_overlap)
+        for size in range(longest, min_overlap - 1, -1):
+            if first.endswith(second[:size]):
+                return first + second[size:]
+        return first + "\n" + second
+    
+    def trim_history(self, chat_history: List[Dict[str, str]], budget_tokens: int) -> List[Dict[str, str]]:
+        """Keep the most recent messages that fit within budget"""
+        kept = []
+        remaining = budget_tokens
+        for message in reversed(chat_history):
+            # Role label and separator cost a few tokens too
+            tokens = self.estimate_tokens(message["content"]) + 4
+            if tokens > remaining:
+                break
+            kept.append(message)
+            remaining -= tokens
+        
+        kept.reverse()
+        return kept
+
+# Global instance
+context_builder = ContextBuilder()
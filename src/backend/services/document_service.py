@@ -1,105 +1,226 @@
 import os
+import uuid
+import hashlib
 import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Iterable, Tuple, Optional, BinaryIO
 import PyPDF2
+from services.chunking import get_chunker
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Text files are read in blocks of this many characters
+TEXT_BLOCK_SIZE = 64 * 1024
+
+# Uploads are written to a hidden part file in the chat directory, then renamed into place
+PARTIAL_UPLOAD_SUFFIX = ".part"
+
+class UploadTooLarge(Exception):
+    """An upload exceeded the configured size limit"""
+    
+    def __init__(self, message: str, max_bytes: int):
+        super().__init__(message)
+        self.max_bytes = max_bytes
+
+class SpooledUpload:
+    """An upload written to a part file, waiting to be committed or discarded"""
+    
+    def __init__(self, temp_path: Path, content_hash: str, size: int):
+        self.temp_path = temp_path
+        self.content_hash = content_hash
+        self.size = size
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extract text for pages [start, end) of a PDF (runs in worker processes)"""
+    with open(file_path, "rb") as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[page_num].extract_text() or "" for page_num in range(start, end)]
+
 class DocumentService:
     """Document processing service for PDF, TXT, MD files"""
     
     def __init__(self):
         self.upload_dir = Path(settings.UPLOAD_DIR)
+        self.block_size = settings.UPLOAD_BLOCK_SIZE
+        self.pdf_workers = settings.PDF_EXTRACT_WORKERS
+        self.pdf_parallel_min_pages = settings.PDF_PARALLEL_MIN_PAGES
+        self.pdf_pages_per_task = settings.PDF_PAGES_PER_TASK
+        self._pdf_pool = None
     
-    def save_file(self, file_content: bytes, filename: str, chat_id: int) -> str:
-        """Save uploaded file to chat directory"""
+    def _chat_dir(self, chat_id: int) -> Path:
         chat_dir = self.upload_dir / f"chat_{chat_id}"
         chat_dir.mkdir(parents=True, exist_ok=True)
+        return chat_dir
+    
+    def spool_upload(self, source: BinaryIO, chat_id: int, max_bytes: int = None) -> SpooledUpload:
+        """Copy an upload to a part file in fixed-size blocks, hashing it on the way
+        
+        Memory use is one block regardless of file size. Raises UploadTooLarge
+        as soon as the limit is crossed; the part file is removed on any error.
+        """
+        max_bytes = max_bytes or settings.MAX_UPLOAD_BYTES
+        temp_path = self._chat_dir(chat_id) / f".{uuid.uuid4().hex}{PARTIAL_UPLOAD_SUFFIX}"
+        digest = hashlib.sha256()
+        size = 0
+        
+        try:
+            with open(temp_path, "wb") as f:
+                while True:
+                    block = source.read(self.block_size)
+                    if not block:
+                        break
+                    
+                    size += len(block)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"File exceeds the upload limit of {max_bytes} bytes", max_bytes)
+                    
+                    digest.update(block)
+                    f.write(block)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
         
-        file_path = chat_dir / filename
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        return SpooledUpload(temp_path, digest.hexdigest(), size)
+    
+    def commit_upload(self, upload: SpooledUpload, filename: str, chat_id: int) -> str:
+        """Atomically move a spooled upload to its final path, replacing any previous version"""
+        file_path = self._chat_dir(chat_id) / filename
+        # Same directory, so the rename is atomic; jobs reading the old file keep their handle
+        os.replace(upload.temp_path, file_path)
         
-        logger.info(f"File saved: {file_path}")
+        logger.info(f"File saved: {file_path} ({upload.size} bytes)")
         return str(file_path)
     
-    def extract_text(self, file_path: str) -> str:
-        """Extract text from document based on file type"""
+    def discard_upload(self, upload: SpooledUpload) -> None:
+        """Remove a spooled upload that won't be kept"""
+        upload.temp_path.unlink(missing_ok=True)
+    
+    def remove_partial_uploads(self) -> int:
+        """Delete part files left behind by uploads interrupted by a restart"""
+        removed = 0
+        for part in self.upload_dir.glob(f"chat_*/.*{PARTIAL_UPLOAD_SUFFIX}"):
+            part.unlink(missing_ok=True)
+            removed += 1
+        
+        if removed:
+            logger.info(f"Removed {removed} partial uploads")
+        return removed
+    
+    def delete_file(self, file_path: str) -> None:
+        """Remove an uploaded file"""
+        Path(file_path).unlink(missing_ok=True)
+        logger.info(f"File deleted: {file_path}")
+    
+    def iter_pages(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield (page number, text) pairs; text files yield blocks without page numbers"""
         file_path = Path(file_path)
         file_ext = file_path.suffix.lower()
         
         try:
             if file_ext == ".pdf":
-                return self._extract_pdf_text(file_path)
-            elif file_ext == ".txt":
-                return self._extract_txt_text(file_path)
-            elif file_ext == ".md":
-                return self._extract_md_text(file_path)
+                yield from self._iter_pdf_pages(file_path)
+            elif file_ext in (".txt", ".md"):
+                yield from self._iter_text_blocks(file_path)
             else:
                 raise ValueError(f"Unsupported file type: {file_ext}")
-                
+        
         except Exception as e:
             logger.error(f"Failed to extract text from {file_path}: {str(e)}")
             raise Exception(f"Text extraction failed: {str(e)}")
     
-    def _extract_pdf_text(self, file_path: Path) -> str:
-        """Extract text from PDF file"""
-        text = ""
+    def extract_text(self, file_path: str) -> str:
+        """Extract text from document based on file type"""
+        file_path = Path(file_path)
+        separator = "\n" if file_path.suffix.lower() == ".pdf" else ""
+        return separator.join(text for _, text in self.iter_pages(file_path)).strip()
+    
+    def _iter_pdf_pages(self, file_path: Path) -> Iterator[Tuple[int, str]]:
+        """Yield PDF pages in order, extracting large documents in parallel"""
         with open(file_path, "rb") as file:
             pdf_reader = PyPDF2.PdfReader(file)
+            page_count = len(pdf_reader.pages)
             
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
+            if self.pdf_workers <= 1 or page_count < self.pdf_parallel_min_pages:
+                for page_num in range(page_count):
+                    yield page_num + 1, pdf_reader.pages[page_num].extract_text() or ""
+                return
         
-        return text.strip()
+        logger.info(f"Extracting {page_count} pages from {file_path.name} with {self.pdf_workers} processes")
+        yield from self._iter_pdf_pages_parallel(file_path, page_count)
     
-    def _extract_txt_text(self, file_path: Path) -> str:
-        """Extract text from TXT file"""
-        with open(file_path, "r", encoding="utf-8") as file:
-            return file.read().strip()
+    def _iter_pdf_pages_parallel(self, file_path: Path, page_count: int) -> Iterator[Tuple[int, str]]:
+        """Extract page ranges in worker processes, keeping only a few ranges in flight"""
+        pool = self._get_pdf_pool()
+        ranges = [
+            (start, min(start + self.pdf_pages_per_task, page_count))
+            for start in range(0, page_count, self.pdf_pages_per_task)
+        ]
+        
+        pending = deque()
+        next_range = 0
+        max_in_flight = self.pdf_workers * 2
+        
+        try:
+            while pending or next_range < len(ranges):
+                while next_range < len(ranges) and len(pending) < max_in_flight:
+                    start, end = ranges[next_range]
+                    pending.append((start, pool.submit(_extract_pdf_page_range, str(file_path), start, end)))
+                    next_range += 1
+                
+                start, future = pending.popleft()
+                for offset, text in enumerate(future.result()):
+                    yield start + offset + 1, text
+        finally:
+            for _, future in pending:
+                future.cancel()
+    
+    def _get_pdf_pool(self) -> ProcessPoolExecutor:
+        """Lazily create the shared PDF extraction pool"""
+        if self._pdf_pool is None:
+            # spawn avoids forking a process that is running other threads
+            self._pdf_pool = ProcessPoolExecutor(
+                max_workers=self.pdf_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pdf_pool
     
-    def _extract_md_text(self, file_path: Path) -> str:
-        """Extract text from MD file"""
+    def _iter_text_blocks(self, file_path: Path) -> Iterator[Tuple[None, str]]:
+        """Read TXT/MD files in fixed-size blocks"""
         with open(file_path, "r", encoding="utf-8") as file:
-            return file.read().strip()
+            while True:
+                block = file.read(TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                yield None, block
     
-    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Split text into chunks with overlap"""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Find last sentence boundary within chunk
-            if end < len(text):
-                last_sentence = text.rfind(".", start, end)
-                if last_sentence > start:
-                    end = last_sentence + 1
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - overlap
-        
-        return chunks
+    def chunk_text(self, text: str, strategy: str = "token") -> List[str]:
+        """Split text into chunks"""
+        return [chunk["content"] for chunk in get_chunker(strategy).chunk_text(text)]
+    
+    def chunk_pages(self, pages: Iterable[Tuple[Optional[int], str]], file_ext: str = "", strategy: str = None) -> Iterator[Dict[str, Any]]:
+        """Chunk a page stream incrementally with the strategy for this file type"""
+        return get_chunker(strategy, file_ext).chunk(pages)
     
     def process_document(self, file_path: str) -> Dict[str, Any]:
         """Process document and return chunks with metadata"""
-        text = self.extract_text(file_path)
-        chunks = self.chunk_text(text)
+        total_characters = 0
+        
+        def counted_pages():
+            nonlocal total_characters
+            for page_num, text in self.iter_pages(file_path):
+                total_characters += len(text)
+                yield page_num, text
+        
+        chunks = list(self.chunk_pages(counted_pages(), Path(file_path).suffix))
         
         return {
             "file_path": file_path,
             "filename": Path(file_path).name,
-            "total_text": text,
+            "total_characters": total_characters,
             "chunks": chunks,
             "chunk_count": len(chunks)
         }
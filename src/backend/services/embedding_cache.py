@@ -0,0 +1,170 @@
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Iterable
+from services.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: in-process LRU in front of SQLite
+    
+    Keys are a hash of the normalized text plus the embedding model identity,
+    so identical chunks are embedded once regardless of which chat they came from.
+    Vectors are stored as float32 blobs.
+    """
+    
+    def __init__(self, path: str, model: str, max_entries: int, memory_entries: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model = model
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so trivially different copies share a key"""
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+    
+    def make_key(self, text: str) -> str:
+        """Cache key for text under the configured model"""
+        payload = f"{self.model}\x00{self.normalize(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Look up keys, returning only the ones that are cached"""
+        found = {}
+        remaining = []
+        
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    remaining.append(key)
+            
+            if found:
+                CACHE_LOOKUPS.inc(len(found), cache="embedding", result="memory_hit")
+            if not remaining:
+                return found
+            
+            now = time.time()
+            disk_found = {}
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(remaining), 500):
+                batch = remaining[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    disk_found[key] = array("f", blob).tolist()
+            
+            if disk_found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in disk_found]
+                )
+                self._conn.commit()
+            
+            for key, vector in disk_found.items():
+                self._remember(key, vector)
+            
+            self.disk_hits += len(disk_found)
+            self.misses += len(remaining) - len(disk_found)
+            CACHE_LOOKUPS.inc(len(disk_found), cache="embedding", result="disk_hit")
+            CACHE_LOOKUPS.inc(len(remaining) - len(disk_found), cache="embedding", result="miss")
+        
+        found.update(disk_found)
+        return found
+    
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors by key"""
+        if not items:
+            return
+        
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._disk_entries += max(cursor.rowcount, 0)
+            self._conn.commit()
+            
+            for key, vector in items.items():
+                self._remember(key, vector)
+            
+            if self._disk_entries > self.max_entries:
+                self._evict()
+    
+    def _remember(self, key: str, vector: List[float]) -> None:
+        """Add to the in-process LRU tier"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def _evict(self) -> None:
+        """Drop least recently used rows, leaving headroom to amortize evictions"""
+        target = int(self.max_entries * 0.9)
+        excess = self._disk_entries - target
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self._conn.commit()
+        self._disk_entries = target
+        logger.info(f"Evicted {excess} embeddings from cache")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and sizes"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries
+            }
+    
+    def clear(self) -> None:
+        """Remove every cached vector"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._disk_entries = 0
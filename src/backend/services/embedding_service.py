@@ -1,39 +1,303 @@
+import time
+import asyncio
+import contextlib
+import httpx
 import requests
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, AsyncContextManager, Optional
+from requests.adapters import HTTPAdapter
+from services.embedding_cache import EmbeddingCache
+from services.health_service import ServiceHealth
+from services.metrics import metrics, EMBEDDING_BATCH_DURATION, EMBEDDING_BATCH_SIZE
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class RetryableStatusError(Exception):
+    """Async client: a retryable status code was returned"""
+
 class EmbeddingService:
     """Client for custom embedding API service"""
     
     def __init__(self):
         self.base_url = settings.EMBEDDING_API_URL
+        self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        self.batch_max_chars = settings.EMBEDDING_BATCH_MAX_CHARS
+        self.max_concurrency = settings.EMBEDDING_MAX_CONCURRENCY
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES
+        self.retry_backoff = settings.EMBEDDING_RETRY_BACKOFF
+        self.timeout = settings.EMBEDDING_TIMEOUT
+        
+        # Size the connection pool to match the number of concurrent batches
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # Shared across callers so total parallelism stays bounded
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="embed"
+        )
+        
+        # Async callers share one pool capped at the same concurrency
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_client_loop = None
+        
+        self.health = ServiceHealth("embedding", probe=self._probe)
+        
+        self.cache = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.cache = EmbeddingCache(
+                path=settings.EMBEDDING_CACHE_PATH,
+                model=settings.EMBEDDING_MODEL,
+                max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                memory_entries=settings.EMBEDDING_CACHE_MEMORY_ENTRIES
+            )
     
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Get embeddings for list of texts"""
-        try:
-            response = self.session.post(
-                f"{self.base_url}/embed",
-                json={"text": texts},
-                headers={"Content-Type": "application/json"},
-                timeout=120
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            return data["embeddings"]
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Embedding API request failed: {str(e)}")
-            raise Exception(f"Failed to get embeddings: {str(e)}")
+        if not texts:
+            return []
+        
+        if self.cache is None:
+            return self._compute_embeddings(texts)
+        
+        keys = [self.cache.make_key(text) for text in texts]
+        embeddings = self.cache.get_many(keys)
+        
+        missing = self._missing(keys, texts, embeddings)
+        if missing:
+            computed = dict(zip(missing.keys(), self._compute_embeddings(list(missing.values()))))
+            self.cache.put_many(computed)
+            embeddings.update(computed)
+            logger.info(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} hits")
+        
+        return [embeddings[key] for key in keys]
+    
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of get_embeddings"""
+        if not texts:
+            return []
+        
+        if self.cache is None:
+            return await self._acompute_embeddings(texts)
+        
+        # The cache is backed by SQLite, so lookups stay off the event loop
+        keys = [self.cache.make_key(text) for text in texts]
+        embeddings = await asyncio.to_thread(self.cache.get_many, keys)
+        
+        missing = self._missing(keys, texts, embeddings)
+        if missing:
+            computed = dict(zip(missing.keys(), await self._acompute_embeddings(list(missing.values()))))
+            await asyncio.to_thread(self.cache.put_many, computed)
+            embeddings.update(computed)
+            logger.info(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} hits")
+        
+        return [embeddings[key] for key in keys]
+    
+    @staticmethod
+    def _missing(keys: List[str], texts: List[str], cached: Dict[str, List[float]]) -> Dict[str, str]:
+        """Each distinct uncached text once, by cache key"""
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return missing
     
     def get_single_embedding(self, text: str) -> List[float]:
         """Get embedding for single text"""
         embeddings = self.get_embeddings([text])
         return embeddings[0]
+    
+    async def aget_single_embedding(self, text: str) -> List[float]:
+        """Async variant of get_single_embedding"""
+        embeddings = await self.aget_embeddings([text])
+        return embeddings[0]
+    
+    def _compute_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts through the embedding API"""
+        self.health.before_request()
+        batches = self._make_batches(texts)
+        
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        
+        # map() yields results in submission order, so output lines up with input
+        embeddings = []
+        for batch_embeddings in self.executor.map(self._embed_batch, batches):
+            embeddings.extend(batch_embeddings)
+        
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return embeddings
+    
+    def _make_batches(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into batches bounded by count and total characters"""
+        batches = []
+        batch = []
+        batch_chars = 0
+        
+        for text in texts:
+            # A single oversized text still gets its own batch
+            if batch and (len(batch) >= self.batch_size or batch_chars + len(text) > self.batch_max_chars):
+                batches.append(batch)
+                batch = []
+                batch_chars = 0
+            
+            batch.append(text)
+            batch_chars += len(text)
+        
+        if batch:
+            batches.append(batch)
+        
+        return batches
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch, recording its size and latency (retries included)"""
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        with metrics.timed(EMBEDDING_BATCH_DURATION, stage="embedding"):
+            return self._post_batch(texts)
+    
+    def _post_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch, retrying transient failures with exponential backoff"""
+        attempt = 0
+        
+        while True:
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/embed",
+                    json={"text": texts},
+                    headers={"Content-Type": "application/json"},
+                    timeout=self.timeout
+                )
+                
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    raise requests.exceptions.RetryError(f"Embedding API returned {response.status_code}")
+                
+                response.raise_for_status()
+                
+                embeddings = response.json()["embeddings"]
+                self.health.record_success()
+                if len(embeddings) != len(texts):
+                    raise Exception(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+                
+                return embeddings
+            
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.RetryError) as e:
+                if attempt >= self.max_retries:
+                    self.health.record_failure(str(e))
+                    logger.error(f"Embedding API request failed after {attempt + 1} attempts: {str(e)}")
+                    raise Exception(f"Failed to get embeddings: {str(e)}")
+                
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Embedding batch failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+            
+            except requests.exceptions.RequestException as e:
+                response = getattr(e, "response", None)
+                if response is None or response.status_code >= 500:
+                    self.health.record_failure(str(e))
+                logger.error(f"Embedding API request failed: {str(e)}")
+                raise Exception(f"Failed to get embeddings: {str(e)}")
+    
+    def _new_async_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=self.max_concurrency),
+            timeout=httpx.Timeout(self.timeout, pool=None)
+        )
+    
+    def _async_client_scope(self) -> AsyncContextManager[httpx.AsyncClient]:
+        """Async client for one call: the pooled one, or a short-lived one outside the app
+        
+        Connections belong to the event loop that opened them, and a client cannot
+        be closed once its loop is gone, so other loops get a client of their own
+        that is closed when the call finishes.
+        """
+        if self._async_client is not None and self._async_client_loop is asyncio.get_running_loop():
+            return contextlib.nullcontext(self._async_client)
+        return self._new_async_client()
+    
+    async def aopen(self) -> None:
+        """Open the pooled async client for the application's lifetime"""
+        if self._async_client is None:
+            self._async_client = self._new_async_client()
+            self._async_client_loop = asyncio.get_running_loop()
+    
+    async def aclose(self) -> None:
+        """Close the async connection pool"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_client_loop = None
+    
+    async def _acompute_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of _compute_embeddings; the pool limit bounds parallel batches"""
+        self.health.before_request()
+        batches = self._make_batches(texts)
+        
+        async with self._async_client_scope() as client:
+            results = await asyncio.gather(*(self._aembed_batch(client, batch) for batch in batches))
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+    
+    async def _aembed_batch(self, client: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+        """Async variant of _embed_batch"""
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        with metrics.timed(EMBEDDING_BATCH_DURATION, stage="embedding"):
+            return await self._apost_batch(client, texts)
+    
+    async def _apost_batch(self, client: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+        """Async variant of _post_batch"""
+        attempt = 0
+        
+        while True:
+            try:
+                response = await client.post("/embed", json={"text": texts})
+                
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    raise RetryableStatusError(f"Embedding API returned {response.status_code}")
+                
+                response.raise_for_status()
+                
+                embeddings = response.json()["embeddings"]
+                self.health.record_success()
+                if len(embeddings) != len(texts):
+                    raise Exception(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+                
+                return embeddings
+            
+            except (httpx.TransportError, RetryableStatusError) as e:
+                if attempt >= self.max_retries:
+                    self.health.record_failure(str(e))
+                    logger.error(f"Embedding API request failed after {attempt + 1} attempts: {str(e)}")
+                    raise Exception(f"Failed to get embeddings: {str(e)}")
+                
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Embedding batch failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+            
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code >= 500:
+                    self.health.record_failure(str(e))
+                logger.error(f"Embedding API request failed: {str(e)}")
+                raise Exception(f"Failed to get embeddings: {str(e)}")
+    
+    def is_available(self) -> bool:
+        """Check if the embedding API is available (cached, see ServiceHealth)"""
+        return self.health.is_available()
+    
+    def _probe(self) -> bool:
+        """Actively check the embedding API is reachable"""
+        response = self.session.get(self.base_url, timeout=5)
+        return response.status_code < 500
 
 # Global instance
 embedding_service = EmbeddingService()
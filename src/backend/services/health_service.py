@@ -0,0 +1,160 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, Any, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ServiceUnavailableError(Exception):
+    """Raised when a backend's circuit breaker is open"""
+
+class ServiceHealth:
+    """Cached availability and circuit breaker for an external backend
+    
+    Availability is refreshed passively from real request outcomes and only
+    probed actively once the cached status is older than ``ttl``. After
+    ``failure_threshold`` consecutive failures the circuit opens and requests
+    fail fast until ``reset_timeout`` has passed, when a single trial request
+    is let through. ``async_probe`` lets async callers refresh the status
+    without blocking the event loop.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], bool],
+        async_probe: Callable[[], Awaitable[bool]] = None,
+        ttl: float = None,
+        failure_threshold: int = None,
+        reset_timeout: float = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.probe = probe
+        self.async_probe = async_probe
+        self.ttl = settings.HEALTH_CACHE_TTL if ttl is None else ttl
+        self.failure_threshold = failure_threshold or settings.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = settings.CIRCUIT_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self.clock = clock
+        
+        self.state = self.CLOSED
+        self.available: Optional[bool] = None
+        self.consecutive_failures = 0
+        self.last_checked: Optional[float] = None
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+        self._trial_started: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def is_available(self) -> bool:
+        """Cached availability, probing only when the status is stale"""
+        cached = self._cached_availability()
+        if cached is not None:
+            return cached
+        
+        try:
+            return self._record_probe(bool(self.probe()))
+        except Exception as e:
+            return self._record_probe(False, str(e))
+    
+    async def ais_available(self) -> bool:
+        """Async variant of is_available"""
+        cached = self._cached_availability()
+        if cached is not None:
+            return cached
+        
+        if self.async_probe is None:
+            return await asyncio.to_thread(self.is_available)
+        
+        try:
+            return self._record_probe(bool(await self.async_probe()))
+        except Exception as e:
+            return self._record_probe(False, str(e))
+    
+    def _cached_availability(self) -> Optional[bool]:
+        """Availability if it is known without probing, else None"""
+        with self._lock:
+            now = self.clock()
+            
+            if self.state == self.OPEN and now - self.opened_at < self.reset_timeout:
+                return False
+            
+            if self.last_checked is not None and now - self.last_checked < self.ttl:
+                return bool(self.available)
+        
+        return None
+    
+    def _record_probe(self, healthy: bool, error: str = None) -> bool:
+        if healthy:
+            self.record_success()
+        else:
+            self.record_failure(error or "health probe failed")
+        return healthy
+    
+    def before_request(self) -> None:
+        """Fail fast if the circuit is open; admit one trial once it may have recovered"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            
+            now = self.clock()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            
+            # A trial whose outcome was never recorded stops blocking after another reset period
+            if self.state == self.HALF_OPEN and (
+                not self._trial_in_flight or now - self._trial_started >= self.reset_timeout
+            ):
+                self._trial_in_flight = True
+                self._trial_started = now
+                return
+            
+            raise ServiceUnavailableError(f"{self.name} is unavailable (circuit {self.state})")
+    
+    def record_success(self) -> None:
+        """Record a successful request or probe"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"{self.name} recovered, closing circuit")
+            
+            self.state = self.CLOSED
+            self.available = True
+            self.consecutive_failures = 0
+            self.last_checked = self.clock()
+            self._trial_in_flight = False
+    
+    def record_failure(self, error: str = None) -> None:
+        """Record a failed request or probe"""
+        with self._lock:
+            now = self.clock()
+            self.available = False
+            self.consecutive_failures += 1
+            self.last_checked = now
+            self._trial_in_flight = False
+            if error:
+                self.last_error = error
+            
+            # Any failure while not closed restarts the open period
+            if self.state != self.CLOSED or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = now
+                logger.warning(f"{self.name} circuit opened after {self.consecutive_failures} failures")
+    
+    def status(self) -> Dict[str, Any]:
+        """Snapshot for health reporting"""
+        with self._lock:
+            now = self.clock()
+            return {
+                "available": self.available,
+                "circuit": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "checked_seconds_ago": None if self.last_checked is None else round(now - self.last_checked, 3),
+                "last_error": self.last_error
+            }
@@ -0,0 +1,306 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Optional, Set
+from database import SessionLocal, Document
+from services.document_service import document_service
+from services.embedding_service import embedding_service
+from services.vector_service import vector_service, make_chunk_id
+from services.metrics import UPLOAD_STAGE_DURATION
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class IngestionJob:
+    """Progress of a single document ingestion"""
+    
+    def __init__(self, chat_id: int, document_id: int, file_path: str, filename: str):
+        self.id = uuid.uuid4().hex
+        self.chat_id = chat_id
+        self.document_id = document_id
+        self.file_path = file_path
+        self.filename = filename
+        self.stage = "queued"  # queued, extracting, embedding, indexing, completed, failed, cancelled
+        self.total_characters = None
+        self.pages_extracted = 0
+        self.chunk_count = None
+        self.chunks_indexed = 0
+        self.chunks_embedded = 0
+        self.chunks_unchanged = 0
+        self.chunks_removed = 0
+        self.stage_seconds = {"extract": 0.0, "embed": 0.0, "index": 0.0}
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.cancelled = False
+        self.previous: Optional["IngestionJob"] = None  # superseded job for the same document
+        self.on_finished: List[Callable[[], None]] = []  # run by IngestionService.finish
+        self.finished = threading.Event()
+    
+    @property
+    def done(self) -> bool:
+        return self.stage in ("completed", "failed", "cancelled")
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "chat_id": self.chat_id,
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "stage": self.stage,
+            "total_characters": self.total_characters,
+            "pages_extracted": self.pages_extracted,
+            "chunk_count": self.chunk_count,
+            "chunks_indexed": self.chunks_indexed,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_unchanged": self.chunks_unchanged,
+            "chunks_removed": self.chunks_removed,
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+class IngestionService:
+    """Background extract -> chunk -> embed -> index pipeline for uploads"""
+    
+    def __init__(self, max_workers: int = None, max_tracked_jobs: int = None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.INGEST_WORKERS,
+            thread_name_prefix="ingest"
+        )
+        self.max_tracked_jobs = max_tracked_jobs or settings.INGEST_MAX_TRACKED_JOBS
+        self.batch_chunks = settings.INGEST_BATCH_CHUNKS
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._active: Dict[int, IngestionJob] = {}  # document id -> latest job
+        self._lock = threading.Lock()
+    
+    def submit(self, chat_id: int, document_id: int, file_path: str, filename: str) -> IngestionJob:
+        """Queue a saved document for ingestion"""
+        job = self.track(IngestionJob(chat_id, document_id, file_path, filename))
+        
+        self.executor.submit(self._run, job)
+        logger.info(f"Queued ingestion job {job.id} for {filename} in chat {chat_id}")
+        return job
+    
+    def track(self, job: IngestionJob) -> IngestionJob:
+        """Register a job so it can be looked up, cancelled and superseded"""
+        with self._lock:
+            # A re-upload supersedes any job still running for the same document
+            previous = self._active.get(job.document_id)
+            if previous is not None and not previous.done:
+                previous.cancelled = True
+                job.previous = previous
+            self._active[job.document_id] = job
+            
+            self._jobs[job.id] = job
+            self._evict_finished_jobs()
+        
+        return job
+    
+    def finish(self, job: IngestionJob) -> None:
+        """Mark a job finished and stop tracking it as the document's active job"""
+        job.finished_at = datetime.utcnow()
+        with self._lock:
+            if self._active.get(job.document_id) is job:
+                del self._active[job.document_id]
+            callbacks, job.on_finished = job.on_finished, []
+        
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Callback after ingestion job {job.id} failed: {str(e)}")
+        job.finished.set()
+    
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        """Get job by id"""
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def cancel(self, document_id: int, then: Callable[[], None] = None) -> None:
+        """Flag the running job for a document to stop, without waiting for it
+        
+        ``then`` runs once nothing writes the document's chunks any more: right
+        away when no job is running, otherwise on the job's thread when it stops.
+        """
+        with self._lock:
+            job = self._active.get(document_id)
+            if job is not None:
+                job.cancelled = True
+                if then is not None:
+                    job.on_finished.append(then)
+                return
+        
+        if then is not None:
+            then()
+    
+    def _evict_finished_jobs(self) -> None:
+        """Forget the oldest finished jobs once too many are tracked"""
+        excess = len(self._jobs) - self.max_tracked_jobs
+        if excess <= 0:
+            return
+        
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:excess]:
+            del self._jobs[job_id]
+    
+    def _run(self, job: IngestionJob) -> None:
+        """Run all ingestion stages for a job"""
+        if job.previous is not None:
+            # Let the superseded job stop before touching the same chunks
+            job.previous.finished.wait()
+            job.previous = None
+        
+        started = time.perf_counter()
+        try:
+            if job.cancelled:
+                job.stage = "cancelled"
+                return
+            
+            self._update_document(job, status="processing")
+            
+            job.total_characters = 0
+            job.chunk_count = 0
+            
+            # Chunks already stored for this file; unchanged ones are not embedded again
+            existing = vector_service.get_document_chunks(job.chat_id, job.filename)
+            seen = set()
+            
+            # Pages stream through the chunker and are embedded/indexed in batches,
+            # so memory stays bounded no matter how large the document is
+            batch = []
+            for chunk in document_service.chunk_pages(self.counted_pages(job), Path(job.file_path).suffix):
+                batch.append(chunk)
+                job.chunk_count += 1
+                if len(batch) >= self.batch_chunks:
+                    self._index_batch(job, batch, existing, seen)
+                    batch = []
+                    if job.cancelled:
+                        break
+                    job.stage = "extracting"
+            
+            if batch and not job.cancelled:
+                self._index_batch(job, batch, existing, seen)
+            
+            if job.cancelled:
+                job.stage = "cancelled"
+                logger.info(f"Ingestion job {job.id} cancelled for {job.filename}")
+                return
+            
+            # Chunks of the previous version that the new one no longer has
+            stale = [chunk_id for chunk_id in existing if chunk_id not in seen]
+            vector_service.delete_chunks(job.chat_id, stale)
+            job.chunks_removed = len(stale)
+            
+            job.stage = "completed"
+            self._update_document(job, status="completed", chunk_count=job.chunk_count)
+            self._record_timings(job, time.perf_counter() - started)
+            logger.info(
+                f"Ingestion job {job.id} completed: {job.chunk_count} chunks from {job.filename} "
+                f"({job.chunks_embedded} embedded, {job.chunks_unchanged} unchanged, {job.chunks_removed} removed)"
+            )
+        
+        except Exception as e:
+            job.stage = "failed"
+            job.error = str(e)
+            logger.error(f"Ingestion job {job.id} failed for {job.filename}: {str(e)}")
+            self._update_document(job, status="failed", error=job.error)
+        
+        finally:
+            self.finish(job)
+    
+    def counted_pages(self, job: IngestionJob):
+        """Page stream that records extraction progress on the job"""
+        job.stage = "extracting"
+        for page_num, text in document_service.iter_pages(job.file_path):
+            job.total_characters += len(text)
+            job.pages_extracted += 1
+            yield page_num, text
+    
+    @staticmethod
+    def plan_batch(job: IngestionJob, chunks: List[Dict[str, Any]], start_index: int, existing: Dict[str, Dict[str, Any]], seen: Set[str]) -> Dict[str, Any]:
+        """Ids and metadata for a batch of chunks, split into new chunks and ones that only moved"""
+        texts = [chunk["content"] for chunk in chunks]
+        ids = []
+        for text in texts:
+            ids.append(make_chunk_id(job.filename, text, seen))
+            seen.add(ids[-1])
+        
+        metadatas = vector_service.chunk_metadatas(job.filename, texts, start_index, chunks)
+        return {
+            "texts": texts,
+            "ids": ids,
+            "metadatas": metadatas,
+            "new": [i for i, chunk_id in enumerate(ids) if chunk_id not in existing],
+            "moved": [i for i, chunk_id in enumerate(ids) if chunk_id in existing and existing[chunk_id] != metadatas[i]]
+        }
+    
+    def _index_batch(self, job: IngestionJob, chunks: List[Dict[str, Any]], existing: Dict[str, Dict[str, Any]], seen: Set[str]) -> None:
+        """Embed and index the new chunks of a batch, refreshing metadata of moved ones"""
+        plan = self.plan_batch(job, chunks, job.chunks_indexed, existing, seen)
+        texts, ids, metadatas, new, moved = plan["texts"], plan["ids"], plan["metadatas"], plan["new"], plan["moved"]
+        
+        if new:
+            job.stage = "embedding"
+            started = time.perf_counter()
+            embeddings = embedding_service.get_embeddings([texts[i] for i in new])
+            job.stage_seconds["embed"] += time.perf_counter() - started
+            
+            job.stage = "indexing"
+            started = time.perf_counter()
+            vector_service.upsert_chunks(
+                job.chat_id,
+                [ids[i] for i in new],
+                [texts[i] for i in new],
+                embeddings,
+                [metadatas[i] for i in new]
+            )
+            job.stage_seconds["index"] += time.perf_counter() - started
+        
+        if moved:
+            # Same text at a new position: only page/offset metadata changes
+            job.stage = "indexing"
+            started = time.perf_counter()
+            vector_service.update_metadata(job.chat_id, [ids[i] for i in moved], [metadatas[i] for i in moved])
+            job.stage_seconds["index"] += time.perf_counter() - started
+        
+        job.chunks_indexed += len(chunks)
+        job.chunks_embedded += len(new)
+        job.chunks_unchanged += len(chunks) - len(new)
+    
+    @staticmethod
+    def _record_timings(job: IngestionJob, total: float) -> None:
+        """Observe a completed job's stage timings"""
+        # Extraction and chunking are interleaved with the batches, so they get the remainder
+        job.stage_seconds["extract"] = max(0.0, total - job.stage_seconds["embed"] - job.stage_seconds["index"])
+        for stage, seconds in job.stage_seconds.items():
+            UPLOAD_STAGE_DURATION.observe(seconds, stage=stage)
+        UPLOAD_STAGE_DURATION.observe(total, stage="ingest_total")
+    
+    def _update_document(self, job: IngestionJob, **fields) -> None:
+        """Persist job progress on the document row"""
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.id == job.document_id).first()
+            if document is None:
+                return
+            
+            for name, value in fields.items():
+                setattr(document, name, value)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to update document {job.document_id}: {str(e)}")
+        finally:
+            db.close()
+    
+    def shutdown(self) -> None:
+        """Stop accepting jobs and wait for running ones"""
+        self.executor.shutdown(wait=True)
+
+# Global instance
+ingestion_service = IngestionService()
@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Tuple
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Keep identifiers such as "XK-2231", "E42" or "v1.2.3" as single tokens
+_TOKEN = re.compile(r"\w(?:[\w\-\.]*\w)?", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens"""
+    return _TOKEN.findall(text.lower())
+
+class BM25Index:
+    """Incrementally maintained BM25 inverted index for one chat"""
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {doc_id: term frequency}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_terms: Dict[str, List[str]] = {}  # doc_id -> distinct terms, for cheap removal
+        self.total_length = 0
+    
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+    
+    def add(self, doc_id: str, text: str) -> Dict[str, int]:
+        """Index a document, replacing any previous version with the same id; returns its term frequencies"""
+        frequencies: Dict[str, int] = {}
+        for token in tokenize(text):
+            frequencies[token] = frequencies.get(token, 0) + 1
+        
+        self.add_terms(doc_id, frequencies)
+        return frequencies
+    
+    def add_terms(self, doc_id: str, frequencies: Dict[str, int]) -> None:
+        """Index a document from its term frequencies"""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+        
+        length = sum(frequencies.values())
+        self.doc_lengths[doc_id] = length
+        self.doc_terms[doc_id] = list(frequencies)
+        self.total_length += length
+    
+    def remove(self, doc_id: str) -> None:
+        """Drop a document from the index"""
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        
+        self.total_length -= length
+        for term in self.doc_terms.pop(doc_id, []):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+    
+    def term_frequencies(self, doc_id: str) -> Dict[str, int]:
+        """Term frequencies of an indexed document"""
+        return {term: self.postings[term][doc_id] for term in self.doc_terms.get(doc_id, [])}
+    
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """Top documents by BM25 score
+        
+        Safe to call while another thread adds or removes documents: postings
+        are copied before iterating and documents removed mid-search are skipped.
+        """
+        doc_count = len(self.doc_lengths)
+        if not doc_count:
+            return []
+        
+        avg_length = self.total_length / doc_count or 1.0
+        scores: Dict[str, float] = {}
+        
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            
+            docs = list(docs.items())
+            idf = math.log(1 + max(doc_count - len(docs) + 0.5, 0.0) / (len(docs) + 0.5))
+            for doc_id, frequency in docs:
+                length = self.doc_lengths.get(doc_id)
+                if length is None:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n_results]
+
+class KeywordService:
+    """Per-chat BM25 indexes persisted as append-only logs next to the vector store
+    
+    Each chat's log records added chunks (as term frequencies) and removed
+    chunk ids, so a batch only appends its own records. The log is rewritten
+    from the live index once most of its records are superseded. Writes take
+    the chat's lock; searches take none. Loaded indexes are kept in an LRU of
+    KEYWORD_INDEX_CACHE_CHATS chats and replayed from disk when evicted.
+    """
+    
+    def __init__(self, path: str = None, max_chats: int = None):
+        self.index_path = Path(path or settings.KEYWORD_INDEX_PATH)
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        self.max_chats = max_chats or settings.KEYWORD_INDEX_CACHE_CHATS
+        
+        self._indexes: "OrderedDict[int, BM25Index]" = OrderedDict()
+        self._log_records: Dict[int, int] = {}
+        self._chat_locks: Dict[int, threading.RLock] = {}
+        self._lock = threading.Lock()  # guards the dicts above, never held during I/O
+    
+    def _index_file(self, chat_id: int) -> Path:
+        return self.index_path / f"chat_{chat_id}.jsonl"
+    
+    def _chat_lock(self, chat_id: int) -> threading.RLock:
+        with self._lock:
+            return self._chat_locks.setdefault(chat_id, threading.RLock())
+    
+    def has_index(self, chat_id: int) -> bool:
+        """Check if a keyword index exists for chat session"""
+        return chat_id in self._indexes or self._index_file(chat_id).exists()
+    
+    def _get_index(self, chat_id: int) -> BM25Index:
+        """Loaded index for chat, replaying its log on first use"""
+        with self._lock:
+            index = self._indexes.get(chat_id)
+            if index is not None:
+                self._indexes.move_to_end(chat_id)
+                return index
+        
+        # Loading under the chat lock means no write is half-way through the log
+        with self._chat_lock(chat_id):
+            with self._lock:
+                index = self._indexes.get(chat_id)
+            if index is None:
+                index, records = self._load_index(chat_id)
+                with self._lock:
+                    self._indexes[chat_id] = index
+                    self._log_records[chat_id] = records
+                    self._indexes.move_to_end(chat_id)
+                    while len(self._indexes) > self.max_chats:
+                        evicted, _ = self._indexes.popitem(last=False)
+                        self._log_records.pop(evicted, None)
+            return index
+    
+    def _load_index(self, chat_id: int) -> Tuple[BM25Index, int]:
+        """Index and log record count for chat, read from disk"""
+        index = BM25Index()
+        index_file = self._index_file(chat_id)
+        if not index_file.exists():
+            return index, 0
+        
+        records = 0
+        torn = False
+        with open(index_file, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    torn = True  # interrupted write; later appends must not follow it
+                    break
+                if record["op"] == "add":
+                    index.add_terms(record["id"], record["terms"])
+                elif record["op"] == "del":
+                    index.remove(record["id"])
+                records += 1
+        
+        if torn:
+            records = self._compact(chat_id, index)
+        return index, records
+    
+    def _append_log(self, chat_id: int, records: List[Dict]) -> None:
+        if not records:
+            return
+        with open(self._index_file(chat_id), "a", encoding="utf-8") as file:
+            file.write("".join(json.dumps(record) + "\n" for record in records))
+        with self._lock:
+            if chat_id in self._log_records:  # not evicted meanwhile
+                self._log_records[chat_id] += len(records)
+    
+    def _maybe_compact(self, chat_id: int, index: BM25Index) -> None:
+        """Rewrite the log from the live index once most of its records are superseded"""
+        if self._log_records.get(chat_id, 0) <= 2 * len(index) + 1024:
+            return
+        records = self._compact(chat_id, index)
+        with self._lock:
+            self._log_records[chat_id] = records
+    
+    def _compact(self, chat_id: int, index: BM25Index) -> int:
+        """Write the index as a fresh log atomically, returning its record count"""
+        records = [
+            {"op": "add", "id": doc_id, "terms": index.term_frequencies(doc_id)}
+            for doc_id in list(index.doc_lengths)
+        ]
+        
+        index_file = self._index_file(chat_id)
+        tmp_file = index_file.with_suffix(".jsonl.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            file.write("".join(json.dumps(record) + "\n" for record in records))
+        os.replace(tmp_file, index_file)
+        return len(records)
+    
+    def add_documents(self, chat_id: int, ids: List[str], texts: List[str]) -> None:
+        """Index chunks for chat session"""
+        with self._chat_lock(chat_id):
+            index = self._get_index(chat_id)
+            records = [
+                {"op": "add", "id": doc_id, "terms": index.add(doc_id, text)}
+                for doc_id, text in zip(ids, texts)
+            ]
+            self._append_log(chat_id, records)
+            self._maybe_compact(chat_id, index)
+    
+    def remove_documents(self, chat_id: int, ids: List[str]) -> None:
+        """Remove chunks from chat session's index"""
+        with self._chat_lock(chat_id):
+            index = self._get_index(chat_id)
+            records = []
+            for doc_id in dict.fromkeys(ids):
+                if doc_id in index.doc_lengths:
+                    index.remove(doc_id)
+                    records.append({"op": "del", "id": doc_id})
+            self._append_log(chat_id, records)
+            self._maybe_compact(chat_id, index)
+    
+    def search(self, chat_id: int, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """Keyword search within chat session"""
+        return self._get_index(chat_id).search(query, n_results)
+    
+    def delete_index(self, chat_id: int) -> None:
+        """Delete keyword index for chat session"""
+        with self._chat_lock(chat_id):
+            with self._lock:
+                self._indexes.pop(chat_id, None)
+                self._log_records.pop(chat_id, None)
+            self._index_file(chat_id).unlink(missing_ok=True)
+
+# Global instance
+keyword_service = KeywordService()
@@ -0,0 +1,417 @@
+import os
+import json
+import shutil
+import logging
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import numpy as np
+from services.vector_store import VectorStore
+from services.vector_quantization import PLANES, normalize, plane_names, encode, scan, decode
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "chunks.jsonl"
+
+class ChatVectors:
+    """Normalized embedding rows in memory-mapped files, plus an append-only chunk log
+    
+    Row i of every vector file belongs to ``ids[i]``. New chunks are appended
+    (or written into a row freed by a delete) and recorded in ``chunks.jsonl``,
+    so nothing already stored is rewritten. The log is compacted once it is
+    mostly superseded records.
+    
+    Vectors are stored as float32, float16 or int8 with a per-vector scale.
+    Quantized chats search the compact rows and, when a float32 copy is kept,
+    rescore the best candidates from it. That copy is never mapped: only the
+    candidates' rows are read, so it costs disk but not resident memory. The
+    format is fixed when the first chunk is written and recorded in the log.
+    """
+    
+    def __init__(self, path: Path, quantization: str = "none", rescore: bool = True):
+        self.path = path
+        self.dim: Optional[int] = None
+        self.quantization = quantization
+        self.rescore = rescore
+        self.ids: List[Optional[str]] = []  # row -> chunk id, None for freed rows
+        self.rows: Dict[str, int] = {}
+        self.documents: Dict[str, str] = {}
+        self.metadatas: Dict[str, Dict[str, Any]] = {}
+        self.free: List[int] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.planes: Dict[str, np.memmap] = {}
+        self.log_records = 0
+        self.lock = threading.Lock()
+        self._load()
+    
+    @property
+    def log_file(self) -> Path:
+        return self.path / LOG_FILE
+    
+    @property
+    def plane_names(self) -> List[str]:
+        return plane_names(self.quantization, self.rescore)
+    
+    def _plane_file(self, name: str) -> Path:
+        return self.path / PLANES[name][0]
+    
+    def _row_bytes(self, name: str) -> int:
+        _, dtype, width = PLANES[name]
+        return np.dtype(dtype).itemsize * (width or self.dim)
+    
+    def _header(self) -> Dict[str, Any]:
+        return {"op": "dim", "dim": self.dim, "quantization": self.quantization, "rescore": self.rescore}
+    
+    def _load(self) -> None:
+        """Replay the chunk log and map the vectors it refers to"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        
+        if self.log_file.exists():
+            with open(self.log_file, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn last line from an interrupted write
+                    self._apply(record)
+                    self.log_records += 1
+        
+        row_count = len(self.ids)
+        if self.dim is not None:
+            # Rows written without a log record (interrupted write) are dropped
+            stored_rows = min(
+                self._plane_file(name).stat().st_size // self._row_bytes(name) if self._plane_file(name).exists() else 0
+                for name in self.plane_names
+            )
+            for row in range(stored_rows, row_count):
+                if self.ids[row] is not None:
+                    self._forget(self.ids[row])
+            row_count = min(row_count, stored_rows)
+            del self.ids[row_count:]
+            self.free = [row for row in self.free if row < row_count]
+            for name in self.plane_names:
+                with open(self._plane_file(name), "ab") as file:
+                    file.truncate(row_count * self._row_bytes(name))
+        
+        self.alive = np.array([chunk_id is not None for chunk_id in self.ids], dtype=bool)
+        self._map()
+    
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record["op"]
+        if op == "dim":
+            self.dim = record["dim"]
+            self.quantization = record.get("quantization", "none")
+            self.rescore = record.get("rescore", False)
+        elif op == "put":
+            chunk_id, row = record["id"], record["row"]
+            if chunk_id in self.rows and self.rows[chunk_id] != row:
+                self._forget(chunk_id)
+            while len(self.ids) <= row:
+                self.ids.append(None)
+                self.free.append(len(self.ids) - 1)
+            if self.ids[row] is not None and self.ids[row] != chunk_id:
+                self._forget(self.ids[row])
+            if row in self.free:
+                self.free.remove(row)
+            self.ids[row] = chunk_id
+            self.rows[chunk_id] = row
+            self.documents[chunk_id] = record["document"]
+            self.metadatas[chunk_id] = record["metadata"]
+        elif op == "meta":
+            if record["id"] in self.rows:
+                self.metadatas[record["id"]] = record["metadata"]
+        elif op == "del":
+            if record["id"] in self.rows:
+                self._forget(record["id"])
+    
+    def _forget(self, chunk_id: str) -> int:
+        """Drop a chunk from the in-memory index, freeing its row"""
+        row = self.rows.pop(chunk_id)
+        self.documents.pop(chunk_id, None)
+        self.metadatas.pop(chunk_id, None)
+        self.ids[row] = None
+        self.free.append(row)
+        return row
+    
+    @property
+    def keeps_full(self) -> bool:
+        """Whether a quantized chat has a float32 copy for rescoring"""
+        return self.quantization != "none" and "f32" in self.plane_names
+    
+    def _map(self) -> None:
+        """Map the scanned vector files read-only; writes go through regular file I/O"""
+        self.planes = {}
+        if self.dim is not None and self.ids:
+            for name in self.plane_names:
+                if name == "f32" and self.keeps_full:
+                    continue
+                _, dtype, width = PLANES[name]
+                self.planes[name] = np.memmap(self._plane_file(name), dtype=dtype, mode="r", shape=(len(self.ids), width or self.dim))
+    
+    def _append_log(self, records: List[Dict[str, Any]]) -> None:
+        with open(self.log_file, "a", encoding="utf-8") as file:
+            file.write("".join(json.dumps(record) + "\n" for record in records))
+        self.log_records += len(records)
+    
+    def add(self, ids: List[str], documents: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> None:
+        """Upsert chunks: known ids are overwritten in place, new ones take a free row or are appended"""
+        matrix = normalize(np.asarray(embeddings, dtype=np.float32))
+        records = []
+        
+        if self.dim is None:
+            self.dim = int(matrix.shape[1])
+            records.append(self._header())
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match the store's {self.dim}")
+        
+        # Repeated ids within one batch: the last one wins, as with Chroma
+        latest = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        
+        in_place = []  # (row, position in batch)
+        appended = []
+        free = list(self.free)
+        for chunk_id, i in latest.items():
+            if chunk_id in self.rows:
+                in_place.append((self.rows[chunk_id], i))
+            elif free:
+                in_place.append((free.pop(), i))
+            else:
+                appended.append(i)
+        
+        first_new_row = len(self.ids)
+        for name, values in encode(matrix, self.plane_names).items():
+            row_bytes = self._row_bytes(name)
+            if in_place:
+                with open(self._plane_file(name), "r+b") as file:
+                    for row, i in sorted(in_place):
+                        file.seek(row * row_bytes)
+                        file.write(values[i].tobytes())
+            if appended:
+                with open(self._plane_file(name), "ab") as file:
+                    file.write(values[appended].tobytes())
+        
+        placements = in_place + [(first_new_row + n, i) for n, i in enumerate(appended)]
+        for row, i in placements:
+            records.append({"op": "put", "row": row, "id": ids[i], "document": documents[i], "metadata": metadatas[i]})
+        self._append_log(records)
+        
+        for record in records[1:] if records[0]["op"] == "dim" else records:
+            self._apply(record)
+        
+        if appended:
+            self.alive = np.concatenate([self.alive, np.zeros(len(appended), dtype=bool)])
+            self._map()
+        for row, _ in placements:
+            self.alive[row] = True
+        
+        self._maybe_compact()
+    
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        records = [
+            {"op": "meta", "id": chunk_id, "metadata": metadata}
+            for chunk_id, metadata in zip(ids, metadatas)
+            if chunk_id in self.rows
+        ]
+        self._append_log(records)
+        for record in records:
+            self._apply(record)
+        self._maybe_compact()
+    
+    def remove(self, ids: List[str]) -> None:
+        records = [{"op": "del", "id": chunk_id} for chunk_id in dict.fromkeys(ids) if chunk_id in self.rows]
+        self._append_log(records)
+        for record in records:
+            self.alive[self.rows[record["id"]]] = False
+            self._apply(record)
+        self._maybe_compact()
+    
+    def search(self, embedding: List[float], n_results: int, include_embeddings: bool = False, rescore_factor: int = None) -> List[Dict[str, Any]]:
+        """Top-k by cosine similarity, exact unless the chat is quantized without rescoring"""
+        k = min(n_results, len(self.rows))
+        if k <= 0:
+            return []
+        
+        query = normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        scores = scan(self.planes, self.quantization, query)
+        if self.free:
+            scores[~self.alive] = -np.inf
+        
+        if self.keeps_full:
+            # Over-fetch on the compact rows, then rank the candidates at full precision
+            factor = rescore_factor or settings.VECTOR_RESCORE_FACTOR
+            candidates = top_rows(scores, min(len(scores), k * factor))
+            candidates = np.sort(candidates[self.alive[candidates]])  # freed rows hold stale vectors
+            full = self._read_full(candidates)
+            exact = full @ query
+            order = np.argsort(-exact, kind="stable")[:k]
+            top, similarities, embeddings = candidates[order], exact[order], full[order]
+        else:
+            top = top_rows(scores, k)
+            similarities = scores[top]
+            embeddings = decode(self.planes, self.quantization, top) if include_embeddings else None
+        
+        hits = []
+        for i, row in enumerate(top):
+            chunk_id = self.ids[row]
+            if chunk_id is None:
+                continue
+            hits.append({
+                "id": chunk_id,
+                "document": self.documents[chunk_id],
+                "metadata": self.metadatas[chunk_id],
+                "similarity": float(similarities[i])
+            })
+            if include_embeddings:
+                hits[-1]["embedding"] = embeddings[i].tolist()
+        return hits
+    
+    def _read_full(self, rows: np.ndarray) -> np.ndarray:
+        """float32 rows read with plain file I/O, so the copy never becomes resident"""
+        row_bytes = self._row_bytes("f32")
+        data = bytearray()
+        with open(self._plane_file("f32"), "rb") as file:
+            for row in rows:
+                file.seek(int(row) * row_bytes)
+                data += file.read(row_bytes)
+        return np.frombuffer(bytes(data), dtype=np.float32).reshape(len(rows), self.dim)
+    
+    def _maybe_compact(self) -> None:
+        """Rewrite the log from live chunks once most of its records are superseded"""
+        if self.log_records <= 2 * len(self.rows) + 1024:
+            return
+        
+        records = [self._header()] if self.dim is not None else []
+        records.extend(
+            {"op": "put", "row": row, "id": chunk_id, "document": self.documents[chunk_id], "metadata": self.metadatas[chunk_id]}
+            for row, chunk_id in enumerate(self.ids)
+            if chunk_id is not None
+        )
+        
+        tmp_file = self.log_file.with_suffix(".jsonl.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            file.write("".join(json.dumps(record) + "\n" for record in records))
+        os.replace(tmp_file, self.log_file)
+        self.log_records = len(records)
+    
+    def close(self) -> None:
+        self.planes = {}
+
+def top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+class MemmapVectorStore(VectorStore):
+    """In-process exact search over memory-mapped float32 matrices, one directory per chat
+    
+    For chats of up to tens of thousands of chunks a brute-force dot product
+    beats an ANN index on latency, with no server, no SQLite metadata and
+    near-instant startup. Similarity is cosine similarity.
+    
+    New chats store vectors in the VECTOR_QUANTIZATION format; existing chats
+    keep the format they were created with.
+    """
+    
+    def __init__(self, path: str = None, quantization: str = None, rescore: bool = None):
+        self.root = Path(path or settings.VECTOR_STORE_PATH)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quantization = quantization or settings.VECTOR_QUANTIZATION
+        self.rescore = settings.VECTOR_RESCORE if rescore is None else rescore
+        plane_names(self.quantization, self.rescore)  # fail fast on an unknown mode
+        
+        # Chats on disk are listed at startup and loaded on first use
+        self._chats: Dict[int, Optional[ChatVectors]] = {}
+        self._lock = threading.Lock()
+        for entry in self.root.iterdir():
+            if entry.is_dir() and entry.name.startswith("chat_"):
+                try:
+                    self._chats[int(entry.name[len("chat_"):])] = None
+                except ValueError:
+                    continue
+        
+        logger.info(f"Registered {len(self._chats)} memmap vector stores")
+    
+    def _chat_path(self, chat_id: int) -> Path:
+        return self.root / f"chat_{chat_id}"
+    
+    def _get(self, chat_id: int) -> ChatVectors:
+        """Loaded vectors for chat, reading them from disk on first use"""
+        chat = self._chats.get(chat_id)
+        if chat is not None:
+            return chat
+        
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                if chat_id not in self._chats and not self._chat_path(chat_id).exists():
+                    raise ValueError(f"Vector store for chat {chat_id} does not exist")
+                chat = self._chats[chat_id] = ChatVectors(self._chat_path(chat_id), self.quantization, self.rescore)
+            return chat
+    
+    def list_chats(self) -> List[int]:
+        return list(self._chats)
+    
+    def create(self, chat_id: int) -> None:
+        with self._lock:
+            if self._chats.get(chat_id) is None:
+                self._chats[chat_id] = ChatVectors(self._chat_path(chat_id), self.quantization, self.rescore)
+        logger.info(f"Created memmap vector store for chat {chat_id}")
+    
+    def exists(self, chat_id: int) -> bool:
+        return chat_id in self._chats
+    
+    def add(self, chat_id: int, ids: List[str], documents: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> None:
+        if not ids:
+            return
+        chat = self._get(chat_id)
+        with chat.lock:
+            chat.add(ids, documents, embeddings, metadatas)
+    
+    def update_metadata(self, chat_id: int, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        chat = self._get(chat_id)
+        with chat.lock:
+            chat.update_metadata(ids, metadatas)
+    
+    def get(self, chat_id: int, ids: List[str] = None, where: Dict[str, Any] = None, include_documents: bool = True) -> Dict[str, List]:
+        chat = self._get(chat_id)
+        with chat.lock:
+            candidates = [chunk_id for chunk_id in ids if chunk_id in chat.rows] if ids is not None else list(chat.rows)
+            if where:
+                candidates = [
+                    chunk_id for chunk_id in candidates
+                    if all(chat.metadatas[chunk_id].get(key) == value for key, value in where.items())
+                ]
+            return {
+                "ids": candidates,
+                "documents": [chat.documents[chunk_id] for chunk_id in candidates] if include_documents else None,
+                "metadatas": [chat.metadatas[chunk_id] for chunk_id in candidates]
+            }
+    
+    def search(self, chat_id: int, embedding: List[float], n_results: int, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        chat = self._get(chat_id)
+        with chat.lock:
+            return chat.search(embedding, n_results, include_embeddings)
+    
+    def remove(self, chat_id: int, ids: List[str]) -> None:
+        chat = self._get(chat_id)
+        with chat.lock:
+            chat.remove(ids)
+    
+    def delete(self, chat_id: int) -> None:
+        with self._lock:
+            chat = self._chats.pop(chat_id, None)
+        if chat is not None:
+            with chat.lock:
+                chat.close()
+        
+        shutil.rmtree(self._chat_path(chat_id), ignore_errors=True)
+        logger.info(f"Deleted memmap vector store for chat {chat_id}")
+    
+    def count(self, chat_id: int) -> int:
+        if chat_id not in self._chats:
+            return 0
+        return len(self._get(chat_id).rows)
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import List, Tuple, Optional
+from database import AsyncSessionLocal, Message
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class MessageWriter:
+    """Group commit for chat messages
+    
+    Concurrent requests hand their rows to a single writer task, which inserts
+    everything that queued up while the previous commit ran in one transaction.
+    SQLite allows one writer at a time, so this turns many small contended
+    commits into a few larger ones. Callers still wait for their own commit.
+    """
+    
+    def __init__(self, enabled: bool = None, max_batch: int = None):
+        self.enabled = settings.DB_BATCH_WRITES if enabled is None else enabled
+        self.max_batch = max(1, max_batch or settings.DB_WRITE_BATCH_SIZE)
+        self._pending: List[Tuple[List[Message], asyncio.Future]] = []
+        self._task: Optional[asyncio.Task] = None
+    
+    async def save(self, messages: List[Message]) -> None:
+        """Insert messages, returning once they are committed"""
+        if not self.enabled:
+            await self._commit(messages)
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((messages, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+        
+        # A cancelled caller doesn't pull its rows out of a batch in progress
+        await asyncio.shield(future)
+    
+    async def _flush(self) -> None:
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            
+            try:
+                await self._commit([message for messages, _ in batch for message in messages])
+            except Exception as e:
+                # Retry one request at a time so a bad row only fails its own request
+                logger.warning(f"Batched message insert of {len(batch)} requests failed, retrying individually: {str(e)}")
+                for messages, future in batch:
+                    try:
+                        await self._commit(messages)
+                        future.set_result(None)
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            
+            for _, future in batch:
+                future.set_result(None)
+    
+    @staticmethod
+    async def _commit(messages: List[Message]) -> None:
+        async with AsyncSessionLocal() as db:
+            db.add_all(messages)
+            await db.commit()
+    
+    async def aclose(self) -> None:
+        """Wait for queued messages to be written"""
+        if self._task is not None:
+            await self._task
+
+# Global instance
+message_writer = MessageWriter()
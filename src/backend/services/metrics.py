@@ -0,0 +1,244 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator
+
+# Latency buckets in seconds, from cache lookups up to slow generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    """Named metric with one series per label combination"""
+    
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, value in series:
+                lines.extend(self._render_series(key, value))
+        return lines
+    
+    def _render_series(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    
+    kind = "counter"
+    
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), callback: Callable[[], Dict[Tuple[str, ...], float]] = None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+    
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+    
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            values = self.callback()
+            with self._lock:
+                self._series = dict(values)
+        return super().render()
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+    
+    def _render_series(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            bucket_labels = _format_labels(self.labels, key, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class RequestTimings:
+    """Where one request's time went, for the debug breakdown"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.details: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def note(self, section: str, **values) -> None:
+        with self._lock:
+            self.details.setdefault(section, {}).update(values)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+                **self.details
+            }
+
+# Shared by reference with the tasks and threads a request fans out to
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+class MetricsRegistry:
+    """Process-wide metrics in the Prometheus text exposition format"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+    
+    def gauge(self, name: str, documentation: str, labels: Tuple[str, ...] = (), callback: Callable[[], Dict[Tuple[str, ...], float]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, callback))
+    
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+    
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+    
+    @contextmanager
+    def timed(self, histogram: Histogram, stage: str = None, **labels) -> Iterator[None]:
+        """Observe how long the block takes, adding it to the request breakdown as `stage`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            histogram.observe(elapsed, **labels)
+            if stage:
+                record_stage(stage, elapsed)
+
+def start_request_timings() -> RequestTimings:
+    """Collect a timing breakdown for the current request"""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+def request_timings() -> Optional[RequestTimings]:
+    return _request_timings.get()
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Add time to the current request's breakdown, if one is being collected"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+def note_request(section: str, **values) -> None:
+    """Attach details (e.g. token counts) to the current request's breakdown"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.note(section, **values)
+
+# Global instance
+metrics = MetricsRegistry()
+
+NODE_DURATION = metrics.histogram(
+    "chatdocs_workflow_node_duration_seconds", "Time spent in each chat workflow node", ("node",)
+)
+EMBEDDING_BATCH_DURATION = metrics.histogram(
+    "chatdocs_embedding_batch_duration_seconds", "Embedding API latency per batch"
+)
+EMBEDDING_BATCH_SIZE = metrics.histogram(
+    "chatdocs_embedding_batch_size", "Texts per embedding API batch", buckets=SIZE_BUCKETS
+)
+VECTOR_QUERY_DURATION = metrics.histogram(
+    "chatdocs_vector_query_duration_seconds", "Vector store similarity query latency"
+)
+OLLAMA_PROMPT_TOKENS = metrics.histogram(
+    "chatdocs_ollama_prompt_tokens", "Prompt tokens evaluated per generation", buckets=TOKEN_BUCKETS
+)
+OLLAMA_EVAL_TOKENS = metrics.histogram(
+    "chatdocs_ollama_eval_tokens", "Tokens generated per generation", buckets=TOKEN_BUCKETS
+)
+OLLAMA_TOKENS_PER_SECOND = metrics.histogram(
+    "chatdocs_ollama_tokens_per_second", "Generation speed reported by Ollama", buckets=RATE_BUCKETS
+)
+OLLAMA_GENERATION_DURATION = metrics.histogram(
+    "chatdocs_ollama_generation_duration_seconds", "Wall time of Ollama chat calls", ("mode",)
+)
+UPLOAD_STAGE_DURATION = metrics.histogram(
+    "chatdocs_upload_stage_duration_seconds", "Time spent in each upload and ingestion stage", ("stage",)
+)
+CACHE_LOOKUPS = metrics.counter(
+    "chatdocs_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result")
+)
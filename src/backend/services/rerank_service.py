@@ -0,0 +1,140 @@
+import math
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Callable, Tuple
+from services.keyword_service import tokenize
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Words that say nothing about which passage answers the question
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "if", "in", "is", "it", "my", "of", "on", "or", "the", "this", "to",
+    "what", "when", "where", "which", "who", "why", "with", "you", "your"
+}
+
+class BaseReranker(ABC):
+    """Abstract base class for rerankers"""
+    
+    @abstractmethod
+    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Return the best ``top_k`` documents in order"""
+        pass
+
+class PassthroughReranker(BaseReranker):
+    """Keep retrieval order"""
+    
+    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        return documents[:top_k]
+
+class MMRReranker(BaseReranker):
+    """CPU-only reranker: lexical overlap relevance with maximal marginal relevance diversity
+    
+    Relevance mixes query term coverage with the retriever's own score. Redundancy
+    between candidates uses cosine similarity of their stored embeddings when
+    available and token Jaccard similarity otherwise.
+    """
+    
+    def __init__(self, diversity_lambda: float = None):
+        self.diversity_lambda = settings.MMR_LAMBDA if diversity_lambda is None else diversity_lambda
+    
+    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        if len(documents) <= 1:
+            return documents[:top_k]
+        
+        query_terms = set(tokenize(query)) - STOPWORDS
+        doc_terms = [set(tokenize(doc["content"])) for doc in documents]
+        relevance = self._relevance(query_terms, doc_terms, documents)
+        
+        selected: List[int] = []
+        remaining = list(range(len(documents)))
+        # Highest similarity of each candidate to anything already selected
+        max_similarity = [0.0] * len(documents)
+        
+        while remaining and len(selected) < top_k:
+            best = max(
+                remaining,
+                key=lambda i: self.diversity_lambda * relevance[i] - (1 - self.diversity_lambda) * max_similarity[i]
+            )
+            selected.append(best)
+            remaining.remove(best)
+            
+            for i in remaining:
+                similarity = self._similarity(documents[i], documents[best], doc_terms[i], doc_terms[best])
+                max_similarity[i] = max(max_similarity[i], similarity)
+        
+        return [documents[i] for i in selected]
+    
+    def _relevance(self, query_terms: set, doc_terms: List[set], documents: List[Dict[str, Any]]) -> List[float]:
+        """Blend query term coverage with the normalized retrieval score"""
+        lexical = [
+            len(query_terms & terms) / len(query_terms) if query_terms else 0.0
+            for terms in doc_terms
+        ]
+        
+        retrieval = [self._retrieval_score(doc) for doc in documents]
+        known = [score for score in retrieval if score is not None]
+        if not known:
+            return lexical
+        
+        low, high = min(known), max(known)
+        span = (high - low) or 1.0
+        return [
+            0.5 * lex + 0.5 * ((score - low) / span if score is not None else 0.0)
+            for lex, score in zip(lexical, retrieval)
+        ]
+    
+    @staticmethod
+    def _retrieval_score(doc: Dict[str, Any]):
+        if doc.get("score") is not None:
+            return doc["score"]
+        return doc.get("similarity")
+    
+    @staticmethod
+    def _similarity(a: Dict[str, Any], b: Dict[str, Any], a_terms: set, b_terms: set) -> float:
+        a_embedding = a.get("embedding")
+        b_embedding = b.get("embedding")
+        if a_embedding is not None and b_embedding is not None:
+            dot = sum(x * y for x, y in zip(a_embedding, b_embedding))
+            norm = math.sqrt(sum(x * x for x in a_embedding)) * math.sqrt(sum(y * y for y in b_embedding))
+            return dot / norm if norm else 0.0
+        
+        union = a_terms | b_terms
+        return len(a_terms & b_terms) / len(union) if union else 0.0
+
+class CrossEncoderReranker(BaseReranker):
+    """Rerank with a pluggable cross-encoder
+    
+    ``score_pairs`` receives (query, passage) pairs and returns one relevance
+    score per pair, e.g. a sentence-transformers CrossEncoder's ``predict``.
+    """
+    
+    def __init__(self, score_pairs: Callable[[List[Tuple[str, str]]], List[float]]):
+        self.score_pairs = score_pairs
+    
+    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        if not documents:
+            return []
+        
+        scores = self.score_pairs([(query, doc["content"]) for doc in documents])
+        ranked = sorted(zip(scores, range(len(documents))), key=lambda item: item[0], reverse=True)
+        return [{**documents[i], "rerank_score": float(score)} for score, i in ranked[:top_k]]
+
+_rerankers: Dict[str, BaseReranker] = {
+    "none": PassthroughReranker(),
+    "mmr": MMRReranker()
+}
+
+def register_reranker(name: str, reranker: BaseReranker) -> None:
+    """Make a reranker selectable through the RERANKER setting"""
+    _rerankers[name] = reranker
+
+def get_reranker(name: str = None) -> BaseReranker:
+    """Get reranker by name, falling back to retrieval order"""
+    name = name or settings.RERANKER
+    reranker = _rerankers.get(name)
+    if reranker is None:
+        logger.warning(f"Unknown reranker '{name}', keeping retrieval order")
+        return _rerankers["none"]
+    return reranker
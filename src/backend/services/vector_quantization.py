@@ -0,0 +1,69 @@
+from typing import List, Dict, Tuple
+import numpy as np
+
+QUANTIZATIONS = ("none", "float16", "int8")
+
+# Row files a chat's vectors are split into: name -> (file, dtype, width or None for the embedding dimension)
+PLANES: Dict[str, Tuple[str, type, int]] = {
+    "f32": ("vectors.f32", np.float32, None),
+    "f16": ("vectors.f16", np.float16, None),
+    "i8": ("vectors.i8", np.int8, None),
+    "scale": ("scales.f32", np.float32, 1)
+}
+
+# Quantized rows are widened to float32 this many at a time while scanning
+SCAN_BLOCK_ROWS = 1024
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so a dot product is cosine similarity"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def plane_names(quantization: str, keep_full: bool) -> List[str]:
+    """Row files used by a quantization mode; the float32 copy is only kept for rescoring"""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown vector quantization: {quantization}")
+    
+    if quantization == "none":
+        return ["f32"]
+    names = ["f16"] if quantization == "float16" else ["i8", "scale"]
+    return names + ["f32"] if keep_full else names
+
+def encode(matrix: np.ndarray, names: List[str]) -> Dict[str, np.ndarray]:
+    """Rows of every plane for a batch of normalized float32 vectors"""
+    encoded = {}
+    if "f32" in names:
+        encoded["f32"] = matrix
+    if "f16" in names:
+        encoded["f16"] = matrix.astype(np.float16)
+    if "i8" in names:
+        # Symmetric scalar quantization with one scale per vector
+        scales = np.abs(matrix).max(axis=1, keepdims=True) / 127
+        scales[scales == 0] = 1.0
+        encoded["i8"] = np.rint(matrix / scales).astype(np.int8)
+        encoded["scale"] = scales.astype(np.float32)
+    return encoded
+
+def scan(planes: Dict[str, np.ndarray], quantization: str, query: np.ndarray) -> np.ndarray:
+    """Similarity of the query to every row, computed on the compact representation"""
+    if quantization == "none":
+        return planes["f32"] @ query
+    
+    compact = planes["f16"] if quantization == "float16" else planes["i8"]
+    scores = np.empty(len(compact), dtype=np.float32)
+    for start in range(0, len(compact), SCAN_BLOCK_ROWS):
+        end = start + SCAN_BLOCK_ROWS
+        scores[start:end] = compact[start:end].astype(np.float32) @ query
+    
+    if quantization == "int8":
+        scores *= planes["scale"][:, 0]
+    return scores
+
+def decode(planes: Dict[str, np.ndarray], quantization: str, rows: np.ndarray) -> np.ndarray:
+    """Approximate float32 vectors of rows from the compact representation"""
+    if quantization == "none":
+        return np.asarray(planes["f32"][rows])
+    if quantization == "float16":
+        return planes["f16"][rows].astype(np.float32)
+    return planes["i8"][rows].astype(np.float32) * planes["scale"][rows]
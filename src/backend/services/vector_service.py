@@ -1,131 +1,331 @@
-import os
+import hashlib
 import logging
-from pathlib import Path
-from typing import List, Dict, Any
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+import itertools
+import threading
+from typing import List, Dict, Any, Set
 from services.embedding_service import embedding_service
+from services.keyword_service import keyword_service
+from services.vector_store import VectorStore, create_vector_store
+from services.metrics import metrics, VECTOR_QUERY_DURATION
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Chunker metadata kept alongside each chunk
+CHUNK_METADATA_KEYS = ("page", "page_end", "heading_path", "start_char", "end_char")
+
+def make_chunk_id(filename: str, content: str, taken: Set[str] = None) -> str:
+    """Stable chunk id from file name and content; repeats of a chunk get a suffix"""
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    chunk_id = base_id = f"{filename}_{digest}"
+    
+    occurrence = 1
+    while taken and chunk_id in taken:
+        chunk_id = f"{base_id}_{occurrence}"
+        occurrence += 1
+    return chunk_id
+
 class VectorService:
-    """ChromaDB vector store operations"""
+    """Chunk storage and retrieval on top of the configured vector store backend"""
     
-    def __init__(self):
-        self.chroma_path = Path(settings.CHROMA_DB_PATH)
-        self.chroma_path.mkdir(parents=True, exist_ok=True)
+    def __init__(self, store: VectorStore = None):
+        self.store = store or create_vector_store()
         
-        self.client = chromadb.PersistentClient(
-            path=str(self.chroma_path),
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
-    
-    def get_collection_name(self, chat_id: int) -> str:
-        """Get collection name for chat session"""
-        return f"chat_{chat_id}"
+        # Chunk counts by chat id, so lookups skip backend count calls
+        self._counts: Dict[int, int] = {}
+        self._count_versions: Dict[int, int] = {}
+        self._versions = itertools.count(1)  # unique across chats and changes, 0 is reserved for "no documents"
+        self._lock = threading.Lock()
     
     def create_collection(self, chat_id: int) -> None:
         """Create collection for chat session"""
-        collection_name = self.get_collection_name(chat_id)
-        
         try:
-            self.client.create_collection(
-                name=collection_name,
-                metadata={"chat_id": chat_id}
-            )
-            logger.info(f"Created collection: {collection_name}")
+            self.store.create(chat_id)
         except Exception as e:
-            if "already exists" not in str(e):
-                logger.error(f"Failed to create collection {collection_name}: {str(e)}")
-                raise
+            logger.error(f"Failed to create collection for chat {chat_id}: {str(e)}")
+            raise
     
-    def get_collection(self, chat_id: int):
-        """Get collection for chat session"""
-        collection_name = self.get_collection_name(chat_id)
-        return self.client.get_collection(name=collection_name)
+    def add_documents(self, chat_id: int, chunks: List[str], filename: str, embeddings: List[List[float]] = None, start_index: int = 0, chunk_metadata: List[Dict[str, Any]] = None) -> None:
+        """Add or replace document chunks in vector store"""
+        # Get embeddings for chunks unless already computed
+        if embeddings is None:
+            embeddings = embedding_service.get_embeddings(chunks)
+        
+        # Content-derived IDs, so unchanged chunks keep their id across re-uploads
+        taken = set()
+        ids = []
+        for chunk in chunks:
+            ids.append(make_chunk_id(filename, chunk, taken))
+            taken.add(ids[-1])
+        
+        metadatas = self.chunk_metadatas(filename, chunks, start_index, chunk_metadata)
+        self.upsert_chunks(chat_id, ids, chunks, embeddings, metadatas)
     
-    def add_documents(self, chat_id: int, chunks: List[str], filename: str) -> None:
-        """Add document chunks to vector store"""
+    def upsert_chunks(self, chat_id: int, ids: List[str], chunks: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> None:
+        """Write chunks with precomputed ids, embeddings and metadata"""
         try:
-            collection = self.get_collection(chat_id)
-            
-            # Get embeddings for chunks
-            embeddings = embedding_service.get_embeddings(chunks)
+            self.store.add(chat_id, ids, chunks, embeddings, metadatas)
             
-            # Generate IDs and metadata
-            ids = [f"{filename}_{i}" for i in range(len(chunks))]
-            metadatas = [
-                {
-                    "filename": filename,
-                    "chunk_index": i,
-                    "chunk_text": chunk[:100]  # First 100 chars for preview
-                }
-                for i, chunk in enumerate(chunks)
-            ]
+            self._invalidate_count(chat_id)
             
-            collection.add(
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            logger.info(f"Added {len(chunks)} chunks from {filename} to collection")
+            # Keep the keyword index in step with the collection
+            keyword_service.add_documents(chat_id, ids, chunks)
             
+            logger.info(f"Added {len(chunks)} chunks from {metadatas[0]['filename'] if metadatas else ''} to collection")
+        
         except Exception as e:
             logger.error(f"Failed to add documents to vector store: {str(e)}")
             raise Exception(f"Vector store operation failed: {str(e)}")
     
-    def search_similar(self, chat_id: int, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    @staticmethod
+    def chunk_metadatas(filename: str, chunks: List[str], start_index: int = 0, chunk_metadata: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Stored metadata for a run of chunks"""
+        metadatas = [
+            {
+                "filename": filename,
+                "chunk_index": i,
+                "chunk_text": chunk[:100]  # First 100 chars for preview
+            }
+            for i, chunk in enumerate(chunks, start=start_index)
+        ]
+        
+        # Page, heading path and offsets from the chunker; Chroma rejects None values
+        if chunk_metadata is not None:
+            for metadata, extra in zip(metadatas, chunk_metadata):
+                metadata.update({key: extra[key] for key in CHUNK_METADATA_KEYS if extra.get(key) is not None})
+        
+        return metadatas
+    
+    def update_metadata(self, chat_id: int, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace metadata of stored chunks without re-embedding them"""
+        try:
+            self.store.update_metadata(chat_id, ids, metadatas)
+        
+        except Exception as e:
+            logger.error(f"Failed to update chunk metadata: {str(e)}")
+            raise Exception(f"Vector store operation failed: {str(e)}")
+    
+    def get_document_chunks(self, chat_id: int, filename: str) -> Dict[str, Dict[str, Any]]:
+        """Metadata of every stored chunk of a file, by chunk id"""
+        if not self.collection_exists(chat_id):
+            return {}
+        
+        try:
+            results = self.store.get(chat_id, where={"filename": filename}, include_documents=False)
+            return dict(zip(results["ids"], results["metadatas"]))
+        
+        except Exception as e:
+            logger.error(f"Failed to list chunks for {filename}: {str(e)}")
+            raise Exception(f"Vector store operation failed: {str(e)}")
+    
+    def delete_chunks(self, chat_id: int, ids: List[str]) -> None:
+        """Remove chunks from the collection and keyword index"""
+        if not ids:
+            return
+        
+        try:
+            self.store.remove(chat_id, ids)
+            self._invalidate_count(chat_id)
+            keyword_service.remove_documents(chat_id, ids)
+            logger.info(f"Deleted {len(ids)} chunks from collection for chat {chat_id}")
+        
+        except Exception as e:
+            logger.error(f"Failed to delete chunks: {str(e)}")
+            raise Exception(f"Vector store operation failed: {str(e)}")
+    
+    def delete_document(self, chat_id: int, filename: str) -> int:
+        """Remove every chunk of a file, returning how many were removed"""
+        ids = list(self.get_document_chunks(chat_id, filename))
+        self.delete_chunks(chat_id, ids)
+        return len(ids)
+    
+    def search_similar(self, chat_id: int, query: str, n_results: int = 5, include_embeddings: bool = False, query_embedding: List[float] = None) -> List[Dict[str, Any]]:
         """Search for similar documents"""
         try:
-            collection = self.get_collection(chat_id)
-            
-            # Get query embedding
-            query_embedding = embedding_service.get_single_embedding(query)
+            # Get query embedding unless the caller already has it
+            if query_embedding is None:
+                query_embedding = embedding_service.get_single_embedding(query)
             
             # Search similar documents
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            with metrics.timed(VECTOR_QUERY_DURATION, stage="vector_query"):
+                hits = self.store.search(chat_id, query_embedding, n_results, include_embeddings)
             
             # Format results
             formatted_results = []
-            if results["documents"][0]:
-                for i in range(len(results["documents"][0])):
-                    formatted_results.append({
-                        "content": results["documents"][0][i],
-                        "filename": results["metadatas"][0][i]["filename"],
-                        "chunk_index": results["metadatas"][0][i]["chunk_index"],
-                        "similarity": 1 - results["distances"][0][i]  # Convert distance to similarity
-                    })
+            for hit in hits:
+                formatted_results.append({
+                    "id": hit["id"],
+                    "content": hit["document"],
+                    "filename": hit["metadata"]["filename"],
+                    "chunk_index": hit["metadata"]["chunk_index"],
+                    "page": hit["metadata"].get("page"),
+                    "heading_path": hit["metadata"].get("heading_path", ""),
+                    "similarity": hit["similarity"]
+                })
+                if include_embeddings:
+                    formatted_results[-1]["embedding"] = hit["embedding"]
             
             return formatted_results
-            
+        
         except Exception as e:
             logger.error(f"Failed to search vector store: {str(e)}")
             return []
     
+    def search(self, chat_id: int, query: str, n_results: int = 5, mode: str = None, include_embeddings: bool = False, query_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """Search chat documents using vector, keyword or hybrid retrieval"""
+        mode = mode or settings.RETRIEVAL_MODE
+        
+        if mode == "vector":
+            return self.search_similar(chat_id, query, n_results, include_embeddings, query_embedding)
+        
+        self._ensure_keyword_index(chat_id)
+        
+        if mode == "keyword":
+            return self.search_keyword(chat_id, query, n_results)
+        
+        if mode != "hybrid":
+            raise ValueError(f"Unknown search mode: {mode}")
+        
+        # Over-fetch from both retrievers so fusion has something to work with
+        candidates = n_results * 2
+        vector_results = self.search_similar(chat_id, query, candidates, include_embeddings, query_embedding)
+        keyword_hits = keyword_service.search(chat_id, query, candidates)
+        
+        return self._fuse_results(chat_id, vector_results, keyword_hits, n_results)
+    
+    def search_keyword(self, chat_id: int, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """Search chat documents by BM25 keyword score"""
+        try:
+            hits = keyword_service.search(chat_id, query, n_results)
+            documents = self._get_by_ids(chat_id, [doc_id for doc_id, _ in hits])
+            
+            results = []
+            for doc_id, score in hits:
+                if doc_id in documents:
+                    results.append({**documents[doc_id], "similarity": None, "score": score})
+            return results
+        
+        except Exception as e:
+            logger.error(f"Failed to search keyword index: {str(e)}")
+            return []
+    
+    def _fuse_results(self, chat_id: int, vector_results: List[Dict[str, Any]], keyword_hits: List, n_results: int) -> List[Dict[str, Any]]:
+        """Combine ranked lists with reciprocal rank fusion"""
+        k = settings.RRF_K
+        scores: Dict[str, float] = {}
+        documents: Dict[str, Dict[str, Any]] = {}
+        
+        for rank, doc in enumerate(vector_results):
+            scores[doc["id"]] = scores.get(doc["id"], 0.0) + 1 / (k + rank + 1)
+            documents[doc["id"]] = doc
+        
+        for rank, (doc_id, _) in enumerate(keyword_hits):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank + 1)
+        
+        ranked_ids = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        
+        # Keyword-only hits still need their content
+        missing = [doc_id for doc_id in ranked_ids if doc_id not in documents]
+        if missing:
+            try:
+                for doc_id, doc in self._get_by_ids(chat_id, missing).items():
+                    documents[doc_id] = {**doc, "similarity": None}
+            except Exception as e:
+                logger.error(f"Failed to fetch keyword results: {str(e)}")
+        
+        return [
+            {**documents[doc_id], "score": scores[doc_id]}
+            for doc_id in ranked_ids
+            if doc_id in documents
+        ]
+    
+    def _get_by_ids(self, chat_id: int, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch chunks by id"""
+        if not ids:
+            return {}
+        
+        results = self.store.get(chat_id, ids=ids)
+        
+        return {
+            doc_id: {
+                "id": doc_id,
+                "content": content,
+                "filename": metadata["filename"],
+                "chunk_index": metadata["chunk_index"],
+                "page": metadata.get("page"),
+                "heading_path": metadata.get("heading_path", "")
+            }
+            for doc_id, content, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+        }
+    
+    def _ensure_keyword_index(self, chat_id: int) -> None:
+        """Build the keyword index from stored chunks for chats that predate it"""
+        if keyword_service.has_index(chat_id) or self.count_documents(chat_id) == 0:
+            return
+        
+        try:
+            results = self.store.get(chat_id)
+            keyword_service.add_documents(chat_id, results["ids"], results["documents"])
+            logger.info(f"Built keyword index for chat {chat_id} from {len(results['ids'])} chunks")
+        except Exception as e:
+            logger.error(f"Failed to build keyword index for chat {chat_id}: {str(e)}")
+    
     def delete_collection(self, chat_id: int) -> None:
         """Delete collection for chat session"""
+        self._invalidate_count(chat_id)
+        
+        keyword_service.delete_index(chat_id)
+        
         try:
-            collection_name = self.get_collection_name(chat_id)
-            self.client.delete_collection(name=collection_name)
-            logger.info(f"Deleted collection: {collection_name}")
+            self.store.delete(chat_id)
         except Exception as e:
             logger.error(f"Failed to delete collection: {str(e)}")
     
     def collection_exists(self, chat_id: int) -> bool:
         """Check if collection exists for chat session"""
+        return self.store.exists(chat_id)
+    
+    def count_documents(self, chat_id: int) -> int:
+        """Number of chunks stored for chat session, cached until the collection changes"""
+        count = self._counts.get(chat_id)
+        if count is not None:
+            return count
+        
+        if not self.store.exists(chat_id):
+            return 0
+        
+        version = self._count_versions.get(chat_id)
         try:
-            collection_name = self.get_collection_name(chat_id)
-            collections = self.client.list_collections()
-            return any(col.name == collection_name for col in collections)
-        except:
-            return False
+            count = self.store.count(chat_id)
+        except Exception as e:
+            logger.error(f"Failed to count documents for chat {chat_id}: {str(e)}")
+            return 0
+        
+        # Don't cache a count that a concurrent write has already made stale
+        with self._lock:
+            if self._count_versions.get(chat_id) == version:
+                self._counts[chat_id] = count
+        return count
+    
+    def collection_version(self, chat_id: int) -> int:
+        """Fingerprint of the chat's chunks: changes whenever they change, 0 when there are none
+        
+        Served from memory; the backend is only asked for a count once after each change.
+        """
+        if self.count_documents(chat_id) == 0:
+            return 0
+        
+        version = self._count_versions.get(chat_id)
+        if version is None:
+            with self._lock:
+                version = self._count_versions.setdefault(chat_id, next(self._versions))
+        return version
+    
+    def _invalidate_count(self, chat_id: int) -> None:
+        """Forget the cached chunk count after the collection changes"""
+        with self._lock:
+            self._counts.pop(chat_id, None)
+            self._count_versions[chat_id] = next(self._versions)
 
 # Global instance
 vector_service = VectorService()
@@ -0,0 +1,90 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Callable
+from config import settings
+
+class VectorStore(ABC):
+    """Abstract base class for per-chat vector storage engines
+    
+    Each chat owns one collection of chunks: an id, the chunk text, its
+    metadata and its embedding. Writes are upserts keyed by chunk id.
+    """
+    
+    @abstractmethod
+    def list_chats(self) -> List[int]:
+        """Chat ids that have a collection"""
+        pass
+    
+    @abstractmethod
+    def create(self, chat_id: int) -> None:
+        """Create the chat's collection if it does not exist"""
+        pass
+    
+    @abstractmethod
+    def exists(self, chat_id: int) -> bool:
+        """Check if the chat has a collection"""
+        pass
+    
+    @abstractmethod
+    def add(self, chat_id: int, ids: List[str], documents: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> None:
+        """Insert chunks, replacing any with the same id"""
+        pass
+    
+    @abstractmethod
+    def update_metadata(self, chat_id: int, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace metadata of stored chunks"""
+        pass
+    
+    @abstractmethod
+    def get(self, chat_id: int, ids: List[str] = None, where: Dict[str, Any] = None, include_documents: bool = True) -> Dict[str, List]:
+        """Stored chunks by id and/or metadata equality, as {"ids", "documents", "metadatas"}"""
+        pass
+    
+    @abstractmethod
+    def search(self, chat_id: int, embedding: List[float], n_results: int, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Nearest chunks, best first, as dicts with id, document, metadata, similarity (and embedding)"""
+        pass
+    
+    @abstractmethod
+    def remove(self, chat_id: int, ids: List[str]) -> None:
+        """Remove chunks by id"""
+        pass
+    
+    @abstractmethod
+    def delete(self, chat_id: int) -> None:
+        """Drop the chat's collection"""
+        pass
+    
+    @abstractmethod
+    def count(self, chat_id: int) -> int:
+        """Number of chunks stored for the chat"""
+        pass
+
+def _chroma() -> VectorStore:
+    from services.chroma_store import ChromaVectorStore, SharedChromaVectorStore
+    if settings.CHROMA_TENANCY == "shared":
+        return SharedChromaVectorStore()
+    if settings.CHROMA_TENANCY != "collection":
+        raise ValueError(f"Unknown Chroma tenancy: {settings.CHROMA_TENANCY}")
+    return ChromaVectorStore()
+
+def _memmap() -> VectorStore:
+    from services.memmap_store import MemmapVectorStore
+    return MemmapVectorStore()
+
+# Imported lazily so a backend's dependencies only load when it is selected
+_backends: Dict[str, Callable[[], VectorStore]] = {
+    "chroma": _chroma,
+    "memmap": _memmap
+}
+
+def register_vector_store(name: str, factory: Callable[[], VectorStore]) -> None:
+    """Make a vector store selectable through the VECTOR_BACKEND setting"""
+    _backends[name] = factory
+
+def create_vector_store(name: str = None) -> VectorStore:
+    """Instantiate a vector store backend by name"""
+    name = name or settings.VECTOR_BACKEND
+    factory = _backends.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown vector backend: {name}")
+    return factory()
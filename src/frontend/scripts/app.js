@@ -57,6 +57,34 @@ const api = {
         }
     },
 
+    // List endpoints return one page and put the id to continue from in X-Next-Cursor
+    async requestAllPages(endpoint, olderFirst = false) {
+        try {
+            let items = [];
+            let cursor = null;
+
+            do {
+                const separator = endpoint.includes('?') ? '&' : '?';
+                const url = cursor ? `${endpoint}${separator}cursor=${cursor}` : endpoint;
+                const response = await fetch(`${API_BASE}${url}`);
+
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+
+                // Message pages go back in time, so each one is older than the last
+                const page = await response.json();
+                items = olderFirst ? page.concat(items) : items.concat(page);
+                cursor = response.headers.get('X-Next-Cursor');
+            } while (cursor);
+
+            return items;
+        } catch (error) {
+            console.error('API Error:', error);
+            throw error;
+        }
+    },
+
     async healthCheck() {
         try {
             const response = await fetch(`${API_BASE}/docs`);
@@ -67,7 +95,7 @@ const api = {
     },
 
     async getChats() {
-        return await this.request('GET', '/chats');
+        return await this.requestAllPages('/chats');
     },
 
     async createChat(name) {
@@ -79,7 +107,7 @@ const api = {
     },
 
     async getMessages(chatId) {
-        return await this.request('GET', `/chat/${chatId}/messages`);
+        return await this.requestAllPages(`/chat/${chatId}/messages`, true);
     },
 
     async sendMessage(chatId, message) {
@@ -93,7 +121,7 @@ const api = {
     },
 
     async getFiles(chatId) {
-        return await this.request('GET', `/chat/${chatId}/documents`);
+        return await this.requestAllPages(`/chat/${chatId}/documents`);
     }
 };
 
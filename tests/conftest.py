@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Settings are read at import time, so point every data directory at a scratch
+# location before any backend module is imported
+_data_dir = Path(tempfile.mkdtemp(prefix="chatdocs_tests_"))
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_data_dir}/database.db",
+    "UPLOAD_DIR": str(_data_dir / "uploads"),
+    "LOG_DIR": str(_data_dir / "logs"),
+    "CHROMA_DB_PATH": str(_data_dir / "vector_stores"),
+    "VECTOR_STORE_PATH": str(_data_dir / "vector_memmap"),
+    "KEYWORD_INDEX_PATH": str(_data_dir / "keyword_indexes"),
+    "EMBEDDING_CACHE_PATH": str(_data_dir / "embedding_cache.db"),
+    "VECTOR_BACKEND": "memmap"
+})
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "backend"))
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from services.answer_cache import AnswerCache
+from agents.nodes import cache_node
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def _cache(**kwargs):
+    options = {"threshold": 0.9, "ttl": 60, "max_entries": 10, "max_per_chat": 5, "clock": FakeClock()}
+    options.update(kwargs)
+    return AnswerCache(**options)
+
+def test_near_identical_question_hits():
+    cache = _cache()
+    cache.store(1, "What is the refund policy?", [1.0, 0.0], "v1", "30 days", ["a.txt"])
+    
+    hit = cache.lookup(1, [0.99, 0.05], "v1")
+    
+    assert hit["response"] == "30 days"
+    assert hit["sources"] == ["a.txt"]
+    assert hit["similarity"] > 0.9
+    assert cache.lookup(1, [0.0, 1.0], "v1") is None
+    assert cache.lookup(2, [1.0, 0.0], "v1") is None
+
+def test_fingerprint_and_variant_must_match():
+    cache = _cache()
+    cache.store(1, "q", [1.0, 0.0], "v1", "answer", [], variant="hybrid|mistral|")
+    
+    assert cache.lookup(1, [1.0, 0.0], "v1", "vector|mistral|") is None
+    assert cache.lookup(1, [1.0, 0.0], "v2", "hybrid|mistral|") is None
+    # Entries for an old fingerprint are dropped on lookup
+    assert cache.stats()["entries"] == 0
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = _cache(clock=clock)
+    cache.store(1, "q", [1.0, 0.0], "v1", "answer", [])
+    
+    clock.now = 59
+    assert cache.lookup(1, [1.0, 0.0], "v1") is not None
+    clock.now = 61
+    assert cache.lookup(1, [1.0, 0.0], "v1") is None
+
+def test_least_recently_used_entries_are_evicted():
+    cache = _cache(max_entries=2, max_per_chat=2)
+    cache.store(1, "first", [1.0, 0.0], "v1", "a1", [])
+    cache.store(1, "second", [0.0, 1.0], "v1", "a2", [])
+    cache.lookup(1, [1.0, 0.0], "v1")  # first is now the most recently used
+    cache.store(1, "third", [-1.0, 0.0], "v1", "a3", [])
+    
+    assert cache.lookup(1, [1.0, 0.0], "v1")["response"] == "a1"
+    assert cache.lookup(1, [0.0, 1.0], "v1") is None
+    
+    cache.store(2, "other chat", [1.0, 0.0], "v1", "b1", [])
+    
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(1, [-1.0, 0.0], "v1") is None
+
+def test_invalidate_drops_chat_entries():
+    cache = _cache()
+    cache.store(1, "q", [1.0, 0.0], "v1", "answer", [])
+    cache.store(2, "q", [1.0, 0.0], "v1", "answer", [])
+    
+    cache.invalidate(1)
+    
+    assert cache.lookup(1, [1.0, 0.0], "v1") is None
+    assert cache.lookup(2, [1.0, 0.0], "v1") is not None
+
+@pytest.fixture
+def chat_cache(monkeypatch):
+    """Module-level cache wired to a chat with documents and a fixed question embedding"""
+    monkeypatch.setattr(cache_node, "answer_cache", _cache())
+    async def embed(question):
+        return [1.0, 0.0]
+    
+    monkeypatch.setattr(cache_node.embedding_service, "aget_single_embedding", embed)
+    monkeypatch.setattr(cache_node.vector_service, "collection_version", lambda chat_id: 7)
+    return cache_node.answer_cache
+
+def _turn(question, history):
+    return {"chat_id": 1, "question": question, "search_mode": "hybrid", "chat_history": history, "conversation_summary": ""}
+
+def _check(state):
+    return asyncio.run(cache_node.acheck_answer_cache(state))
+
+def _answer(state, update, response):
+    """Store the turn's answer and return the history the next turn loads"""
+    cache_node.store_answer_cache({**state, **update, "response": response, "sources": ["a.txt"], "context": "ctx"})
+    return state["chat_history"] + [{"role": "user", "content": state["question"]}, {"role": "assistant", "content": response}]
+
+def test_repeated_question_hits_in_a_later_turn(chat_cache):
+    first = _turn("What is the refund policy?", [])
+    update = _check(first)
+    assert update["cache_hit"] is None
+    history = _answer(first, update, "30 days")
+    
+    second = _turn("What is the refund policy?", history)
+    update = _check(second)
+    
+    assert update["cache_hit"]["cached_question"] == "What is the refund policy?"
+    assert update["response"] == "30 days"
+    assert cache_node.route_after_cache({**second, **update}) == "save_message"
+
+def test_follow_ups_bypass_the_cache(chat_cache):
+    first = _turn("Explain that in more detail", [])
+    history = _answer(first, _check(first), "Opening answer")
+    
+    follow_up = _turn("Explain that in more detail", history)
+    update = _check(follow_up)
+    cache_node.store_answer_cache({**follow_up, **update, "response": "Follow-up answer"})
+    
+    assert update == {"cache_hit": None}
+    assert chat_cache.stats()["entries"] == 1
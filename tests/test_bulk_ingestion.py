@@ -0,0 +1,90 @@
+import threading
+import pytest
+from database import SessionLocal, ChatSession, Document, create_tables
+from services.bulk_ingestion import BulkIngestionService
+from services.ingestion_service import IngestionService, IngestionJob, ingestion_service
+from services.embedding_service import embedding_service
+from services.vector_service import vector_service
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    """Saves text files as documents of a new chat, embedding every chunk as the same vector"""
+    create_tables()
+    monkeypatch.setattr(embedding_service, "get_embeddings", lambda texts: [[1.0, 0.0, 0.0]] * len(texts))
+    
+    def upload(texts):
+        db = SessionLocal()
+        try:
+            chat = ChatSession(name="bulk")
+            db.add(chat)
+            db.commit()
+            vector_service.create_collection(chat.id)
+            documents = []
+            for i, text in enumerate(texts):
+                path = tmp_path / f"chat{chat.id}_{i}.txt"
+                path.write_text(text, encoding="utf-8")
+                document = Document(chat_session_id=chat.id, filename=path.name, file_path=str(path), file_type="txt", status="pending")
+                db.add(document)
+                db.commit()
+                documents.append((document.id, str(path), path.name))
+            return chat.id, documents
+        finally:
+            db.close()
+    
+    return upload
+
+@pytest.fixture
+def service():
+    service = BulkIngestionService(queue_depth=2)
+    yield service
+    service.shutdown()
+
+def _pipeline_threads():
+    return [thread.name for thread in threading.enumerate() if thread.name.startswith("bulk-")]
+
+def test_bulk_requests_share_one_pipeline(uploads, service):
+    requests = [uploads([f"file {i} of request {n}" for i in range(3)]) for n in range(4)]
+    
+    bulks = [service.submit(chat_id, documents) for chat_id, documents in requests]
+    threads = _pipeline_threads()
+    for bulk in bulks:
+        assert bulk.finished.wait(10)
+    
+    assert sorted(threads) == ["bulk-embed", "bulk-index", "bulk-parse"]
+    for bulk, (chat_id, _) in zip(bulks, requests):
+        summary = bulk.to_dict()
+        assert summary["status"] == "completed"
+        assert summary["files_completed"] == 3
+        assert vector_service.count_documents(chat_id) == 3
+    
+    service.shutdown()
+    assert _pipeline_threads() == []
+
+def test_cancel_flags_the_job_without_waiting():
+    service = IngestionService(max_workers=1)
+    job = service.track(IngestionJob(1, 42, "unused.txt", "unused.txt"))
+    removed = []
+    
+    service.cancel(42, then=lambda: removed.append(42))
+    
+    # The running job drops the document's data once it stops
+    assert job.cancelled and removed == []
+    service.finish(job)
+    assert removed == [42]
+    
+    # With nothing running the data goes straight away
+    service.cancel(42, then=lambda: removed.append("idle"))
+    assert removed == [42, "idle"]
+
+def test_cancelled_bulk_file_is_skipped(uploads, service):
+    chat_id, documents = uploads(["kept file", "cancelled file"])
+    
+    # Hold the pipeline on a superseded job so the cancel lands before parsing
+    blocker = ingestion_service.track(IngestionJob(chat_id, documents[0][0], documents[0][1], documents[0][2]))
+    bulk = service.submit(chat_id, documents)
+    ingestion_service.cancel(documents[1][0])
+    ingestion_service.finish(blocker)
+    
+    assert bulk.finished.wait(10)
+    assert [file["stage"] for file in bulk.to_dict()["files"]] == ["completed", "cancelled"]
+    assert vector_service.count_documents(chat_id) == 1
@@ -0,0 +1,65 @@
+import pytest
+from services.chroma_store import SharedChromaVectorStore
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedChromaVectorStore(str(tmp_path), shards=2)
+
+def _add(store, chat_id, ids, embeddings=None):
+    embeddings = embeddings or [[1.0, float(i), 0.5] for i in range(len(ids))]
+    store.add(chat_id, ids, [f"chat {chat_id} {chunk_id}" for chunk_id in ids], embeddings, [{"filename": "doc.txt", "chunk_index": i} for i in range(len(ids))])
+
+def test_chats_sharing_a_collection_stay_isolated(store):
+    # Chats 1 and 3 land in the same shard and reuse the same chunk ids
+    _add(store, 1, ["doc.txt_0", "doc.txt_1"])
+    _add(store, 3, ["doc.txt_0"])
+    
+    assert store.get_collection(1) is store.get_collection(3)
+    assert [hit["document"] for hit in store.search(1, [1.0, 0.0, 0.5], 5)] == ["chat 1 doc.txt_0", "chat 1 doc.txt_1"]
+    assert [hit["document"] for hit in store.search(3, [1.0, 0.0, 0.5], 5)] == ["chat 3 doc.txt_0"]
+
+def test_prefix_and_chat_id_are_hidden(store):
+    _add(store, 1, ["doc.txt_0"])
+    
+    hit = store.search(1, [1.0, 0.0, 0.5], 1)[0]
+    results = store.get(1, ids=["doc.txt_0"])
+    
+    assert hit["id"] == "doc.txt_0"
+    assert "chat_id" not in hit["metadata"]
+    assert results["ids"] == ["doc.txt_0"]
+    assert results["metadatas"] == [{"filename": "doc.txt", "chunk_index": 0}]
+    assert store.get_collection(1).get(include=[])["ids"] == ["1:doc.txt_0"]
+
+def test_where_filters_are_combined_with_the_chat(store):
+    store.add(1, ["a", "b"], ["one", "two"], [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], [{"filename": "a.txt", "chunk_index": 0}, {"filename": "b.txt", "chunk_index": 0}])
+    store.add(3, ["a"], ["three"], [[1.0, 0.0, 0.0]], [{"filename": "a.txt", "chunk_index": 0}])
+    
+    assert store.get(1, where={"filename": "a.txt"}, include_documents=False)["ids"] == ["a"]
+    assert store.get(3, where={"filename": "a.txt"})["documents"] == ["three"]
+
+def test_count_follows_upserts_and_removals(store):
+    assert store.count(1) == 0
+    
+    _add(store, 1, ["a", "b"])
+    _add(store, 1, ["b", "c"])
+    _add(store, 3, ["a"])
+    
+    assert store.count(1) == 3
+    assert store.count(3) == 1
+    
+    store.remove(1, ["a", "missing"])
+    
+    assert store.count(1) == 2
+    # A fresh store scans the shared collection once
+    assert SharedChromaVectorStore(str(store.chroma_path), shards=2).count(1) == 2
+
+def test_delete_removes_only_that_chat(store):
+    _add(store, 1, ["a"])
+    _add(store, 3, ["a"])
+    
+    store.delete(1)
+    
+    assert 1 not in store._counts and 1 not in store._chat_locks
+    assert store.count(1) == 0
+    assert store.get(1)["ids"] == []
+    assert store.get(3)["ids"] == ["a"]
@@ -0,0 +1,82 @@
+from services.chunking import TokenChunker, PageChunker, MarkdownChunker, count_tokens, get_chunker
+
+def _text(paragraphs=12, sentences=6):
+    return "\n\n".join(
+        " ".join(f"Paragraph {p} sentence {s} talks about topic {p * s}." for s in range(sentences))
+        for p in range(paragraphs)
+    )
+
+def _joined(pages):
+    return "\n".join(text for _, text in pages)
+
+def test_offsets_point_at_chunk_content():
+    text = _text()
+    
+    chunks = TokenChunker(chunk_tokens=40, overlap_tokens=8).chunk_text(text)
+    
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert text[chunk["start_char"]:chunk["end_char"]] == chunk["content"]
+        assert count_tokens(chunk["content"]) <= 40
+
+def test_chunks_cover_text_in_order():
+    text = _text()
+    
+    chunks = TokenChunker(chunk_tokens=40, overlap_tokens=8).chunk_text(text)
+    
+    assert chunks[0]["start_char"] == 0
+    assert chunks[-1]["end_char"] == len(text.rstrip())
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous["start_char"] < chunk["start_char"] <= previous["end_char"] + 2
+
+def test_streamed_segments_match_single_string():
+    text = _text()
+    chunker = TokenChunker(chunk_tokens=40, overlap_tokens=8)
+    pieces = [(None, text[i:i + 37]) for i in range(0, len(text), 37)]
+    
+    assert list(chunker.chunk(pieces)) == chunker.chunk_text(text)
+
+def test_paragraph_cuts_get_no_overlap():
+    text = "\n\n".join(" ".join(["word"] * 30) for _ in range(4))
+    
+    chunks = TokenChunker(chunk_tokens=40, overlap_tokens=8).chunk_text(text)
+    
+    assert [count_tokens(chunk["content"]) for chunk in chunks] == [30, 30, 30, 30]
+
+def test_page_numbers_and_offsets_across_pages():
+    pages = [(1, _text(3)), (2, _text(3)), (3, _text(3))]
+    joined = _joined(pages)
+    second_page_start = len(pages[0][1]) + 1
+    
+    chunks = list(PageChunker(chunk_tokens=60, overlap_tokens=0).chunk(pages))
+    
+    for chunk in chunks:
+        assert joined[chunk["start_char"]:chunk["end_char"]] == chunk["content"]
+        assert chunk["page"] <= chunk["page_end"]
+    assert chunks[0]["page"] == 1 and chunks[-1]["page_end"] == 3
+    first_on_two = next(chunk for chunk in chunks if chunk["page"] == 2)
+    assert first_on_two["start_char"] >= second_page_start
+
+def test_markdown_heading_paths_skip_code_fences():
+    text = "# Guide\n\nIntro text that explains the guide in detail.\n\n## Install\n\nRun the installer.\n\n## Usage\n\n```\n# not a heading\n```\n"
+    
+    chunks = MarkdownChunker(chunk_tokens=16, overlap_tokens=0).chunk_text(text)
+    
+    assert [chunk["heading_path"] for chunk in chunks] == ["Guide", "Guide > Install", "Guide > Usage"]
+    for chunk in chunks:
+        assert text[chunk["start_char"]:chunk["end_char"]] == chunk["content"]
+    assert "# not a heading" in chunks[-1]["content"]
+
+def test_markdown_packs_small_sections_under_common_path():
+    text = "# Guide\n\n## A\n\nshort\n\n## B\n\nshort\n"
+    
+    chunks = MarkdownChunker(chunk_tokens=200, overlap_tokens=0).chunk_text(text)
+    
+    assert len(chunks) == 1
+    assert chunks[0]["heading_path"] == "Guide"
+
+def test_auto_strategy_by_file_type():
+    assert isinstance(get_chunker("auto", ".PDF"), PageChunker)
+    assert isinstance(get_chunker("auto", ".md"), MarkdownChunker)
+    assert type(get_chunker("auto", ".txt")) is TokenChunker
+    assert type(get_chunker("missing")) is TokenChunker
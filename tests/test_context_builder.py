@@ -0,0 +1,78 @@
+from services.context_builder import ContextBuilder
+
+def _doc(filename, chunk_index, content):
+    return {"filename": filename, "chunk_index": chunk_index, "content": content}
+
+def test_join_overlapping_removes_shared_seam():
+    first = "The quick brown fox jumps over the lazy dog"
+    second = "jumps over the lazy dog and runs into the forest"
+    
+    assert ContextBuilder._join_overlapping(first, second) == "The quick brown fox jumps over the lazy dog and runs into the forest"
+
+def test_join_overlapping_ignores_short_coincidences():
+    assert ContextBuilder._join_overlapping("ends with the", "the start") == "ends with the\nthe start"
+
+def test_merge_chunks_joins_adjacent_chunks_in_rank_order():
+    docs = [
+        _doc("b.txt", 0, "Other file"),
+        _doc("a.txt", 4, "chunk four"),
+        _doc("a.txt", 3, "chunk three"),
+        _doc("a.txt", 7, "chunk seven")
+    ]
+    
+    blocks = ContextBuilder().merge_chunks(docs)
+    
+    assert [(block["filename"], block["content"]) for block in blocks] == [
+        ("b.txt", "Other file"),
+        ("a.txt", "chunk three\nchunk four"),
+        ("a.txt", "chunk seven")
+    ]
+    assert blocks[1]["chunk_index"] == 3 and blocks[1]["last_index"] == 4
+
+def test_merge_chunks_drops_covered_duplicates():
+    docs = [
+        _doc("a.txt", 0, "full paragraph about refunds and returns"),
+        _doc("copy.txt", 0, "about refunds")
+    ]
+    
+    blocks = ContextBuilder().merge_chunks(docs)
+    
+    assert [block["filename"] for block in blocks] == ["a.txt"]
+
+def test_build_context_stays_within_budget():
+    builder = ContextBuilder()
+    builder.chars_per_token = 4
+    docs = [_doc("a.txt", 0, "x" * 40), _doc("b.txt", 0, "y" * 40), _doc("c.txt", 0, "z" * 40)]
+    
+    context, used = builder.build_context(docs, budget_tokens=25)
+    
+    assert [block["filename"] for block in used] == ["a.txt", "b.txt"]
+    assert context == "x" * 40 + "\n\n" + "y" * 40
+
+def test_build_context_truncates_oversized_best_block():
+    builder = ContextBuilder()
+    builder.chars_per_token = 4
+    
+    context, used = builder.build_context([_doc("a.txt", 0, "x" * 100)], budget_tokens=5)
+    
+    assert context == "x" * 20
+    assert len(used) == 1
+
+def test_prompt_budget_uses_model_windows():
+    builder = ContextBuilder()
+    builder.default_window = 4096
+    builder.response_reserve = 512
+    builder.model_windows = ContextBuilder._parse_model_windows("mistral:8192, llama3:16384, broken")
+    
+    assert builder.model_windows == {"mistral": 8192, "llama3": 16384}
+    assert builder.prompt_budget("mistral:latest") == 8192 - 512
+    assert builder.prompt_budget("unknown") == 4096 - 512
+
+def test_trim_history_keeps_most_recent():
+    builder = ContextBuilder()
+    builder.chars_per_token = 4
+    history = [{"role": "user", "content": "x" * 40}, {"role": "assistant", "content": "y" * 40}, {"role": "user", "content": "z" * 40}]
+    
+    kept = builder.trim_history(history, budget_tokens=30)
+    
+    assert [message["content"][0] for message in kept] == ["y", "z"]
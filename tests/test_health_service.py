@@ -0,0 +1,155 @@
+import asyncio
+import pytest
+from services.health_service import ServiceHealth, ServiceUnavailableError
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class Probe:
+    """Counts calls and answers with a settable result"""
+    
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.calls = 0
+    
+    def __call__(self):
+        self.calls += 1
+        if isinstance(self.healthy, Exception):
+            raise self.healthy
+        return self.healthy
+
+def _health(probe, clock, **kwargs):
+    options = {"ttl": 30, "failure_threshold": 3, "reset_timeout": 10, "clock": clock}
+    options.update(kwargs)
+    return ServiceHealth("backend", probe=probe, **options)
+
+def test_availability_is_cached_for_the_ttl():
+    clock, probe = FakeClock(), Probe()
+    health = _health(probe, clock)
+    
+    assert health.is_available()
+    clock.now = 29
+    assert health.is_available()
+    assert probe.calls == 1
+    
+    probe.healthy = False
+    clock.now = 31
+    assert not health.is_available()
+    assert probe.calls == 2
+
+def test_request_outcomes_refresh_the_cache():
+    clock, probe = FakeClock(), Probe()
+    health = _health(probe, clock)
+    
+    health.record_success()
+    clock.now = 20
+    assert health.is_available()
+    
+    health.record_failure("timeout")
+    assert not health.is_available()
+    assert probe.calls == 0
+    assert health.status()["last_error"] == "timeout"
+
+def test_probe_errors_count_as_failures():
+    clock, probe = FakeClock(), Probe(ConnectionError("refused"))
+    health = _health(probe, clock)
+    
+    assert not health.is_available()
+    assert health.status()["consecutive_failures"] == 1
+    assert health.status()["last_error"] == "refused"
+
+def test_circuit_opens_after_consecutive_failures():
+    clock, probe = FakeClock(), Probe()
+    health = _health(probe, clock)
+    
+    health.record_failure()
+    health.record_failure()
+    health.before_request()
+    assert health.state == ServiceHealth.CLOSED
+    
+    health.record_failure()
+    
+    assert health.state == ServiceHealth.OPEN
+    with pytest.raises(ServiceUnavailableError):
+        health.before_request()
+    # Open circuits report unavailable without probing, even past the TTL
+    clock.now = 9
+    health.ttl = 0
+    assert not health.is_available()
+    assert probe.calls == 0
+
+def test_success_resets_the_failure_count():
+    health = _health(Probe(), FakeClock())
+    
+    health.record_failure()
+    health.record_failure()
+    health.record_success()
+    health.record_failure()
+    
+    assert health.state == ServiceHealth.CLOSED
+
+def test_half_open_admits_one_trial_then_closes():
+    clock = FakeClock()
+    health = _health(Probe(), clock, failure_threshold=1)
+    health.record_failure()
+    
+    clock.now = 10
+    health.before_request()
+    
+    assert health.state == ServiceHealth.HALF_OPEN
+    with pytest.raises(ServiceUnavailableError):
+        health.before_request()
+    
+    health.record_success()
+    
+    assert health.state == ServiceHealth.CLOSED
+    health.before_request()
+
+def test_failed_trial_restarts_the_open_period():
+    clock = FakeClock()
+    health = _health(Probe(), clock, failure_threshold=1)
+    health.record_failure()
+    
+    clock.now = 10
+    health.before_request()
+    health.record_failure()
+    
+    assert health.state == ServiceHealth.OPEN
+    clock.now = 19
+    with pytest.raises(ServiceUnavailableError):
+        health.before_request()
+    clock.now = 20
+    health.before_request()
+    assert health.state == ServiceHealth.HALF_OPEN
+
+def test_unfinished_trial_stops_blocking_after_a_reset_period():
+    clock = FakeClock()
+    health = _health(Probe(), clock, failure_threshold=1)
+    health.record_failure()
+    clock.now = 10
+    health.before_request()  # outcome never recorded
+    
+    clock.now = 19
+    with pytest.raises(ServiceUnavailableError):
+        health.before_request()
+    clock.now = 20
+    health.before_request()
+
+def test_async_probe_is_used_by_async_callers():
+    clock, probe = FakeClock(), Probe()
+    async_calls = []
+    
+    async def async_probe():
+        async_calls.append(clock.now)
+        return False
+    
+    health = ServiceHealth("backend", probe=probe, async_probe=async_probe, ttl=30, failure_threshold=3, reset_timeout=10, clock=clock)
+    
+    assert not asyncio.run(health.ais_available())
+    assert not asyncio.run(health.ais_available())
+    assert async_calls == [0.0]
+    assert probe.calls == 0
@@ -0,0 +1,93 @@
+import json
+from services.keyword_service import BM25Index, KeywordService, tokenize
+
+def test_tokenize_keeps_identifiers():
+    assert tokenize("Error XK-2231 in v1.2.3, see E42.") == ["error", "xk-2231", "in", "v1.2.3", "see", "e42"]
+
+def test_bm25_ranks_matching_documents():
+    index = BM25Index()
+    index.add("a", "the cat sat on the mat")
+    index.add("b", "dogs chase cats")
+    index.add("c", "cat cat cat")
+    
+    ranked = index.search("cat", n_results=5)
+    
+    assert [doc_id for doc_id, _ in ranked] == ["c", "a"]
+    assert ranked[0][1] > ranked[1][1] > 0
+
+def test_bm25_add_replaces_and_remove_drops_postings():
+    index = BM25Index()
+    index.add("a", "alpha beta")
+    index.add("a", "gamma")
+    
+    assert index.search("alpha") == []
+    assert [doc_id for doc_id, _ in index.search("gamma")] == ["a"]
+    assert index.total_length == 1
+    
+    index.remove("a")
+    
+    assert len(index) == 0
+    assert index.postings == {}
+    assert index.total_length == 0
+
+def test_index_is_replayed_from_log(tmp_path):
+    service = KeywordService(str(tmp_path))
+    service.add_documents(1, ["a", "b"], ["invoice XK-2231 overdue", "shipping address"])
+    service.remove_documents(1, ["b"])
+    
+    reloaded = KeywordService(str(tmp_path))
+    
+    assert reloaded.has_index(1)
+    assert [doc_id for doc_id, _ in reloaded.search(1, "xk-2231")] == ["a"]
+    assert reloaded.search(1, "shipping") == []
+
+def test_batches_append_to_log(tmp_path):
+    service = KeywordService(str(tmp_path))
+    service.add_documents(1, ["a"], ["first batch"])
+    service.add_documents(1, ["b"], ["second batch"])
+    
+    lines = (tmp_path / "chat_1.jsonl").read_text(encoding="utf-8").splitlines()
+    
+    assert [json.loads(line)["id"] for line in lines] == ["a", "b"]
+
+def test_torn_log_line_is_dropped(tmp_path):
+    service = KeywordService(str(tmp_path))
+    service.add_documents(1, ["a"], ["kept chunk"])
+    with open(tmp_path / "chat_1.jsonl", "a", encoding="utf-8") as file:
+        file.write('{"op": "add", "id": "b", "ter')
+    
+    reloaded = KeywordService(str(tmp_path))
+    reloaded.add_documents(1, ["c"], ["later chunk"])
+    
+    # The append after the torn line must survive the next load
+    again = KeywordService(str(tmp_path))
+    assert sorted(doc_id for doc_id, _ in again.search(1, "chunk")) == ["a", "c"]
+
+def test_log_is_compacted(tmp_path):
+    service = KeywordService(str(tmp_path))
+    for round_number in range(600):
+        service.add_documents(1, ["a", "b"], [f"round {round_number}", "constant text"])
+    
+    lines = (tmp_path / "chat_1.jsonl").read_text(encoding="utf-8").splitlines()
+    
+    assert len(lines) < 1200
+    assert [doc_id for doc_id, _ in KeywordService(str(tmp_path)).search(1, "599")] == ["a"]
+
+def test_loaded_indexes_are_bounded(tmp_path):
+    service = KeywordService(str(tmp_path), max_chats=2)
+    for chat_id in range(1, 5):
+        service.add_documents(chat_id, ["a"], [f"chat {chat_id}"])
+    
+    assert list(service._indexes) == [3, 4]
+    # Evicted chats are read back from disk
+    assert [doc_id for doc_id, _ in service.search(1, "chat")] == ["a"]
+    assert list(service._indexes) == [4, 1]
+
+def test_delete_index(tmp_path):
+    service = KeywordService(str(tmp_path))
+    service.add_documents(1, ["a"], ["gone soon"])
+    
+    service.delete_index(1)
+    
+    assert not service.has_index(1)
+    assert service.search(1, "gone") == []
@@ -0,0 +1,136 @@
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from models.ollama_chat import OllamaChat
+from services.health_service import ServiceUnavailableError
+
+class FakeOllama:
+    """Minimal Ollama server: /api/chat answers with ``self.lines``, or ``self.status`` when it is an error"""
+    
+    def __init__(self):
+        self.lines = []
+        self.status = 200
+        self.requests = []
+        
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_POST(self):
+                fake.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                if fake.status != 200:
+                    self._send(fake.status, b'{"error": "failed"}')
+                elif fake.requests[-1]["stream"]:
+                    self._send(200, b"".join(json.dumps(line).encode() + b"\n" for line in fake.lines))
+                else:
+                    self._send(200, json.dumps(fake.lines[-1]).encode())
+            
+            def do_GET(self):
+                self._send(fake.status, b'{"models": [{"name": "mistral"}]}')
+            
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+@pytest.fixture
+def server():
+    fake = FakeOllama()
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+@pytest.fixture
+def model(server):
+    model = OllamaChat("mistral")
+    model.base_url = server.url
+    model.health.failure_threshold = 2
+    return model
+
+def _stream(*tokens, extra=()):
+    lines = [{"message": {"content": token}, "done": False} for token in tokens]
+    lines.append({"message": {"content": ""}, "done": True, "eval_count": len(tokens), "eval_duration": 10 ** 9})
+    return lines + list(extra)
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+def test_stream_yields_tokens_until_done(server, model):
+    server.lines = _stream("Hel", "lo", extra=[{"message": {"content": "ignored"}, "done": False}])
+    
+    assert list(model.stream_response(MESSAGES)) == ["Hel", "lo"]
+    assert server.requests[0] == {"model": "mistral", "messages": MESSAGES, "stream": True}
+    assert model.health.available
+
+def test_async_stream_yields_tokens_until_done(server, model):
+    server.lines = _stream("Hel", "lo", extra=[{"message": {"content": "ignored"}, "done": False}])
+    
+    async def collect():
+        return [token async for token in model.astream_response(MESSAGES)]
+    
+    assert asyncio.run(collect()) == ["Hel", "lo"]
+    assert server.requests[0]["stream"] is True
+
+def test_generate_returns_the_message(server, model):
+    server.lines = [{"message": {"content": "Hello"}, "done": True}]
+    
+    assert model.generate_response(MESSAGES) == "Hello"
+    assert asyncio.run(model.agenerate_response(MESSAGES)) == "Hello"
+    assert [request["stream"] for request in server.requests] == [False, False]
+
+def test_error_chunk_in_stream_raises(server, model):
+    server.lines = [{"message": {"content": "Hel"}, "done": False}, {"error": "model crashed"}]
+    
+    with pytest.raises(Exception, match="model crashed"):
+        list(model.stream_response(MESSAGES))
+
+def test_server_errors_open_the_circuit(server, model):
+    server.status = 500
+    
+    with pytest.raises(Exception, match="Failed to stream response"):
+        list(model.stream_response(MESSAGES))
+    with pytest.raises(Exception, match="Failed to generate response"):
+        asyncio.run(model.agenerate_response(MESSAGES))
+    
+    # Further calls fail fast without reaching the server
+    with pytest.raises(ServiceUnavailableError):
+        list(model.stream_response(MESSAGES))
+    assert len(server.requests) == 2
+    assert not model.is_available()
+
+def test_client_errors_do_not_count_against_health(server, model):
+    server.status = 404
+    
+    for _ in range(3):
+        with pytest.raises(Exception, match="Failed to generate response"):
+            asyncio.run(model.agenerate_response(MESSAGES))
+    
+    assert model.health.state == "closed"
+    assert len(server.requests) == 3
+
+def test_pooled_client_is_reused_until_closed(server, model):
+    server.lines = [{"message": {"content": "Hello"}, "done": True}]
+    
+    async def run():
+        await model.aopen()
+        client = model._async_client
+        await model.agenerate_response(MESSAGES)
+        await model.agenerate_response(MESSAGES)
+        reused = model._async_client is client
+        await model.aclose()
+        return client, reused
+    
+    client, reused = asyncio.run(run())
+    
+    assert reused
+    assert client.is_closed and model._async_client is None
@@ -0,0 +1,61 @@
+from services.rerank_service import MMRReranker, CrossEncoderReranker, PassthroughReranker, get_reranker, register_reranker
+
+def _doc(doc_id, content, score=None, embedding=None):
+    doc = {"id": doc_id, "content": content, "score": score}
+    if embedding is not None:
+        doc["embedding"] = embedding
+    return doc
+
+def test_mmr_prefers_relevant_documents():
+    docs = [
+        _doc("off", "shipping rates for europe"),
+        _doc("on", "refund policy for damaged items")
+    ]
+    
+    ranked = MMRReranker(diversity_lambda=1.0).rerank("what is the refund policy", docs, top_k=2)
+    
+    assert [doc["id"] for doc in ranked] == ["on", "off"]
+
+def test_mmr_demotes_near_duplicates():
+    docs = [
+        _doc("a", "refund policy details", score=1.0, embedding=[1.0, 0.0]),
+        _doc("a_copy", "refund policy details", score=0.9, embedding=[1.0, 0.0]),
+        _doc("b", "refund timeline", score=0.8, embedding=[0.0, 1.0])
+    ]
+    
+    ranked = MMRReranker(diversity_lambda=0.5).rerank("refund", docs, top_k=2)
+    
+    assert [doc["id"] for doc in ranked] == ["a", "b"]
+
+def test_mmr_falls_back_to_token_overlap_without_embeddings():
+    docs = [
+        _doc("a", "alpha beta gamma", score=1.0),
+        _doc("a_copy", "alpha beta gamma", score=0.95),
+        _doc("b", "delta epsilon", score=0.9)
+    ]
+    
+    ranked = MMRReranker(diversity_lambda=0.5).rerank("alpha", docs, top_k=3)
+    
+    assert [doc["id"] for doc in ranked] == ["a", "b", "a_copy"]
+
+def test_mmr_handles_small_inputs():
+    reranker = MMRReranker()
+    
+    assert reranker.rerank("query", [], top_k=3) == []
+    assert reranker.rerank("query", [_doc("a", "text")], top_k=3)[0]["id"] == "a"
+
+def test_cross_encoder_orders_by_pair_score():
+    reranker = CrossEncoderReranker(lambda pairs: [len(passage) for _, passage in pairs])
+    docs = [_doc("short", "ab"), _doc("long", "abcdef"), _doc("mid", "abcd")]
+    
+    ranked = reranker.rerank("q", docs, top_k=2)
+    
+    assert [doc["id"] for doc in ranked] == ["long", "mid"]
+    assert ranked[0]["rerank_score"] == 6.0
+
+def test_registry_falls_back_to_passthrough():
+    custom = PassthroughReranker()
+    register_reranker("custom", custom)
+    
+    assert get_reranker("custom") is custom
+    assert isinstance(get_reranker("missing"), PassthroughReranker)
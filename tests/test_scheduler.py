@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from models.base_chat import BaseChatModel
+from models.scheduler import GenerationScheduler, SchedulerOverloaded
+
+class GatedModel(BaseChatModel):
+    """Records calls and holds every generation until the gate opens"""
+    
+    def __init__(self):
+        super().__init__("gated")
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.gate = asyncio.Event()
+    
+    def generate_response(self, messages):
+        raise NotImplementedError
+    
+    async def agenerate_response(self, messages):
+        self.calls.append(messages[-1]["content"])
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await self.gate.wait()
+        finally:
+            self.active -= 1
+        return f"answer to {messages[-1]['content']}"
+    
+    def is_available(self):
+        return True
+
+def _messages(question):
+    return [{"role": "user", "content": question}]
+
+def _scheduler(model, **kwargs):
+    options = {"max_concurrent": 1, "max_queue": 8, "queue_timeout": 5, "coalesce": False}
+    options.update(kwargs)
+    return GenerationScheduler(model, **options)
+
+def test_identical_prompts_share_one_generation():
+    async def scenario():
+        model = GatedModel()
+        scheduler = _scheduler(model, max_concurrent=2, coalesce=True)
+        first = asyncio.create_task(scheduler.generate(_messages("q"), chat_id=1))
+        second = asyncio.create_task(scheduler.generate(_messages("q"), chat_id=2))
+        await asyncio.sleep(0.01)
+        model.gate.set()
+        return model, scheduler, await first, await second
+    
+    model, scheduler, (first, first_info), (second, second_info) = asyncio.run(scenario())
+    
+    assert model.calls == ["q"]
+    assert first == second == "answer to q"
+    assert (first_info["coalesced"], second_info["coalesced"]) == (False, True)
+    assert scheduler.stats()["coalesced"] == 1
+
+def test_concurrency_is_bounded_and_chats_take_turns():
+    async def scenario():
+        model = GatedModel()
+        scheduler = _scheduler(model)
+        tasks = [
+            asyncio.create_task(scheduler.generate(_messages(question), chat_id=chat_id))
+            for chat_id, question in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")]
+        ]
+        await asyncio.sleep(0.01)
+        queued = scheduler.stats()["queued"]
+        model.gate.set()
+        await asyncio.gather(*tasks)
+        return model, scheduler, queued
+    
+    model, scheduler, queued = asyncio.run(scenario())
+    
+    assert queued == 3
+    assert model.peak == 1
+    # Chat b is served before chat a's third question
+    assert model.calls == ["a1", "a2", "b1", "a3"]
+    assert scheduler.stats()["active"] == 0 and scheduler.stats()["queued"] == 0
+
+def test_full_queue_sheds_requests():
+    async def scenario():
+        model = GatedModel()
+        scheduler = _scheduler(model, max_queue=1)
+        running = asyncio.create_task(scheduler.generate(_messages("q1")))
+        queued = asyncio.create_task(scheduler.generate(_messages("q2")))
+        await asyncio.sleep(0.01)
+        
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.generate(_messages("q3"))
+        
+        model.gate.set()
+        await asyncio.gather(running, queued)
+        return model, scheduler
+    
+    model, scheduler = asyncio.run(scenario())
+    
+    assert model.calls == ["q1", "q2"]
+    assert scheduler.stats()["shed"] == 1
+
+def test_waiting_past_the_queue_timeout_sheds():
+    async def scenario():
+        model = GatedModel()
+        scheduler = _scheduler(model, queue_timeout=0.05)
+        running = asyncio.create_task(scheduler.generate(_messages("q1")))
+        await asyncio.sleep(0.01)
+        
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.generate(_messages("q2"))
+        
+        model.gate.set()
+        await running
+        return model, scheduler
+    
+    model, scheduler = asyncio.run(scenario())
+    
+    assert model.calls == ["q1"]
+    assert scheduler.stats()["queued"] == 0
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from services.vector_quantization import normalize, plane_names, encode, scan, decode
+from services.memmap_store import MemmapVectorStore
+
+def _vectors(rows=200, dim=64, seed=0):
+    return normalize(np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32))
+
+@pytest.mark.parametrize("quantization, tolerance", [("none", 1e-7), ("float16", 1e-3), ("int8", 1e-2)])
+def test_round_trip_and_scan(quantization, tolerance):
+    matrix = _vectors()
+    planes = encode(matrix, plane_names(quantization, keep_full=False))
+    query = matrix[3]
+    
+    decoded = decode(planes, quantization, np.arange(len(matrix)))
+    scores = scan(planes, quantization, query)
+    
+    assert np.abs(decoded - matrix).max() < tolerance
+    assert np.abs(scores - matrix @ query).max() < tolerance * 8
+    assert int(np.argmax(scores)) == 3
+
+def test_int8_uses_full_range_per_vector():
+    matrix = _vectors(rows=10)
+    planes = encode(matrix, plane_names("int8", keep_full=False))
+    
+    assert np.abs(planes["i8"]).max(axis=1).tolist() == [127] * 10
+    assert planes["scale"].shape == (10, 1)
+
+def test_zero_vectors_stay_zero():
+    planes = encode(np.zeros((2, 4), dtype=np.float32), plane_names("int8", keep_full=False))
+    
+    assert not planes["i8"].any()
+    assert decode(planes, "int8", np.arange(2)).tolist() == [[0.0] * 4] * 2
+
+def test_plane_names():
+    assert plane_names("none", keep_full=True) == ["f32"]
+    assert plane_names("float16", keep_full=True) == ["f16", "f32"]
+    assert plane_names("int8", keep_full=False) == ["i8", "scale"]
+    with pytest.raises(ValueError):
+        plane_names("int4", keep_full=False)
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_rescored_search_matches_float32(tmp_path, quantization):
+    matrix = _vectors(rows=300, dim=32, seed=1)
+    ids = [f"doc_{i}" for i in range(len(matrix))]
+    metadatas = [{"filename": "doc.txt", "chunk_index": i} for i in range(len(matrix))]
+    exact = MemmapVectorStore(str(tmp_path / "exact"))
+    quantized = MemmapVectorStore(str(tmp_path / quantization), quantization=quantization, rescore=True)
+    for store in (exact, quantized):
+        store.create(1)
+        store.add(1, ids, ids, matrix.tolist(), metadatas)
+    
+    query = (matrix[7] + 0.3 * matrix[8]).tolist()
+    expected = exact.search(1, query, 5)
+    found = quantized.search(1, query, 5)
+    
+    assert [hit["id"] for hit in found] == [hit["id"] for hit in expected]
+    assert [hit["similarity"] for hit in found] == pytest.approx([hit["similarity"] for hit in expected], abs=1e-6)
+
+def test_quantization_is_kept_across_reloads(tmp_path):
+    matrix = _vectors(rows=20, dim=16)
+    ids = [f"doc_{i}" for i in range(len(matrix))]
+    store = MemmapVectorStore(str(tmp_path), quantization="int8", rescore=False)
+    store.create(1)
+    store.add(1, ids, ids, matrix.tolist(), [{"filename": "doc.txt", "chunk_index": i} for i in range(len(matrix))])
+    store.remove(1, ["doc_0"])
+    
+    reopened = MemmapVectorStore(str(tmp_path), quantization="none")
+    hits = reopened.search(1, matrix[5].tolist(), 3)
+    
+    assert reopened._get(1).quantization == "int8"
+    assert reopened.count(1) == 19
+    assert hits[0]["id"] == "doc_5"
+    assert hits[0]["similarity"] == pytest.approx(1.0, abs=1e-2)
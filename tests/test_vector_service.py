@@ -0,0 +1,46 @@
+import pytest
+from services.memmap_store import MemmapVectorStore
+from services.vector_service import VectorService
+
+@pytest.fixture
+def service(tmp_path):
+    return VectorService(MemmapVectorStore(str(tmp_path)))
+
+def _doc(doc_id, similarity=0.5):
+    return {"id": doc_id, "content": doc_id, "filename": "doc.txt", "chunk_index": 0, "page": None, "heading_path": "", "similarity": similarity}
+
+def test_rrf_rewards_documents_found_by_both_retrievers(service):
+    vector_results = [_doc("a"), _doc("b"), _doc("c")]
+    keyword_hits = [("c", 9.0), ("d", 5.0)]
+    service.create_collection(1)
+    service.upsert_chunks(1, ["d"], ["keyword only"], [[1.0, 0.0]], [{"filename": "doc.txt", "chunk_index": 3}])
+    
+    fused = service._fuse_results(1, vector_results, keyword_hits, n_results=4)
+    
+    # b and d tie at second place in one list each; ties keep vector order
+    assert [doc["id"] for doc in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["score"] == pytest.approx(1 / 63 + 1 / 61)
+    # Keyword-only hits are fetched from the store and carry no similarity
+    assert fused[3]["content"] == "keyword only"
+    assert fused[3]["similarity"] is None
+
+def test_rrf_truncates_to_n_results(service):
+    fused = service._fuse_results(1, [_doc("a"), _doc("b")], [("b", 1.0)], n_results=1)
+    
+    assert [doc["id"] for doc in fused] == ["b"]
+
+def test_collection_version_tracks_documents(service):
+    service.create_collection(1)
+    assert service.collection_version(1) == 0
+    
+    service.upsert_chunks(1, ["a"], ["first"], [[1.0, 0.0]], [{"filename": "doc.txt", "chunk_index": 0}])
+    first = service.collection_version(1)
+    service.upsert_chunks(1, ["b"], ["second"], [[0.0, 1.0]], [{"filename": "doc.txt", "chunk_index": 1}])
+    second = service.collection_version(1)
+    
+    assert first and second and first != second
+    assert service.collection_version(1) == second
+    
+    service.delete_chunks(1, ["a", "b"])
+    
+    assert service.collection_version(1) == 0